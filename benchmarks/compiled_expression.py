@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of the compiled expression builder against the previous implementation, on long expressions.
+
+> python3 ./benchmarks/compiled_expression.py
+"""
+
+import os
+import random
+import re
+import string
+import sys
+import timeit
+from functools import partial
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from dataset_translation.compiled_expression import CompiledExpressionBuilder  # pylint: disable=wrong-import-position
+
+
+def add_entity_name_previous(entity_name, expression_compiled):
+  regex = re.compile(f"[{re.escape(string.punctuation)}]")
+  new_token_name = regex.sub('', entity_name)
+  return re.sub(r"\b({})( \1\b)+".format(new_token_name), r"\1", expression_compiled + new_token_name + " ")
+
+
+def compile_previous(tokens):
+  expression_compiled = ''
+  for is_entity, value in tokens:
+    if is_entity:
+      expression_compiled = add_entity_name_previous(value, expression_compiled)
+    else:
+      expression_compiled += value + " "
+  return expression_compiled
+
+
+def compile_builder(tokens):
+  builder = CompiledExpressionBuilder()
+  for is_entity, value in tokens:
+    if is_entity:
+      builder.add_entity_name(value)
+    else:
+      builder.add_word(value)
+  return builder.build()
+
+
+def generate_tokens(generator, size):
+  entities = [f"ENTITY_{i}" for i in range(50)]
+  words = [''.join(generator.choice(string.ascii_lowercase) for _ in range(6)) for _ in range(500)]
+  return [(True, generator.choice(entities)) if generator.random() < 0.3 else (False, generator.choice(words))
+          for _ in range(size)]
+
+
+def main():
+  generator = random.Random(0)
+  print(f"{'tokens':>8} {'previous (ms)':>14} {'builder (ms)':>13} {'speedup':>8}")
+  for size in (10, 50, 200, 1000, 5000):
+    tokens = generate_tokens(generator, size)
+    assert compile_previous(tokens) == compile_builder(tokens)
+    number = max(1, 20000 // size)
+    previous = min(timeit.repeat(partial(compile_previous, tokens), number=number, repeat=3)) / number * 1000
+    builder = min(timeit.repeat(partial(compile_builder, tokens), number=number, repeat=3)) / number * 1000
+    print(f"{size:>8} {previous:>14.3f} {builder:>13.3f} {previous / builder:>7.1f}x")
+
+
+if __name__ == '__main__':
+  main()
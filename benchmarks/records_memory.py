@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of the memory held by a CAI-format dataset and of the blocks allocated to hold it, comparing the nested
+dicts of its JSON shape with the slotted records, on a generated dataset of N intents x M expressions.
+
+> python3 ./benchmarks/records_memory.py -intents 200 -expressions 500
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+# pylint: disable=wrong-import-position
+from dataset_translation.records import dataset_from_json
+from tests.fake_servers import generate_dataset
+
+
+def measure(build):
+  """
+  Memory held by the value built by a function, once the garbage of its construction is collected
+
+  Args :
+      - build (function) : the function building the value
+
+  Returns :
+      - tuple : the value, the number of bytes and of blocks it holds, and the time of its construction
+  """
+  gc.collect()
+  tracemalloc.start()
+  start = time.perf_counter()
+  value = build()
+  seconds = time.perf_counter() - start
+  gc.collect()
+  snapshot = tracemalloc.take_snapshot()
+  tracemalloc.stop()
+  statistics = snapshot.statistics('filename')
+  return value, sum(stat.size for stat in statistics), sum(stat.count for stat in statistics), seconds
+
+
+def main():
+  argparser = argparse.ArgumentParser(description='Memory of the CAI-format dataset as dicts and as records')
+  argparser.add_argument('-intents', type=int, default=200, help='the number of intents')
+  argparser.add_argument('-expressions', type=int, default=500, help='the number of expressions of each intent')
+  argparser.add_argument('-entities', type=int, default=20, help='the number of restricted entities')
+  args = argparser.parse_args()
+
+  text = json.dumps(generate_dataset(args.intents, args.expressions, args.entities))
+  dicts, dicts_bytes, dicts_blocks, dicts_seconds = measure(lambda: json.loads(text))
+  tokens = sum(len(expression['tokens']) for intent in dicts['intents'] for expression in intent['expressions'])
+  del dicts
+  records, records_bytes, records_blocks, records_seconds = measure(lambda: dataset_from_json(json.loads(text)))
+  assert json.loads(text) == records
+  print(f"{args.intents * args.expressions} expressions, {tokens} tokens")
+  print(f"{'':>8} {'MB':>8} {'blocks':>10} {'bytes/token':>12} {'load (s)':>9}")
+  for name, size, blocks, seconds in (('dicts', dicts_bytes, dicts_blocks, dicts_seconds),
+                                      ('records', records_bytes, records_blocks, records_seconds)):
+    print(f"{name:>8} {size / 1e6:>8.1f} {blocks:>10} {size / tokens:>12.1f} {seconds:>9.3f}")
+  print(f"records hold {records_bytes / dicts_bytes:.0%} of the memory and {records_blocks / dicts_blocks:.0%} "
+        f"of the blocks of the dicts")
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+End-to-end throughput benchmark of the dataset translation against the local stand-in servers of the CAI platform and
+of SAP Translation Hub, on a generated dataset of N intents x M expressions x K entities.
+
+> python3 ./benchmarks/throughput.py -intents 20 -expressions 50 -entities 10 -latency 0.02 -jitter 0.01
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+# pylint: disable=wrong-import-position
+from dataset_translation.async_dataset_translation import AsyncDatasetTranslation
+from dataset_translation.cai_client import CaiClient
+from dataset_translation.dataset_translation import DatasetTranslation
+from dataset_translation.rate_limit import RetryPolicy, endpoint_family
+from dataset_translation.run_metrics import RunMetrics
+from dataset_translation.token_manager import TokenManager
+from dataset_translation.translator import SAPTranslationHubTranslator
+from dataset_translation.transport import Transport
+from tests.fake_servers import FakeCaiServer, FakeTranslationHubServer, dataset_entities, generate_dataset
+
+
+def parse_arguments():
+  argparser = argparse.ArgumentParser(description='Throughput benchmark of the dataset translation')
+  argparser.add_argument('--intents', '-intents', default=10, type=int, help='the number of intents (N)')
+  argparser.add_argument('--expressions', '-expressions', default=50, type=int,
+                         help='the number of expressions of each intent (M)')
+  argparser.add_argument('--entities', '-entities', default=5, type=int, help='the number of restricted entities (K)')
+  argparser.add_argument('--synonyms', '-synonyms', default=5, type=int, help='the number of synonyms of each entity')
+  argparser.add_argument('--latency', '-latency', default=0.01, type=float,
+                         help='the mean latency in seconds of the servers')
+  argparser.add_argument('--jitter', '-jitter', default=0.0, type=float,
+                         help='the maximum deviation in seconds of the latency of the servers')
+  argparser.add_argument('--errorrate', '-errorrate', default=0.0, type=float,
+                         help='the fraction of the requests answered with a 503 error')
+  argparser.add_argument('--engine', '-engine', choices=['sequential', 'asyncio'], default='sequential',
+                         help='the execution engine')
+  argparser.add_argument('--maxinflight', '-inflight', default=AsyncDatasetTranslation.MAX_IN_FLIGHT, type=int,
+                         help='the maximum number of concurrent requests per host with the asyncio engine')
+  argparser.add_argument('--bulksize', '-bulk', default=CaiClient.SIZE_BULK, type=int,
+                         help='the number of expressions imported per request, 0 to import them one by one')
+  argparser.add_argument('--seed', '-seed', default=0, type=int, help='the seed of the dataset, latencies and errors')
+  return argparser.parse_args()
+
+
+def run(args):
+  """
+  Translate a generated dataset against the stand-in servers
+
+  Args :
+      - args (argparse.Namespace) : the arguments of the benchmark
+
+  Returns :
+      - dict : the report of the run
+  """
+  dataset = generate_dataset(args.intents, args.expressions, args.entities, args.synonyms, args.seed)
+  server_options = {'latency': args.latency, 'jitter': args.jitter, 'error_rate': args.errorrate, 'seed': args.seed}
+  with FakeCaiServer(dataset_entities(dataset), **server_options) as cai_server, \
+      FakeTranslationHubServer(**server_options) as translation_hub_server:
+    metrics = RunMetrics()
+    transport = Transport(retry_policy=RetryPolicy(max_retries=10, backoff=0.01, max_backoff=0.1), metrics=metrics)
+    token_manager = TokenManager(background_refresh=False)
+    translator = SAPTranslationHubTranslator('en', 'fr', 'client_id', 'client_secret', transport=transport,
+                                             token_manager=token_manager, api_url=translation_hub_server.api_url,
+                                             token_url=translation_hub_server.token_url)
+    cai_client = CaiClient('user', 'bot', 'v1', 'developer_token', 'bot_client_id', 'bot_client_secret',
+                           transport=transport, api_url=cai_server.api_url, auth_url=cai_server.auth_url,
+                           token_manager=token_manager)
+    options = {'max_in_flight': args.maxinflight} if args.engine == 'asyncio' else {}
+    engine = AsyncDatasetTranslation if args.engine == 'asyncio' else DatasetTranslation
+    translation = engine('saptranslationhub', 'en', 'fr', 'user', 'bot', 'v1', 'developer_token', 'bot_client_id',
+                         'bot_client_secret', transport=transport, cai_client=cai_client, token_manager=token_manager,
+                         bulk_size=args.bulksize, translator=translator, metrics=metrics, **options)
+    start = time.perf_counter()
+    translation.dataset_translation(dataset)
+    wall_time = time.perf_counter() - start
+    transport.close()
+  expressions = sum(len(intent['expressions']) for intent in dataset['intents'])
+  requests = Counter()
+  for server in (cai_server, translation_hub_server):
+    for (method, path), count in server.requests.items():
+      requests[endpoint_family(method, path) or f"{method} {path}"] += count
+  return {
+    'expressions': expressions,
+    'wall_time': wall_time,
+    'expressions_per_second': expressions / wall_time if wall_time else 0,
+    'requests': dict(sorted(requests.items())),
+    'errors': cai_server.errors + translation_hub_server.errors,
+    'translated_characters': translation_hub_server.characters,
+    'metrics': metrics.report()
+  }
+
+
+def main():
+  args = parse_arguments()
+  report = run(args)
+  print(f"dataset: {args.intents} intents x {args.expressions} expressions x {args.entities} entities, "
+        f"engine: {args.engine}, latency: {args.latency}s +/- {args.jitter}s, error rate: {args.errorrate}")
+  print(f"{'endpoint':<30} {'requests':>9}")
+  for endpoint, count in report['requests'].items():
+    print(f"{endpoint:<30} {count:>9}")
+  print(f"{'total':<30} {sum(report['requests'].values()):>9}")
+  print(f"injected errors: {report['errors']}, translated characters: {report['translated_characters']}")
+  print(f"{'phase':<30} {'seconds':>9}")
+  for phase, timing in report['metrics']['phases'].items():
+    print(f"{phase:<30} {timing['seconds']:>9.2f}")
+  print(f"{'endpoint':<30} {'mean latency (ms)':>18}")
+  for endpoint, metrics in report['metrics']['endpoints'].items():
+    print(f"{endpoint:<30} {metrics['latency']['mean'] * 1000:>18.1f}")
+  print(f"wall time: {report['wall_time']:.2f}s, {report['expressions_per_second']:.1f} expressions/s")
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of the conversion of a large synthetic multi-language export to the CAI format, comparing the previous
+token decoding with the current one, with the standard library JSON parser and with orjson when it is installed.
+
+> python3 ./benchmarks/token_decoding.py
+"""
+
+import gc
+import json
+import logging
+import os
+import random
+import sys
+import timeit
+from functools import partial
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+# pylint: disable=wrong-import-position
+from dataset_translation import json_stream
+from dataset_translation.dataset import Dataset
+
+LANGUAGES = ('en', 'fr', 'de', 'es')
+
+
+def fill_expressions_previous(cai_dataset_intents, gazettes, dataset_expressions, language):
+  for expression in dataset_expressions:
+    if expression['language'] == language:
+      dict_expression = {
+        'source': expression['source'],
+        'tokens': json.loads(expression['tokens'])
+      }
+      for token in dict_expression['tokens']:
+        if 'entity_id' in token.keys():
+          entity = gazettes[token['entity_id']]
+          token['entity'] = {
+            'name': entity['name'],
+            'type': entity['type'],
+            'is_custom': entity['type'] != 'gold'
+          }
+          del token['entity_id']
+        else:
+          token['entity'] = None
+      cai_dataset_intents[expression['intent_id']]['expressions'].append(dict_expression)
+
+
+def generate_export(generator, size, intents=100, entities=20, tokens=12):
+  export_entities = [{'name': f"ENTITY_{i}", 'slug': f"entity-{i}", 'locked': False, 'type': i % 3, 'is_open': True,
+                      'strictness': None, 'enrichment_strictness': None, 'regex_pattern': None, 'regex_flags': None}
+                     for i in range(entities)]
+  export_intents = [{'name': f"intent-{i}", 'description': None, 'strictness': None} for i in range(intents)]
+  expressions = []
+  for i in range(size):
+    expression_tokens = []
+    for j in range(tokens):
+      token = {'word': f"word{generator.randrange(1000)}", 'space': True, 'pos': 'NOUN', 'lemma': 'word', 'ind': j}
+      if generator.random() < 0.2:
+        token['entity_id'] = generator.randrange(entities)
+      expression_tokens.append(token)
+    expressions.append({'source': ' '.join(token['word'] for token in expression_tokens),
+                        'language': LANGUAGES[i % len(LANGUAGES)], 'intent_id': i % intents,
+                        'tokens': json.dumps(expression_tokens)})
+  return {'intents': export_intents, 'entities': export_entities, 'synonyms': [], 'expressions': expressions}
+
+
+def convert_previous(export):
+  dataset = Dataset()
+  intents = dataset.fill_intents(export['intents'])
+  gazettes = dataset.fill_gazettes(export['entities'], export['synonyms'], 'en')
+  fill_expressions_previous(intents, gazettes, export['expressions'], 'en')
+  return {'language': 'en', 'intents': intents, 'gazettes': gazettes}
+
+
+def convert_current(export, orjson):
+  json_stream.orjson = orjson
+  return Dataset().to_cai_format(export, 'en')
+
+
+def best_time(function):
+  """Best time of a few runs, with the garbage collector enabled like in a real conversion"""
+  return min(timeit.repeat(function, setup='gc.enable()', number=1, repeat=5, globals={'gc': gc}))
+
+
+def main():
+  logging.disable(logging.INFO)
+  generator = random.Random(0)
+  orjson = json_stream.orjson
+  print(f"{'expressions':>12} {'previous (s)':>13} {'stdlib (s)':>11} {'orjson (s)':>11} {'speedup':>8}")
+  for size in (10000, 50000, 200000):
+    export = generate_export(generator, size)
+    assert convert_previous(export) == convert_current(export, None)
+    previous = best_time(partial(convert_previous, export))
+    stdlib = best_time(partial(convert_current, export, None))
+    current = stdlib
+    orjson_column = f"{'-':>11}"
+    if orjson is not None:
+      current = best_time(partial(convert_current, export, orjson))
+      orjson_column = f"{current:>11.3f}"
+    print(f"{size:>12} {previous:>13.3f} {stdlib:>11.3f} {orjson_column} {previous / current:>7.1f}x")
+  json_stream.orjson = orjson
+
+
+if __name__ == '__main__':
+  main()
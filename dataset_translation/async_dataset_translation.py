@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+import asyncio
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+from urllib.parse import urlsplit
+from tqdm import tqdm
+from .cai_client import CaiClient
+from .dataset_translation import DatasetTranslation
+
+
+class AsyncDatasetTranslation(DatasetTranslation):
+  """
+  Same inputs and outputs as `DatasetTranslation`, but the intents, expressions and gazettes are handled concurrently
+  on an asyncio event loop, with a limit of in-flight requests per host.
+
+  The requests are sent by the CAI client and the translator on a thread pool, so that they keep using the pooled
+  keep-alive connections of the transport.
+  """
+  MAX_IN_FLIGHT = 10
+
+  def __init__(self, *args, max_in_flight=MAX_IN_FLIGHT, **kwargs):
+    """
+    Args :
+        - args, kwargs : the arguments of `DatasetTranslation`
+        - max_in_flight (int) : the maximum number of concurrent requests per host
+    """
+    super().__init__(*args, **kwargs)
+    self.max_in_flight = max_in_flight
+    self.cai_host = urlsplit(self.cai_client.url_prefix).netloc
+    self.translator_host = 'translator'
+    self.semaphores = {}
+    self.executor = None
+
+  def dataset_translation(self, original_dataset):
+    """
+    Translates the expressions and synonyms and imports them on the platform,
+    and/or saves the translated CAI-format json dataset.
+
+    Args :
+        - original_dataset (dict) : the CAI-format json dataset
+
+    Returns :
+        - dict : the translated dataset
+    """
+    return asyncio.run(self.async_dataset_translation(original_dataset))
+
+  async def async_dataset_translation(self, original_dataset):
+    """
+    Coroutine of `dataset_translation`
+
+    Args :
+        - original_dataset (dict) : the CAI-format json dataset
+
+    Returns :
+        - dict : the translated dataset
+    """
+    dataset = original_dataset
+    dataset['language'] = self.target_language
+    start = time.time()
+    self.semaphores = {host: asyncio.Semaphore(self.max_in_flight) for host in (self.cai_host, self.translator_host)}
+    if self.writer is not None:
+      self.writer.open(self.target_language, dataset)
+
+    try:
+      with ThreadPoolExecutor(max_workers=2 * self.max_in_flight) as self.executor:
+        await self.run(self.translator_host, self.plan_translations, self.restore(dataset))
+        self.logger.info('Translating synonyms')
+        with tqdm(total=len(dataset['gazettes']), desc='synonyms') as pbar:
+          await self.gather_all(*[self.async_translate_gazette(index, gazette, pbar)
+                                  for index, gazette in enumerate(dataset['gazettes'])])
+        self.invalidate_gazettes_index()
+        self.logger.debug('Translated synonyms')
+        self.logger.info('Translating expressions')
+        total = len([0 for intent in dataset['intents'] for _ in intent['expressions']])
+        with tqdm(total=total, desc='intents') as pbar:
+          await self.gather_all(*[self.async_translate_intent(index, intent, dataset['gazettes'], pbar)
+                                  for index, intent in enumerate(dataset['intents'])])
+        self.logger.debug('Translated expressions')
+      if self.writer is not None:
+        self.writer.finish()
+    finally:
+      if self.writer is not None:
+        self.writer.close()
+      if self.journal is not None:
+        self.journal.close()
+    self.record_metrics()
+    self.logger.info(" Handled in %s", timedelta(seconds=round(time.time()-start)))
+    return dataset
+
+  @staticmethod
+  async def gather_all(*coroutines):
+    """
+    Run coroutines concurrently until all of them are done, even if some of them fail, so that the work of the others
+    is journaled before the first error is raised
+
+    Args :
+        - coroutines : the coroutines to run
+
+    Returns :
+        - list : the results of the coroutines
+    """
+    results = await asyncio.gather(*coroutines, return_exceptions=True)
+    for result in results:
+      if isinstance(result, BaseException):
+        raise result
+    return results
+
+  async def run(self, host, function, *args):
+    """
+    Run a blocking call of a client on the thread pool, once a slot of the host is free
+
+    Args :
+        - host (str) : the host called by the function
+        - function (callable) : the blocking function
+        - args : the arguments of the function
+
+    Returns :
+        - the result of the function
+    """
+    async with self.semaphores[host]:
+      return await asyncio.get_running_loop().run_in_executor(self.executor, partial(function, *args))
+
+  async def async_translate_gazette(self, index, gazette, pbar):
+    """
+    Translate the synonyms of a gazette and import them on the platform
+
+    Args:
+      - index (int) : the index of the gazette in the dataset
+      - gazette (dict) : the CAI-format gazette
+      - pbar (tqdm) : the progress bar of the gazettes
+    """
+    journaled = gazette.get('slug') in self.state.gazettes
+    if gazette['synonyms'] and not journaled:
+      gazette['synonyms'] = await self.run(self.translator_host, self.translate_texts, gazette['synonyms'],
+                                           self.SIZE_BATCH)
+      self.invalidate_gazettes_index()
+      with self.metrics.phase('import'):
+        await self.run(self.cai_host, self.cai_client.post_synonyms, gazette['slug'], gazette['synonyms'],
+                       self.target_language)
+      if self.journal is not None:
+        self.journal.record_synonyms(gazette)
+    self.write('gazettes', index, gazette)
+    pbar.update(1)
+
+  async def async_existing_expressions(self, intent_name):
+    """
+    Expressions of an intent already on the platform in the target language, when they are skipped. The pages of the
+    expressions are fetched in the slots of the platform, like the other requests.
+
+    Args:
+      - intent_name (str) : the intent name
+
+    Returns:
+      - dict : the first expression on the platform of each source, empty unless the existing expressions are skipped
+    """
+    if not self.skip_existing:
+      return {}
+    fetch_page = partial(self.cai_client.get_expressions_page, intent_name, self.target_language)
+    page_size = CaiClient.SIZE_PAGE
+    with self.metrics.phase('listing'):
+      content = await self.run(self.cai_host, fetch_page, 1, page_size)
+      expressions = list(content['results'])
+      pages = CaiClient.remaining_pages(content, page_size)
+      if pages is None:
+        page = 1
+        while len(content['results']) == page_size:
+          page += 1
+          content = await self.run(self.cai_host, fetch_page, page, page_size)
+          expressions.extend(content['results'])
+      else:
+        for page_content in await self.gather_all(*[self.run(self.cai_host, fetch_page, page, page_size)
+                                                    for page in pages]):
+          expressions.extend(page_content['results'])
+    return self.first_by_source(expressions)
+
+  async def async_import_chunk(self, intent_name, chunk):
+    """
+    Import a chunk of translated expressions of an intent in one bulk request, and journal them as soon as it returns
+
+    Args:
+      - intent_name (str) : the intent name
+      - chunk (list) : the index and the expression of each expression of the chunk
+
+    Returns:
+      - list : the index, the expression and the imported expression of each expression of the chunk
+    """
+    responses = await self.run(self.cai_host, self.cai_client.post_expressions, intent_name,
+                               [expression['source'] for _, expression in chunk], self.target_language,
+                               self.bulk_size)
+    imported = []
+    for (index, expression), response_expression in zip(chunk, responses):
+      self.record_expression(intent_name, index, expression, response_expression)
+      imported.append((index, expression, response_expression))
+    return imported
+
+  async def async_translate_intent(self, index, intent, dataset_gazettes, pbar):
+    """
+    Translate the expressions of an intent, then import them concurrently on the platform
+
+    Args:
+      - index (int) : the index of the intent in the dataset
+      - intent (dict) : the CAI-format intent
+      - dataset_gazettes (list) : the list of the translated synonyms
+      - pbar (tqdm) : the progress bar of the expressions
+    """
+    await self.run(self.translator_host, self.translate_intent, intent)
+    existing = await self.async_existing_expressions(intent['name'])
+    expressions, imported = self.expressions_to_import(intent, existing)
+    if self.bulk_size:
+      chunks = [expressions[i:i + self.bulk_size] for i in range(0, len(expressions), self.bulk_size)]
+      with self.metrics.phase('import'):
+        imported_chunks = await self.gather_all(*[self.async_import_chunk(intent['name'], chunk) for chunk in chunks])
+      imported.extend(itertools.chain(*imported_chunks))
+    else:
+      await self.gather_all(*[self.run(self.cai_host, self.import_expression, intent['name'], expression,
+                                       dataset_gazettes, expression_index)
+                              for expression_index, expression in expressions])
+    await self.gather_all(*[self.run(self.cai_host, self.annotate_expression, intent['name'], expression,
+                                     response_expression, dataset_gazettes, expression_index)
+                            for expression_index, expression, response_expression in imported])
+    self.write('intents', index, intent)
+    pbar.update(len(intent['expressions']))
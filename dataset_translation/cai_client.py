@@ -1,10 +1,20 @@
-import requests
+import logging
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from .token_manager import TokenManager
+from .transport import Transport
 
 class CaiClient:
   """
   The CAI public API
   """
-  def __init__(self, user_slug, bot_slug, version_slug, developer_token, bot_client_id, bot_client_secret):
+  API_URL = 'https://cai.tools.sap/api/train/v2'
+  AUTH_URL = 'https://sapcai-community.authentication.eu10.hana.ondemand.com/oauth/token'
+  SIZE_BULK = 100
+  SIZE_PAGE = 100
+  PAGE_WORKERS = 4
+
+  def __init__(self, user_slug, bot_slug, version_slug, developer_token, bot_client_id, bot_client_secret, transport=None, api_url=API_URL, auth_url=AUTH_URL, token_manager=None):  # pylint: disable=line-too-long,too-many-arguments
     """
     Args :
         - user_slug (str) : the user slug of the bot owner on the CAI platform
@@ -13,26 +23,78 @@ class CaiClient:
         - developer_token (str) : the developer token of the bot owner on the CAI platform
         - bot_client_id (str) : the bot's OAuth client id for authentication of Designtime APIs on the CAI platform
         - bot_client_secret (str) : the bot's OAuth client secret for authentication of Designtime APIs on the CAI platform
+        - transport (Transport) : the HTTP transport shared with the translator (optional)
+        - api_url (str) : the url of the CAI train API (optional)
+        - auth_url (str) : the url of the CAI OAuth token endpoint (optional)
+        - token_manager (TokenManager) : the cache of the access tokens, shared with the translator (optional)
     """
-    self.headers = {
-                      'Authorization': f"Bearer {self.get_access_token(bot_client_id, bot_client_secret)}",
-                      'Content': 'application/json',
-                      'X-Token': 'Token ' + developer_token
-                   }
-    self.url_prefix = f"https://cai.tools.sap/api/train/v2/users/{user_slug}/bots/{bot_slug}/versions/{version_slug}/dataset"
+    self.transport = transport if transport is not None else Transport()
+    self.auth_url = auth_url
+    self.token_manager = token_manager if token_manager is not None else TokenManager()
+    self.bot_client_id = bot_client_id
+    self.bot_client_secret = bot_client_secret
+    self.developer_token = developer_token
+    self.url_prefix = f"{api_url}/users/{user_slug}/bots/{bot_slug}/versions/{version_slug}/dataset"
+    self.logger = logging.getLogger(__name__)
     self.list_entities = self.get_entities()
+    self.entities_by_name = self.index_entities(self.list_entities)
 
-  @staticmethod
-  def get_access_token(bot_client_id, bot_client_secret):
+  @property
+  def token_key(self):
+    return f"{self.auth_url}#{self.bot_client_id}"
+
+  @property
+  def headers(self):
+    return {
+      'Authorization': f"Bearer {self.get_access_token()}",
+      'Content': 'application/json',
+      'X-Token': 'Token ' + self.developer_token
+    }
+
+  def get_access_token(self):
+    """
+    Getter of access token for the authentication on the CAI platform, from the cache of the access tokens
+
+    Returns:
+      - str : the access token
+    """
+    return self.token_manager.token(self.token_key, self.fetch_access_token)
+
+  def fetch_access_token(self):
     """
-    Getter of access token for the authentication on the CAI platform
+    Fetch a new access token for the authentication on the CAI platform
 
     Returns:
       - str : the access token
+      - int : the lifetime of the access token in seconds
+    """
+    payload = {'grant_type': 'client_credentials', 'client_id': self.bot_client_id,
+               'client_secret': self.bot_client_secret}
+    response = self.transport.post(self.auth_url, data=payload)
+    if response.status_code != 200:
+      raise ValueError(response.text)
+    content = response.json()
+    return content['access_token'], content.get('expires_in')
+
+  def send(self, method, url, **kwargs):
     """
-    payload = {'grant_type': 'client_credentials', 'client_id': bot_client_id, 'client_secret': bot_client_secret}
-    response = requests.post('https://sapcai-community.authentication.eu10.hana.ondemand.com/oauth/token', data=payload)
-    return response.json()['access_token']
+    Send an authenticated request to the CAI platform, sent again once with a new access token if the access token
+    is refused
+
+    Args :
+      - method (str) : the method of the transport, get, post, put or delete
+      - url (str) : the url of the request
+      - kwargs : the arguments of the request
+
+    Returns :
+      - requests.Response : the response
+    """
+    headers = self.headers
+    response = getattr(self.transport, method)(url, headers=headers, **kwargs)
+    if response.status_code == 401:
+      self.token_manager.invalidate(self.token_key, headers['Authorization'][len('Bearer '):])
+      response = getattr(self.transport, method)(url, headers=self.headers, **kwargs)
+    return response
 
   def get_entities(self):
     """
@@ -41,10 +103,26 @@ class CaiClient:
     Returns:
         - list : all the entities of the bot
     """
-    response = requests.get(f"{self.url_prefix}/entities", headers=self.headers)
+    response = self.send('get', f"{self.url_prefix}/entities")
     return response.json()['results']
 
 
+  @staticmethod
+  def index_entities(entities):
+    """
+    Index the entities of the bot by name
+
+    Args :
+        - entities (list) : all the entities of the bot
+
+    Returns:
+        - dict : the first entity of each name
+    """
+    entities_by_name = {}
+    for entity in entities:
+      entities_by_name.setdefault(entity.get('name'), entity)
+    return entities_by_name
+
   def convert_token_cai(self, index, token_cai_format):
     """
     Convert a CAI-format token to an import-format token
@@ -63,12 +141,12 @@ class CaiClient:
       'word': {'name': token_cai_format['word']}
     }
     if token_cai_format['entity'] is not None:
-      token_formatted["entity"] = [entity for entity in self.list_entities if entity['name'] == token_cai_format['entity']['name']][0]
+      token_formatted["entity"] = self.entities_by_name[token_cai_format['entity']['name']]
     return token_formatted
 
   def update_expression(self, index, token, intent, expression, expression_id):
     """
-    Update an expression on the CAI platform
+    Update a token of an expression on the CAI platform
 
     Args :
     - index (int) : the index of the token in the expression
@@ -77,13 +155,104 @@ class CaiClient:
     - expression (str) : the corresponding expression of the token
     - expression_id (str) : the corresponding id of the expression of the token
     """
-    response = requests.put(f"{self.url_prefix}/intents/{intent}/expressions/{expression_id}",
-                            json={'source': expression, 'tokens': [self.convert_token_cai(index, token)]},
-                            headers=self.headers
-                            )
+    self.update_expression_tokens([(index, token)], intent, expression, expression_id)
+
+  def update_expression_tokens(self, indexed_tokens, intent, expression, expression_id):
+    """
+    Update several tokens of an expression on the CAI platform in a single request
+
+    Args :
+    - indexed_tokens (list) : the (index of the token in the expression, import-format token) pairs
+    - intent (str) : the corresponding intent of the tokens and expression
+    - expression (str) : the corresponding expression of the tokens
+    - expression_id (str) : the corresponding id of the expression of the tokens
+    """
+    response = self.send('put', f"{self.url_prefix}/intents/{intent}/expressions/{expression_id}",
+                         json={'source': expression,
+                               'tokens': [self.convert_token_cai(index, token) for index, token in indexed_tokens]})
     if response.status_code != 200:
       raise ValueError(response.text)
 
+  def get_expressions(self, intent, language, page_size=SIZE_PAGE, max_workers=PAGE_WORKERS):
+    """
+    Getter of the expressions of an intent in a language on the CAI platform. Once the first page gives the number of
+    expressions, the other pages are fetched concurrently, otherwise they are fetched one after the other until a
+    page is not full.
+
+    Args :
+    - intent (str) : the intent slug
+    - language (str) : the isocode of the language
+    - page_size (int) : the number of expressions per page
+    - max_workers (int) : the maximum number of pages fetched concurrently
+
+    Returns :
+    - list : the expressions, in the order of the pages
+    """
+    content = self.get_expressions_page(intent, language, 1, page_size)
+    expressions = list(content['results'])
+    pages = self.remaining_pages(content, page_size)
+    if pages is None:
+      page = 1
+      while len(content['results']) == page_size:
+        page += 1
+        content = self.get_expressions_page(intent, language, page, page_size)
+        expressions.extend(content['results'])
+      return expressions
+    if pages:
+      with ThreadPoolExecutor(max_workers=min(max_workers, len(pages))) as executor:
+        for page_content in executor.map(lambda page: self.get_expressions_page(intent, language, page, page_size),
+                                         pages):
+          expressions.extend(page_content['results'])
+    return expressions
+
+  @staticmethod
+  def remaining_pages(content, page_size):
+    """
+    Numbers of the pages of expressions left after the first page
+
+    Args :
+    - content (dict) : the first page of the expressions
+    - page_size (int) : the number of expressions per page
+
+    Returns :
+    - range : the numbers of the other pages, None if the platform does not give the total number of expressions
+    """
+    if content.get('total') is None:
+      return None
+    return range(2, -(-content['total'] // page_size) + 1)
+
+  def get_expressions_page(self, intent, language, page, page_size):
+    """
+    Getter of a page of the expressions of an intent in a language on the CAI platform
+
+    Args :
+    - intent (str) : the intent slug
+    - language (str) : the isocode of the language
+    - page (int) : the number of the page, from 1
+    - page_size (int) : the number of expressions per page
+
+    Returns :
+    - dict : the expressions of the page in `results`, and the total number of expressions in `total` if the platform
+    gives it
+    """
+    response = self.send('get', f"{self.url_prefix}/intents/{intent}/expressions",
+                         params={'language': language, 'page': page, 'per_page': page_size})
+    if response.status_code != 200:
+      raise ValueError(response.text)
+    return response.json()
+
+  def delete_expression(self, intent, expression_id):
+    """
+    Delete an expression on the CAI platform, an expression already deleted is ignored
+
+    Args :
+    - intent (str) : the corresponding intent of the expression
+    - expression_id (str) : the id of the expression
+    """
+    response = self.send('delete', f"{self.url_prefix}/intents/{intent}/expressions/{expression_id}")
+    if response.status_code not in (200, 204, 404):
+      raise ValueError(response.text)
+
 
   def post_expression(self, intent, expression, target_language):
     """
@@ -94,18 +263,82 @@ class CaiClient:
     - expression (str) : the expression to import
     - target_language (str) : the isocode of the target language
     """
-    response = requests.post(f"{self.url_prefix}/intents/{intent}/expressions",
-                             json={
-                               'source': expression,
-                               'language': {'isocode': target_language}
-                             },
-                             headers=self.headers
-                             )
+    response = self.send('post', f"{self.url_prefix}/intents/{intent}/expressions",
+                         json={
+                           'source': expression,
+                           'language': {'isocode': target_language}
+                         })
     if response.status_code in (200, 201):
       return response.json()['results']
     raise ValueError(response.text)
 
 
+  def post_expressions(self, intent, expressions, target_language, chunk_size=SIZE_BULK):
+    """
+    Import a list of expressions on the CAI platform, with one request per chunk of expressions
+
+    Args :
+    - intent (str) : the corresponding intent of the expressions
+    - expressions (list) : the expressions to import
+    - target_language (str) : the isocode of the target language
+    - chunk_size (int) : the maximum number of expressions imported per request
+
+    Returns :
+    - list : the imported expression (id, tokens) of each expression, in the same order as the expressions
+    """
+    results = []
+    for i in range(0, len(expressions), chunk_size):
+      chunk = expressions[i:i + chunk_size]
+      response = self.send('post', f"{self.url_prefix}/intents/{intent}/expressions/bulk_create",
+                           json={'expressions': [{'source': expression, 'language': {'isocode': target_language}}
+                                                 for expression in chunk]})
+      if response.status_code not in (200, 201):
+        raise ValueError(response.text)
+      results.extend(self.align_results(chunk, response.json()['results']))
+    return results
+
+  @staticmethod
+  def normalize_source(source):
+    """
+    Args :
+    - source (str) : the source of an expression
+
+    Returns :
+    - str : the source as normalized by the platform, in Unicode NFC form with single spaces
+    """
+    return ' '.join(unicodedata.normalize('NFC', source).split())
+
+  def align_results(self, expressions, results):
+    """
+    Map the results of a bulk import back to the imported expressions by their normalized source, the results without
+    a source being kept in order
+
+    Args :
+    - expressions (list) : the imported expressions
+    - results (list) : the imported expressions returned by the platform
+
+    Returns :
+    - list : the result of each expression, in the same order as the expressions
+    """
+    if len(results) != len(expressions):
+      raise ValueError(f"{len(results)} results received for {len(expressions)} imported expressions")
+    if not all('source' in result for result in results):
+      return results
+    indexes = {}
+    for index, expression in enumerate(expressions):
+      indexes.setdefault(self.normalize_source(expression), []).append(index)
+    aligned = [None] * len(expressions)
+    for result in results:
+      matching = indexes.get(self.normalize_source(result['source']))
+      if not matching:
+        raise ValueError(f"The result {result['source']!r} of the bulk import matches none of the imported expressions")
+      aligned[matching.pop(0)] = result
+    mismatches = sum(1 for expression, result in zip(expressions, aligned) if result['source'] != expression)
+    if mismatches:
+      self.logger.warning('%s of %s results of the bulk import differ from the source of their expression',
+                          mismatches, len(expressions))
+    return aligned
+
   def post_synonyms(self, entity_slug, synonyms, target_language):
     """
     Import a list of synonyms on the CAI platform
@@ -119,7 +352,7 @@ class CaiClient:
     for synonym in synonyms:
       synonym_formatted = {'value': synonym, 'language': {'isocode': target_language}}
       list_synonyms.append(synonym_formatted)
-    response = requests.post(f"{self.url_prefix}/entities/{entity_slug}/synonyms/bulk_create",
-                             json={'synonyms': list_synonyms}, headers=self.headers)
+    response = self.send('post', f"{self.url_prefix}/entities/{entity_slug}/synonyms/bulk_create",
+                         json={'synonyms': list_synonyms})
     if response.status_code not in (200, 201):
       raise ValueError(response.text)
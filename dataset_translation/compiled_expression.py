@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import re
+import string
+from functools import lru_cache
+
+PUNCTUATION_REGEX = re.compile(f"[{re.escape(string.punctuation)}]")
+WORD_REGEX = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=None)
+def entity_name_without_punctuation(entity_name):
+  """
+  Remove the punctuations of an entity name
+
+  Args :
+    - entity_name (str) : the name of the entity
+
+  Returns :
+    - str : the entity name without punctuations
+  """
+  return PUNCTUATION_REGEX.sub('', entity_name)
+
+
+@lru_cache(maxsize=None)
+def duplicated_entity_name_regex(entity_name):
+  """
+  Regex matching the consecutive duplicates of an entity name without punctuations
+
+  Args :
+    - entity_name (str) : the entity name without punctuations
+
+  Returns :
+    - re.Pattern : the compiled regex
+  """
+  return re.compile(r"\b({})( \1\b)+".format(entity_name))
+
+
+class CompiledExpressionBuilder:
+  """
+  Builds a compiled expression token by token, without duplication of consecutive entity names.
+
+  The words and entity names are collected in a buffer joined once at the end. The consecutive duplicates of an entity
+  name are skipped as they are appended, the whole expression is only rescanned when the entity name can also be
+  found in the words of the expression, including the words of the entity names with several words.
+  """
+
+  def __init__(self):
+    self.parts = []
+    self.words = set()
+
+  def add_word(self, word):
+    """
+    Add a word in the compiled expression
+
+    Args :
+      - word (str) : the word
+    """
+    self.parts.append(word + " ")
+    self.words.update(WORD_REGEX.findall(word))
+
+  def add_entity_name(self, entity_name):
+    """
+    Add an entity name without punctuations in the compiled expression without duplication of the entity name
+
+    Args :
+      - entity_name (str) : the name of the entity
+    """
+    new_token_name = entity_name_without_punctuation(entity_name)
+    if WORD_REGEX.fullmatch(new_token_name) and new_token_name not in self.words:
+      last_part = self.parts[-1] if self.parts else ''
+      previous_character = last_part[-len(new_token_name) - 2:-len(new_token_name) - 1]
+      if last_part.endswith(new_token_name + " ") and WORD_REGEX.match(previous_character) is None:
+        return
+      self.parts.append(new_token_name + " ")
+    else:
+      self.words.update(WORD_REGEX.findall(new_token_name))
+      expression_compiled = ''.join(self.parts) + new_token_name + " "
+      self.parts = [duplicated_entity_name_regex(new_token_name).sub(r"\1", expression_compiled)]
+
+  def build(self):
+    """
+    Build the compiled expression
+
+    Returns:
+      - str : the compiled expression
+    """
+    return ''.join(self.parts)
@@ -1,12 +1,15 @@
 #!/usr/bin/env python3
-import json
 import logging
+from .json_stream import loads
+from .records import Entity, Expression, Gazette, Intent, Token
 
 class Dataset:
   """
   Corresponds to the CAI-format json dataset, can transform the exported dataset from the CAI platform to this format.
   """
 
+  SECTIONS = ('intents', 'entities', 'synonyms', 'expressions')
+
   def __init__(self):
     self.logger = logging.getLogger(__name__)
 
@@ -21,18 +24,80 @@ class Dataset:
     Returns :
       - dict : the transformed CAI-format dataset
     """
+    records = ((section, record) for section in self.SECTIONS for record in dataset[section])
+    return self.records_to_cai_format(records, language)
+
+  def records_to_cai_format(self, records, language):
+    """
+    Transforms the records of an exported dataset to a CAI-format dataset, record by record. The records come from the
+    sections of the exported dataset in any order, the synonyms and the expressions read before the intents and the
+    entities they refer to are kept until these sections are read.
 
+    Args :
+      - records (iterable) : the (section, record) pairs of the original exported dataset, like the ones of a
+      `JsonStreamReader`
+      - language (str) : the source language of the dataset
+
+    Returns :
+      - dict : the transformed CAI-format dataset
+    """
     cai_dataset = {'language': language, 'intents': [], 'gazettes': []}
+    pending = {'synonyms': [], 'expressions': []}
+    read_sections = set()
+    section = None
 
     self.logger.info('Transforming dataset')
-    cai_dataset['intents'] = self.fill_intents(dataset['intents'])
-    cai_dataset['gazettes'] = self.fill_gazettes(dataset['entities'], dataset['synonyms'], language)
-    self.fill_expressions(cai_dataset['intents'], cai_dataset['gazettes'], dataset['expressions'], language)
+    for key, record in records:
+      if key != section:
+        read_sections.add(section)
+        section = key
+        self.fill_pending(cai_dataset, pending, read_sections, language)
+      if key == 'intents':
+        cai_dataset['intents'].append(self.fill_intent(record))
+      elif key == 'entities':
+        cai_dataset['gazettes'].append(self.fill_gazette(record))
+      elif key in pending and record.get('language', language) == language:
+        pending[key].append(record)
+        self.fill_pending(cai_dataset, pending, read_sections, language)
+    read_sections.update(self.SECTIONS)
+    self.fill_pending(cai_dataset, pending, read_sections, language)
     self.logger.debug('Transformed dataset')
     return cai_dataset
 
+  def fill_pending(self, cai_dataset, pending, read_sections, language):
+    """
+    Fill the pending synonyms and expressions once the sections they refer to are read
+
+    Args :
+      - cai_dataset (dict) : the CAI-format dataset being filled
+      - pending (dict) : the pending synonyms and expressions of the original dataset
+      - read_sections (set) : the sections of the original dataset already read
+      - language (str) : the source language of the dataset
+    """
+    if pending['synonyms'] and 'entities' in read_sections:
+      for synonym in pending['synonyms']:
+        self.fill_synonym(cai_dataset['gazettes'], synonym, language)
+      pending['synonyms'].clear()
+    if pending['expressions'] and {'intents', 'entities'} <= read_sections:
+      self.fill_expressions(cai_dataset['intents'], cai_dataset['gazettes'], pending['expressions'], language)
+      pending['expressions'].clear()
+
   @staticmethod
-  def fill_intents(intents):
+  def fill_intent(intent):
+    """
+    Fill an intent in a CAI-format
+
+    Args :
+      - intent (dict) : an intent of the original dataset
+
+    Returns :
+      - Intent : the intent in a CAI-format
+    """
+    return Intent(intent['name'], intent['description'] if intent['description'] is not None else "",
+                  intent['strictness'], [])
+
+  @classmethod
+  def fill_intents(cls, intents):
     """
     Fill the intents in a CAI-format
 
@@ -42,61 +107,73 @@ class Dataset:
     Returns :
       - list : list of all the intents in a CAI-format
     """
-    list_intents = []
-    for intent in intents:
-      dict_intent = {
-        'name': intent['name'],
-        'description': intent['description'] if intent['description'] is not None else "",
-        'strictness': intent['strictness'],
-        'expressions': []
-        }
-      list_intents.append(dict_intent)
-    return list_intents
+    return [cls.fill_intent(intent) for intent in intents]
 
   @staticmethod
-  def fill_gazettes(dataset_entities, dataset_synonyms, language):
+  def fill_gazette(entity):
     """
-    Fill the gazettes in a CAI-format
+    Fill a gazette in a CAI-format, without its synonyms
 
     Args :
-      - dataset_entities (list) : list of all the entities of the original dataset
-      - dataset_synonyms (list) : list of all the synonyms of the original dataset
-      - language (str) : the source language of the original dataset
+      - entity (dict) : an entity of the original dataset
 
     Returns :
-      - list : list of all the synonyms in a CAI-format
+      - Gazette : the gazette in a CAI-format
     """
-    gazettes = []
     entity_type = {
       0: 'gold',
       1: 'free',
       2: 'restricted'
     }
-    for entity in dataset_entities:
-      dict_gazette = {
-        'name': entity['name'],
-        'slug': entity['slug'],
-        'locked': entity['locked'],
-        'type': entity_type[entity['type']],
-        'is_open': entity['is_open'],
-        'strictness': entity['strictness'],
-        'enrichment_strictness': entity['enrichment_strictness'],
-        'synonyms': [],
-        'regex_pattern': entity['regex_pattern'],
-        'regex_flags': entity['regex_flags']
-      }
-      gazettes.append(dict_gazette)
+    return Gazette(
+      name=entity['name'],
+      slug=entity['slug'],
+      locked=entity['locked'],
+      type=entity_type[entity['type']],
+      is_open=entity['is_open'],
+      strictness=entity['strictness'],
+      enrichment_strictness=entity['enrichment_strictness'],
+      synonyms=[],
+      regex_pattern=entity['regex_pattern'],
+      regex_flags=entity['regex_flags']
+    )
 
-    for synonym in dataset_synonyms:
-      if synonym['language'] == language:
-        gazettes[synonym['entity_id']]['synonyms'].append(synonym['value'])
+  @staticmethod
+  def fill_synonym(gazettes, synonym, language):
+    """
+    Add a synonym of the source language to its gazette
+
+    Args :
+      - gazettes (list) : list of all the gazettes in a CAI-format
+      - synonym (dict) : a synonym of the original dataset
+      - language (str) : the source language of the original dataset
+    """
+    if synonym['language'] == language:
+      gazettes[synonym['entity_id']]['synonyms'].append(synonym['value'])
+
+  @classmethod
+  def fill_gazettes(cls, dataset_entities, dataset_synonyms, language):
+    """
+    Fill the gazettes in a CAI-format
+
+    Args :
+      - dataset_entities (list) : list of all the entities of the original dataset
+      - dataset_synonyms (list) : list of all the synonyms of the original dataset
+      - language (str) : the source language of the original dataset
 
+    Returns :
+      - list : list of all the synonyms in a CAI-format
+    """
+    gazettes = [cls.fill_gazette(entity) for entity in dataset_entities]
+    for synonym in dataset_synonyms:
+      cls.fill_synonym(gazettes, synonym, language)
     return gazettes
 
-  @staticmethod
-  def fill_expressions(cai_dataset_intents, gazettes, dataset_expressions, language):
+  @classmethod
+  def fill_expressions(cls, cai_dataset_intents, gazettes, dataset_expressions, language):
     """
-    Update the list of intents by filling the expressions in a CAI-format
+    Update the list of intents by filling the expressions in a CAI-format. The tokens are only decoded for the
+    expressions of the source language, with a faster JSON parser when one is installed.
 
     Args :
       - new_dataset_intents (list) : list of all the intents of the CAI-format dataset
@@ -104,21 +181,33 @@ class Dataset:
       - dataset_expressions (list) : list of all the expressions of the original dataset
       - language (str) : the source language of the original dataset
     """
+    entities = {}
     for expression in dataset_expressions:
       if expression['language'] == language:
-        dict_expression = {
-          'source': expression['source'],
-          'tokens': json.loads(expression['tokens'])
-        }
-        for token in dict_expression['tokens']:
-          if 'entity_id' in token.keys():
-            entity = gazettes[token['entity_id']]
-            token['entity'] = {
-              'name': entity['name'],
-              'type': entity['type'],
-              'is_custom': entity['type'] != 'gold'
-            }
-            del token['entity_id']
-          else:
-            token['entity'] = None
-        cai_dataset_intents[expression['intent_id']]['expressions'].append(dict_expression)
+        cai_dataset_intents[expression['intent_id']]['expressions'].append(
+          Expression(expression['source'], cls.decode_tokens(expression['tokens'], gazettes, entities)))
+
+  @staticmethod
+  def decode_tokens(tokens, gazettes, entities):
+    """
+    Decode the tokens of an expression and replace the entity id of each token with its shared entity record
+
+    Args :
+      - tokens (str) : the JSON-encoded tokens of an expression of the original dataset
+      - gazettes (list) : list of all the synonyms of the original dataset
+      - entities (dict) : the entities already seen, by entity id
+
+    Returns :
+      - list : the CAI-format tokens
+    """
+    decoded_tokens = []
+    for token in loads(tokens):
+      entity_id = token.pop('entity_id', None)
+      entity = None
+      if entity_id is not None:
+        entity = entities.get(entity_id)
+        if entity is None:
+          gazette = gazettes[entity_id]
+          entity = entities[entity_id] = Entity.intern(gazette['name'], gazette['type'], gazette['type'] != 'gold')
+      decoded_tokens.append(Token.from_dict(token, entity))
+    return decoded_tokens
@@ -1,21 +1,25 @@
 #!/usr/bin/env python3
-import re
-import string
 import time
 import logging
 from datetime import timedelta
 from tqdm import tqdm
-from .translator import SAPTranslationHubTranslator, NoneTranslator
+from .translator import SAPTranslationHubTranslator, NoneTranslator, TranslationMemory
 from .cai_client import CaiClient
+from .token_manager import TokenManager
+from .transport import Transport
+from .translation_plan import TranslationPlan
+from .run_metrics import RunMetrics, timed
+from .journal import JournalState
+from .expression_annotation import ExpressionAnnotation
 
-class DatasetTranslation:
+class DatasetTranslation(ExpressionAnnotation):
   """
   Translates a CAI-format json dataset and imports the translated expressions and synonyms to the CAI platform and/or
   saves the translated CAI-format json dataset.
   """
-  SIZE_BATCH = 10
+  SIZE_BATCH = 50
 
-  def __init__(self, api, source_language, target_language, user_slug, bot_slug, version_slug, developer_token, bot_client_id, bot_client_secret, client_id=None, client_secret=None):  # pylint: disable=line-too-long,too-many-arguments
+  def __init__(self, api, source_language, target_language, user_slug, bot_slug, version_slug, developer_token, bot_client_id, bot_client_secret, client_id=None, client_secret=None, translation_memory=None, translation_memory_size=None, transport=None, cai_client=None, bulk_size=CaiClient.SIZE_BULK, writer=None, journal=None, token_manager=None, translator=None, metrics=None, delta=None, skip_existing=False):  # pylint: disable=line-too-long,too-many-arguments
     """
     Args :
         - api (str) : the Translator API
@@ -29,14 +33,48 @@ class DatasetTranslation:
         - bot_client_secret (str) : the bot's OAuth client secret for authentication of Designtime APIs on the CAI platform
         - client_id (str) : the client id of the SAP Translation Hub API account (optional)
         - client_secret (str) : the client secret of the SAP Translation Hub API account (optional)
+        - translation_memory (str) : the path of the SQLite translation memory file (optional)
+        - translation_memory_size (int) : the maximum number of translations kept in the translation memory (optional)
+        - transport (Transport) : the HTTP transport of the CAI client and the translator (optional)
+        - cai_client (CaiClient) : an already authenticated CAI client, instead of a new one (optional)
+        - bulk_size (int) : the number of expressions imported per request, 0 to import them one by one (optional)
+        - writer (DatasetWriter) : the writer saving the translated gazettes and intents as they are translated
+        (optional)
+        - journal (Journal) : the journal of the work done on the platform, replayed to resume a previous run
+        (optional)
+        - token_manager (TokenManager) : the cache of the access tokens of the CAI client and the translator (optional)
+        - translator (Translator) : an already configured translator, instead of the one of the API (optional)
+        - metrics (RunMetrics) : the metrics of the run, shared with the transport (optional)
+        - delta (DatasetDelta) : the previous translation carried over for the unchanged expressions and gazettes
+        (optional)
+        - skip_existing (bool) : to list the expressions of each intent already on the platform in the target language,
+        and annotate them instead of importing them again (optional)
     """
-    if api == 'saptranslationhub':
-      self.translator = SAPTranslationHubTranslator(source_language, target_language, client_id, client_secret)
+    self.transport = transport if transport is not None else Transport()
+    self.token_manager = token_manager if token_manager is not None else TokenManager()
+    self.metrics = metrics if metrics is not None else RunMetrics()
+    if translator is not None:
+      self.translator = translator
+    elif api == 'saptranslationhub':
+      self.translator = SAPTranslationHubTranslator(source_language, target_language, client_id, client_secret,
+                                                    transport=self.transport, token_manager=self.token_manager)
     else:
       self.translator = NoneTranslator(source_language, target_language)
+    if translation_memory is not None:
+      self.translator = TranslationMemory(self.translator, translation_memory, translation_memory_size)
     self.source_language = source_language
     self.target_language = target_language
-    self.cai_client = CaiClient(user_slug, bot_slug, version_slug, developer_token, bot_client_id, bot_client_secret)
+    if cai_client is None:
+      cai_client = CaiClient(user_slug, bot_slug, version_slug, developer_token, bot_client_id, bot_client_secret,
+                             transport=self.transport, token_manager=self.token_manager)
+    super().__init__(cai_client, journal)
+    self.bulk_size = bulk_size
+    self.writer = writer
+    self.state = journal.state if journal is not None else JournalState()
+    self.delta = delta
+    self.skip_existing = skip_existing
+    self.plan = None
+    self.gazettes_index = None
     self.logger = logging.getLogger(__name__)
 
   def dataset_translation(self, original_dataset):
@@ -53,30 +91,162 @@ class DatasetTranslation:
     dataset = original_dataset
     dataset['language'] = self.target_language
     start = time.time()
+    if self.writer is not None:
+      self.writer.open(self.target_language, dataset)
 
-    self.logger.info('Translating synonyms')
-    dataset['gazettes'] = self.translate_synonyms(dataset['gazettes'])
-    self.logger.debug('Translated synonyms')
-    self.logger.info('Translating expressions')
-    with tqdm(total=len([0 for intent in dataset['intents'] for _ in intent['expressions']]), desc='intents') as pbar:
-      for intent in dataset['intents']:
-        list_translations = self.translator.batch_translate([expression['source'] for expression in intent['expressions']],
-                                                            self.SIZE_BATCH)
-        for j, translation in enumerate(list_translations):
-          intent['expressions'][j]['source'] = translation
-
-        for expression in intent['expressions']:
-          if not expression['source']:
-            continue
-          translated_non_gold_tokens = self.translate_non_gold_tokens(expression['tokens'], dataset['gazettes'])
-          response_expression = self.cai_client.post_expression(intent['name'], expression['source'], self.target_language)
-          list_tokens = self.convert_token_cai(response_expression['tokens'])
-          expression['tokens'], expression['compiled'] = self.update_and_compile_expressions(list_tokens, translated_non_gold_tokens, expression, intent['name'], response_expression["id"])
-        pbar.update(len(intent['expressions']))
-    self.logger.debug('Translated expressions')
+    try:
+      self.plan_translations(self.restore(dataset))
+      self.logger.info('Translating synonyms')
+      dataset['gazettes'] = self.translate_synonyms(dataset['gazettes'])
+      self.invalidate_gazettes_index()
+      self.logger.debug('Translated synonyms')
+      self.logger.info('Translating expressions')
+      with tqdm(total=len([0 for intent in dataset['intents'] for _ in intent['expressions']]), desc='intents') as pbar:
+        for index, intent in enumerate(dataset['intents']):
+          self.translate_intent(intent)
+          self.import_expressions(intent, dataset['gazettes'])
+          self.write('intents', index, intent)
+          pbar.update(len(intent['expressions']))
+      self.logger.debug('Translated expressions')
+      if self.writer is not None:
+        self.writer.finish()
+    finally:
+      if self.writer is not None:
+        self.writer.close()
+      if self.journal is not None:
+        self.journal.close()
+    self.record_metrics()
     self.logger.info(" Handled in %s", timedelta(seconds=round(time.time()-start)))
     return dataset
 
+  def close(self):
+    """
+    Close the translation memory of the translator, if any
+    """
+    if isinstance(self.translator, TranslationMemory):
+      self.translator.close()
+
+  def record_metrics(self):
+    """
+    Record the cache hits of the translation plan and of the translation memory in the run metrics
+    """
+    if self.plan is not None:
+      stats = self.plan.stats()
+      self.metrics.record_cache('translation_plan', stats['strings'] - stats['unique_strings'], stats['unique_strings'])
+    if isinstance(self.translator, TranslationMemory):
+      stats = self.translator.stats()
+      self.logger.info('Translation memory: %s', stats)
+      self.metrics.record_cache('translation_memory', stats['hits'], stats['misses'])
+
+  def restore(self, dataset):
+    """
+    Restore the synonyms and the expressions translated and imported by a previous run from the journal, and the ones
+    left unchanged since the previous translation of the delta
+
+    Args :
+        - dataset (dict) : the CAI-format json dataset
+
+    Returns :
+        - dict : the part of the dataset still to be translated
+    """
+    self.invalidate_gazettes_index()
+    if self.delta is not None:
+      self.delta.apply(dataset, self.state, self.cai_client, self.metrics)
+    if not (self.state.gazettes or self.state.expressions):
+      return dataset
+    self.logger.info('Restored %s gazettes and %s expressions', len(self.state.gazettes), len(self.state.expressions))
+    return self.state.restore(dataset)
+
+  def journaled_expression(self, intent_name, index):
+    """
+    Entry of an expression imported by a previous run, or carried over from the previous translation
+
+    Args :
+        - intent_name (str) : the intent name of the expression
+        - index (int) : the index of the expression in its intent
+
+    Returns :
+        - dict : the translated source, the imported expression and, once annotated, the tokens and the compiled
+        expression, None if the expression was not imported
+    """
+    return self.state.expressions.get((intent_name, index))
+
+  @timed('translation_plan')
+  def plan_translations(self, dataset):
+    """
+    Translate once each unique source string of the dataset before the synonyms and expressions are handled, and
+    fill the table of the translations of the free/restricted entity tokens. The synonyms and the expressions are
+    translated here in as few batches as possible, so the time spent translating them is reported under this phase.
+
+    Args :
+        - dataset (dict) : the CAI-format json dataset
+    """
+    self.logger.info('Planning translations')
+    self.plan = TranslationPlan.from_dataset(dataset)
+    self.plan.translate(self.translator, self.SIZE_BATCH)
+    self.metrics.increment('translated_characters', self.plan.stats()['characters'])
+    self.prefetch_token_translations([expression['tokens'] for intent in dataset['intents']
+                                      for expression in intent['expressions']], dataset['gazettes'])
+    self.logger.debug('Planned translations: %s', self.plan.stats())
+
+  def prefetch_token_translations(self, token_lists, dataset_gazettes):
+    """
+    Translate in one batched pass the words of the free/restricted entity tokens missing from the table of the token
+    translations
+
+    Args :
+        - token_lists (list) : the lists of tokens of the expressions
+        - dataset_gazettes (list) : the list of the synonyms
+    """
+    gazette_names = self.index_gazettes(dataset_gazettes)
+    words = dict.fromkeys(token['word'] for tokens in token_lists for token in tokens
+                          if token['entity'] is not None and token['entity']['type'] != 'gold'
+                          and token['entity']['name'] in gazette_names and token['word'] not in self.token_translations)
+    if words:
+      translations = self.translate_texts(list(words), self.SIZE_BATCH)
+      self.token_translations.update(zip(words, [translation.lower() for translation in translations]))
+
+  def index_gazettes(self, dataset_gazettes):
+    """
+    Index the gazettes by name with the set of their synonyms, the index is kept for the same list of gazettes until
+    it is invalidated
+
+    Args :
+        - dataset_gazettes (list) : the list of the synonyms
+
+    Returns :
+        - dict : the gazettes of each name, with the set of their synonyms
+    """
+    if self.gazettes_index is None or self.gazettes_index[0] is not dataset_gazettes:
+      gazettes_by_name = {}
+      for gazette in dataset_gazettes:
+        gazettes_by_name.setdefault(gazette.get('name'), []).append((gazette, set(gazette['synonyms'] or [])))
+      self.gazettes_index = (dataset_gazettes, gazettes_by_name)
+    return self.gazettes_index[1]
+
+  def invalidate_gazettes_index(self):
+    """
+    Drop the index of the gazettes, once their synonyms are replaced in place
+    """
+    self.gazettes_index = None
+
+  def translate_texts(self, texts, batch_size):
+    """
+    Translate a list of texts, from the translation plan if all of them are planned
+
+    Args :
+        - texts (list) : the texts to translate
+        - batch_size (int) : the size of the batch to split the texts to translate
+
+    Returns :
+        - list : the list of translated texts
+    """
+    translations = self.plan.get(texts) if self.plan is not None else None
+    if translations is None:
+      translations = self.translator.batch_translate(texts, batch_size)
+      self.metrics.increment('translated_characters', sum(len(text) for text in texts))
+    return translations
+
   def translate_synonyms(self, dataset_gazettes):
     """
     Translate the synonyms of the CAI-format dataset
@@ -87,122 +257,162 @@ class DatasetTranslation:
     Returns:
       - list : the list of the translated synonyms
     """
-    for entity_gazettes in tqdm(dataset_gazettes, desc='synonyms'):
-      if entity_gazettes['synonyms']:
-        entity_gazettes['synonyms'] = self.translator.batch_translate(entity_gazettes['synonyms'], self.SIZE_BATCH)
-        self.cai_client.post_synonyms(entity_gazettes['slug'], entity_gazettes['synonyms'], self.target_language)
+    for index, entity_gazettes in enumerate(tqdm(dataset_gazettes, desc='synonyms')):
+      self.translate_gazette(entity_gazettes)
+      self.write('gazettes', index, entity_gazettes)
     return dataset_gazettes
 
-  def translate_non_gold_tokens(self, tokens, dataset_gazettes):
+  def write(self, section, index, record):
     """
-    Translate the tokens that are free or restricted entities and gather them in a hashmap with the corresponding
-    index of the token in the expression
+    Save a translated gazette or intent with the writer, if any
 
     Args:
-      - tokens (dict) : all the tokens in the expression
-      - dataset_gazettes (list) : the list of the synonyms
+      - section (str) : the section of the record, gazettes or intents
+      - index (int) : the index of the record in its section
+      - record (dict) : the translated gazette or intent
+    """
+    if self.writer is not None:
+      self.writer.write(section, index, record)
 
-    Returns:
-      - dict : all the possible translations of the free/restricted token with the corresponding index in the expression
-    """
-    translation_nongold_tokens = {}
-    for token_key, original_token in enumerate(tokens):
-      translation_tokens = []
-      if original_token['entity'] is not None and original_token['entity']['type'] != 'gold':
-        for gazette in dataset_gazettes:
-          if original_token['entity']['name'] == gazette['name']:
-            translation_token = self.translator.batch_translate([original_token['word']], 1)[0].lower()
-            translations_to_add = gazette['synonyms'] if len(gazette['synonyms']) != 0 else translation_token
-            translation_tokens.append(translations_to_add)
-            if len(gazette['synonyms']) != 0 and translation_token not in gazette['synonyms']:
-              translation_tokens.append(translation_token)
-            translation_nongold_tokens[token_key] = translation_tokens
-    for key, value in translation_nongold_tokens.items():
-      translation_nongold_tokens[key] = self.flatten(value)
-    return translation_nongold_tokens
-
-  def update_and_compile_expressions(self, list_tokens, translated_non_gold_tokens, expression, intent_name, expression_id):
-    """
-    Update the expression with free and restricted entities, and update the compiled expression
+  def translate_gazette(self, gazette):
+    """
+    Translate the synonyms of a gazette and import them on the platform
 
     Args:
-    - list_tokens (list) : the list of CAI-format tokens
-    - translation_nongold_tokens (dict): all the possible translations of the free/restricted token with the
-    corresponding index in the expression
-    - expression (dict) : the expression
-    - intent_name (str) : the intent name of the expression
+      - gazette (dict) : the CAI-format gazette
+    """
+    if gazette.get('slug') in self.state.gazettes:
+      return
+    if gazette['synonyms']:
+      gazette['synonyms'] = self.translate_texts(gazette['synonyms'], self.SIZE_BATCH)
+      self.invalidate_gazettes_index()
+      with self.metrics.phase('import'):
+        self.cai_client.post_synonyms(gazette['slug'], gazette['synonyms'], self.target_language)
+      if self.journal is not None:
+        self.journal.record_synonyms(gazette)
 
-    Returns:
-      - list : the list of updated tokens
-      - str : the updated compiled expression
-    """
-    expression_compiled = ''
-    for index, token in enumerate(list_tokens):
-      list_non_gold_tokens = [key for key, values in translated_non_gold_tokens.items() if token['word'].lower() in values]
-      if len(list_non_gold_tokens) != 0:
-        list_tokens[index] = expression['tokens'][list_non_gold_tokens[0]]
-        list_tokens[index]['word'] = token['word']
-        self.cai_client.update_expression(index, list_tokens[index], intent_name, expression['source'], expression_id)
-        expression_compiled = self.add_entity_name(list_tokens[index]['entity']['name'], expression_compiled)
-      elif token['entity'] is not None and token['entity']['type'] == 'gold':
-        expression_compiled = self.add_entity_name(list_tokens[index]['entity']['name'], expression_compiled)
-      else:
-        expression_compiled += token['word'] + " " if token['pos'] != 'PUNCT' else ''
-    return list_tokens, expression_compiled
+  def translate_intent(self, intent):
+    """
+    Translate the expressions of an intent
 
-  @staticmethod
-  def convert_token_cai(tokens):
+    Args:
+      - intent (dict) : the CAI-format intent
     """
-    Convert import-format token to a CAI-format token
+    indexes = [index for index in range(len(intent['expressions']))
+               if self.journaled_expression(intent['name'], index) is None]
+    list_translations = self.translate_texts([intent['expressions'][index]['source'] for index in indexes],
+                                             self.SIZE_BATCH)
+    for index, translation in zip(indexes, list_translations):
+      intent['expressions'][index]['source'] = translation
 
-    Args :
-        - tokens (list) : the import-format list of tokens
+  def import_expressions(self, intent, dataset_gazettes):
+    """
+    Import the translated expressions of an intent on the platform, in bulk requests unless the bulk size is 0, and
+    update their free and restricted entities and their compiled expressions. The expressions of each bulk request are
+    journaled as soon as it returns.
 
-    Returns:
-        - list : the list of CAI-format tokens
-    """
-    list_tokens = []
-    for token in tokens:
-      token_formatted = {
-        'word': token['word']['name'],
-        'space': token['space'],
-        'pos': token['part_of_speech'],
-        'entity': {'name': token['entity']['name'], 'type': token['entity']['type'], 'is_custom': token['entity']['custom']} if 'entity' in token else None
-      }
-      list_tokens.append(token_formatted)
-    return list_tokens
+    Args:
+      - intent (dict) : the CAI-format intent
+      - dataset_gazettes (list) : the list of the translated synonyms
+    """
+    expressions, imported = self.expressions_to_import(intent, self.existing_expressions(intent['name']))
+    if not self.bulk_size:
+      for index, expression in expressions:
+        self.import_expression(intent['name'], expression, dataset_gazettes, index)
+    else:
+      for start in range(0, len(expressions), self.bulk_size):
+        chunk = expressions[start:start + self.bulk_size]
+        with self.metrics.phase('import'):
+          responses = self.cai_client.post_expressions(intent['name'],
+                                                       [expression['source'] for _, expression in chunk],
+                                                       self.target_language, self.bulk_size)
+        for (index, expression), response_expression in zip(chunk, responses):
+          self.record_expression(intent['name'], index, expression, response_expression)
+          imported.append((index, expression, response_expression))
+    for index, expression, response_expression in imported:
+      self.annotate_expression(intent['name'], expression, response_expression, dataset_gazettes, index)
 
-  @staticmethod
-  def flatten(list_to_flatten):
+  def existing_expressions(self, intent_name):
     """
-    Flatten an irregular list of lists
+    Expressions of an intent already on the platform in the target language, when they are skipped
 
     Args:
-      - list_to_flatten (list) : the list to flatten
+      - intent_name (str) : the intent name
 
     Returns:
-      - list : the flatten list
+      - dict : the first expression on the platform of each source, empty unless the existing expressions are skipped
     """
-    final_list = []
-    for i in list_to_flatten:
-      if isinstance(i, list):
-        final_list.extend(i)
-      else:
-        final_list.append(i)
-    return final_list
+    if not self.skip_existing:
+      return {}
+    with self.metrics.phase('listing'):
+      expressions = self.cai_client.get_expressions(intent_name, self.target_language)
+    return self.first_by_source(expressions)
 
   @staticmethod
-  def add_entity_name(entity_name, expression_compiled):
+  def first_by_source(expressions):
     """
-    Add an entity name without punctuations in the compiled expression without duplication of the entity name
+    Args:
+      - expressions (list) : the expressions on the platform
 
-    Args :
-      - entity_name (str) : the name of the entity
-      - expression_compiled (str) : the compiled expression
+    Returns:
+      - dict : the first expression of each source
+    """
+    existing = {}
+    for expression in expressions:
+      existing.setdefault(expression['source'], expression)
+    return existing
+
+  def expressions_to_import(self, intent, existing=None):
+    """
+    Split the translated expressions of an intent between the ones to import and the ones imported by a previous run
+    but not annotated yet, or already on the platform
+
+    Args:
+      - intent (dict) : the CAI-format intent
+      - existing (dict) : the expressions of the intent already on the platform, by source (optional)
 
     Returns:
-      - str : the compiled expression with the entity name
+      - list : the (index, expression) of the expressions to import
+      - list : the (index, expression, response_expression) of the imported expressions to annotate
+    """
+    expressions, imported = [], []
+    for index, expression in enumerate(intent['expressions']):
+      entry = self.journaled_expression(intent['name'], index)
+      if entry is None and existing and expression['source'] in existing:
+        self.record_expression(intent['name'], index, expression, existing[expression['source']])
+        self.metrics.increment('existing_expressions')
+        imported.append((index, expression, existing[expression['source']]))
+      elif entry is None and expression['source']:
+        expressions.append((index, expression))
+      elif entry is not None and 'response' in entry and 'compiled' not in entry:
+        imported.append((index, expression, entry['response']))
+    return expressions, imported
+
+  def record_expression(self, intent_name, index, expression, response_expression):
+    """
+    Journal the import of a translated expression, if there is a journal
+
+    Args:
+      - intent_name (str) : the intent name of the expression
+      - index (int) : the index of the expression in its intent
+      - expression (dict) : the translated expression
+      - response_expression (dict) : the expression imported on the platform
+    """
+    if self.journal is not None and index is not None:
+      self.journal.record_expression(intent_name, index, expression, response_expression)
+
+  def import_expression(self, intent_name, expression, dataset_gazettes, index=None):
+    """
+    Import a translated expression on the platform and update its free and restricted entities and its compiled
+    expression
+
+    Args:
+      - intent_name (str) : the intent name of the expression
+      - expression (dict) : the translated expression
+      - dataset_gazettes (list) : the list of the translated synonyms
+      - index (int) : the index of the expression in its intent, to journal it (optional)
     """
-    regex = re.compile(f"[{re.escape(string.punctuation)}]")
-    new_token_name = regex.sub('', entity_name)
-    return re.sub(r"\b({})( \1\b)+".format(new_token_name), r"\1", expression_compiled + new_token_name + " ")
+    with self.metrics.phase('import'):
+      response_expression = self.cai_client.post_expression(intent_name, expression['source'], self.target_language)
+    self.record_expression(intent_name, index, expression, response_expression)
+    self.annotate_expression(intent_name, expression, response_expression, dataset_gazettes, index)
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+import gzip
+import json
+import zlib
+from .records import to_json
+
+
+class ZlibFile:
+  """
+  Text file compressed with zlib, like the datasets exported from the CAI platform
+  """
+
+  def __init__(self, path):
+    """
+    Args :
+      - path (str) : the path of the file
+    """
+    self.file = open(path, 'wb')  # pylint: disable=consider-using-with
+    self.compressor = zlib.compressobj()
+
+  def write(self, text):
+    self.file.write(self.compressor.compress(text.encode('utf-8')))
+
+  def flush(self):
+    self.file.write(self.compressor.flush(zlib.Z_SYNC_FLUSH))
+    self.file.flush()
+
+  def close(self):
+    self.file.write(self.compressor.flush())
+    self.file.close()
+
+
+class DatasetWriter:
+  """
+  Writes a translated CAI-format dataset to disk gazette by gazette and intent by intent, as they are translated,
+  instead of dumping the whole dataset at the end of the run.
+
+  The modes are :
+    - indent : the JSON dataset indented like `json.dump(dataset, indent=4)`
+    - compact : the JSON dataset without whitespaces
+    - ndjson : one expression per line, with the name of its intent, for the downstream tools
+
+  The records are written in the order of the dataset, the records finished in another order are kept until the
+  records before them are written.
+  """
+  MODES = ('indent', 'compact', 'ndjson')
+  COMPRESSIONS = ('gzip', 'zlib')
+  SECTIONS = ('gazettes', 'intents')
+
+  def __init__(self, path, mode='indent', compression=None):
+    """
+    Args :
+      - path (str) : the path of the output file
+      - mode (str) : the output mode, indent, compact or ndjson
+      - compression (str) : the compression of the output file, gzip or zlib (optional)
+    """
+    if mode not in self.MODES:
+      raise ValueError(f"Output mode {mode} is not valid")
+    if compression is not None and compression not in self.COMPRESSIONS:
+      raise ValueError(f"Compression {compression} is not valid")
+    self.path = path
+    self.mode = mode
+    self.compression = compression
+    self.file = None
+    self.section = None
+    self.count = 0
+    self.pending = {}
+    self.buffered = {}
+    self.members = []
+    self.sizes = None
+    self.position = 0
+    if mode == 'indent':
+      self.newline, self.indent, self.separators = '\n', ' ' * 4, (',', ': ')
+    else:
+      self.newline, self.indent, self.separators = '', '', (',', ':')
+
+  @staticmethod
+  def extension(mode, compression=None):
+    """
+    Extension of the output file
+
+    Args :
+      - mode (str) : the output mode
+      - compression (str) : the compression of the output file (optional)
+
+    Returns :
+      - str : the extension of the output file
+    """
+    return ('.ndjson' if mode == 'ndjson' else '.json') + {'gzip': '.gz', 'zlib': '.zlib'}.get(compression, '')
+
+  def open(self, language, dataset=None):
+    """
+    Open the output file and write the header of the dataset
+
+    Args :
+      - language (str) : the language of the dataset
+      - dataset (dict) : the dataset being translated, whose other top-level members are written through in its order,
+      by default the dataset has only the language, gazettes and intents (optional)
+    """
+    if self.compression == 'gzip':
+      self.file = gzip.open(self.path, 'wt', encoding='utf-8')
+    elif self.compression == 'zlib':
+      self.file = ZlibFile(self.path)
+    else:
+      self.file = open(self.path, 'w', encoding='utf-8')  # pylint: disable=consider-using-with
+    if dataset is None:
+      self.members = [('language', language)] + [(section, None) for section in self.SECTIONS]
+      self.sizes = None
+    else:
+      self.members = [(key, language if key == 'language' else value) for key, value in dataset.items()]
+      self.members += [(section, []) for section in self.SECTIONS if section not in dataset]
+      self.sizes = {section: len(dataset.get(section, [])) for section in self.SECTIONS}
+    self.position = 0
+    self.buffered = {}
+    if self.mode != 'ndjson':
+      self.file.write('{')
+    self.advance()
+
+  def dumps(self, value, level=0):
+    """
+    Dump a value in the output mode
+
+    Args :
+      - value (object) : the value to dump
+      - level (int) : the indentation level of the value
+
+    Returns :
+      - str : the dumped value
+    """
+    text = json.dumps(value, ensure_ascii=False, indent=4 if self.mode == 'indent' else None,
+                      separators=self.separators, default=to_json)
+    return text.replace('\n', '\n' + self.indent * level) if level else text
+
+  def write(self, section, index, record):
+    """
+    Write a translated record of the dataset once the records before it are written. When the sizes of the sections
+    are known, the records of a later section are kept until the sections before it are complete, otherwise writing
+    them closes the sections before it.
+
+    Args :
+      - section (str) : the section of the record, gazettes or intents
+      - index (int) : the index of the record in its section
+      - record (dict) : the translated gazette or intent
+    """
+    if section != self.section:
+      if section not in [key for key, _ in self.members[self.position:]]:
+        raise ValueError(f"Section {section} is written out of order")
+      if self.sizes is not None:
+        self.buffered.setdefault(section, {})[index] = record
+        return
+      self.end_section()
+      self.advance(section)
+    self.pending[index] = record
+    self.write_pending()
+    self.file.flush()
+
+  def write_pending(self):
+    """
+    Write the records of the section being written that follow the last written one, then close the section and start
+    the next one if all its records are written
+    """
+    while self.count in self.pending:
+      self.write_record(self.pending.pop(self.count))
+      self.count += 1
+    if self.sizes is not None and self.count == self.sizes[self.section]:
+      self.end_section()
+      self.advance()
+
+  def advance(self, section=None):
+    """
+    Write the next top-level members of the dataset and start the next section, or the given section after closing the
+    sections before it empty
+
+    Args :
+      - section (str) : the section to start (optional)
+    """
+    while self.position < len(self.members):
+      key, value = self.members[self.position]
+      self.position += 1
+      if key not in self.SECTIONS:
+        self.write_member(key, self.dumps(value, 1))
+        continue
+      self.write_member(key, '[')
+      self.section = key
+      if self.sizes is not None:
+        self.pending = self.buffered.pop(key, {})
+        self.write_pending()
+        return
+      if section in (None, key):
+        return
+      self.end_section()
+
+  def write_member(self, key, text):
+    """
+    Write the key of a top-level member of the dataset followed by its value
+
+    Args :
+      - key (str) : the key of the member
+      - text (str) : the dumped value of the member, or the start of a section
+    """
+    if self.mode != 'ndjson':
+      separator = ',' if self.position > 1 else ''
+      self.file.write(separator + self.newline + self.indent + self.dumps(key) + self.separators[1] + text)
+
+  def end_section(self):
+    """
+    Close the section being written
+    """
+    if self.section is None:
+      return
+    if self.pending:
+      raise ValueError(f"Records of {self.section} are missing before the records {sorted(self.pending)}")
+    if self.mode != 'ndjson':
+      self.file.write((self.newline + self.indent if self.count else '') + ']')
+    self.section = None
+    self.count = 0
+
+  def write_record(self, record):
+    """
+    Write a record of the section being written
+
+    Args :
+      - record (dict) : the translated gazette or intent
+    """
+    if self.mode == 'ndjson':
+      if self.section == 'intents':
+        for expression in record['expressions']:
+          self.file.write(self.dumps({'intent': record['name'], **expression}) + '\n')
+      return
+    self.file.write((',' if self.count else '') + self.newline + self.indent * 2 + self.dumps(record, 2))
+
+  def finish(self):
+    """
+    Write the sections and members not written yet and the end of the dataset
+    """
+    self.end_section()
+    while self.position < len(self.members):
+      self.advance()
+      self.end_section()
+    if self.mode != 'ndjson':
+      self.file.write(self.newline + '}')
+
+  def close(self):
+    """
+    Close the output file, the records already written stay on disk even if the dataset is not finished
+    """
+    if self.file is not None:
+      self.file.close()
+      self.file = None
+
+  def write_dataset(self, dataset):
+    """
+    Write a whole translated dataset
+
+    Args :
+      - dataset (dict) : the translated CAI-format dataset
+    """
+    self.open(dataset['language'], dataset)
+    try:
+      for section in self.SECTIONS:
+        for index, record in enumerate(dataset[section]):
+          self.write(section, index, record)
+      self.finish()
+    finally:
+      self.close()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import logging
+from collections import Counter, deque
+from .records import to_json
+
+
+def fingerprint(value):
+  """
+  Content hash of a value of a CAI-format dataset
+
+  Args :
+    - value (object) : the value, with records or dicts
+
+  Returns :
+    - str : the hexadecimal content hash
+  """
+  text = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=to_json)
+  return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def expression_fingerprint(expression):
+  """
+  Args :
+    - expression (dict) : a CAI-format expression
+
+  Returns :
+    - str : the content hash of the source and the tokens of the expression
+  """
+  return fingerprint([expression.get('source'), expression.get('tokens')])
+
+
+def intent_fingerprint(intent, expression_fingerprints):
+  """
+  Args :
+    - intent (dict) : a CAI-format intent
+    - expression_fingerprints (list) : the content hashes of the expressions of the intent
+
+  Returns :
+    - str : the content hash of the intent and its expressions
+  """
+  return fingerprint([intent.get('name'), intent.get('description'), intent.get('strictness'), expression_fingerprints])
+
+
+def gazette_fingerprint(gazette):
+  """
+  Args :
+    - gazette (dict) : a CAI-format gazette
+
+  Returns :
+    - str : the content hash of the gazette with its synonyms, without its id on the platform
+  """
+  return fingerprint({key: value for key, value in gazette.items() if key != 'id'})
+
+
+class DatasetDelta:
+  """
+  Difference between a source dataset and a previous snapshot of it, along with the translation of the snapshot into a
+  target language. The translations of the expressions and of the gazettes left unchanged since the snapshot are
+  carried over, so that only the added and changed ones are translated and imported.
+
+  The expressions are matched by the content hash of their source and tokens within their intent, an edited
+  expression counts as one removed and one added expression. The gazettes are matched by slug and hash. The removed
+  items are reported, and the translations of the expressions removed from the remaining intents can be deleted on the
+  platform, the removed intents being already deleted with all their expressions.
+  """
+
+  def __init__(self, previous_source, previous_translated, delete_removed=False):
+    """
+    Args :
+      - previous_source (dict) : the previous snapshot of the CAI-format source dataset
+      - previous_translated (dict) : the CAI-format dataset translated from the previous snapshot
+      - delete_removed (bool) : to delete on the platform the translations of the removed expressions
+    """
+    self.logger = logging.getLogger(__name__)
+    self.delete_removed = delete_removed
+    if len(previous_source['gazettes']) != len(previous_translated['gazettes']) or \
+        len(previous_source['intents']) != len(previous_translated['intents']):
+      raise ValueError('The previous translated dataset was not translated from the previous source dataset')
+    self.gazettes = {
+      gazette.get('slug'): (gazette_fingerprint(gazette), translated_gazette)
+      for gazette, translated_gazette in zip(previous_source['gazettes'], previous_translated['gazettes'])
+    }
+    self.intents = {}
+    for intent, translated_intent in zip(previous_source['intents'], previous_translated['intents']):
+      if intent['name'] != translated_intent['name'] or \
+          len(intent['expressions']) != len(translated_intent['expressions']):
+        raise ValueError(f"The previous translated intent {translated_intent['name']} was not translated from the "
+                         f"previous source intent {intent['name']}")
+      fingerprints = [expression_fingerprint(expression) for expression in intent['expressions']]
+      self.intents[intent['name']] = (intent_fingerprint(intent, fingerprints), [
+        (content_hash, translated_expression, expression.get('id'))
+        for content_hash, expression, translated_expression
+        in zip(fingerprints, intent['expressions'], translated_intent['expressions'])
+      ])
+    self.stats = Counter()
+    self.removed = {'intents': [], 'expressions': [], 'gazettes': []}
+
+  def apply(self, dataset, state, cai_client=None, metrics=None):
+    """
+    Carry over the translations of the unchanged expressions and gazettes into the work already done, report the
+    removed ones, and delete the removed expressions on the platform if asked to
+
+    Args :
+      - dataset (dict) : the CAI-format source dataset
+      - state (JournalState) : the work already done, where a resumed journal has precedence over the previous
+      translation
+      - cai_client (CaiClient) : the CAI client deleting the removed expressions (optional)
+      - metrics (RunMetrics) : the metrics of the run, counting the unchanged, changed, added and removed items
+      (optional)
+
+    Returns :
+      - dict : the number of unchanged, changed, added and removed intents, expressions and gazettes
+    """
+    self.carry_over_gazettes(dataset['gazettes'], state)
+    names = set()
+    for intent in dataset['intents']:
+      names.add(intent['name'])
+      self.carry_over_intent(intent, state)
+    for name, (_, expressions) in self.intents.items():
+      if name not in names:
+        self.removed['intents'].append(name)
+        self.stats['removed_intents'] += 1
+        self.stats['removed_expressions'] += len(expressions)
+    if self.delete_removed and cai_client is not None:
+      self.delete(cai_client)
+    self.logger.info('Changes since the previous translation: %s', dict(self.stats))
+    if self.removed['intents'] or self.removed['gazettes']:
+      self.logger.info('Removed intents: %s, removed gazettes: %s', self.removed['intents'], self.removed['gazettes'])
+    if metrics is not None:
+      for name, value in self.stats.items():
+        metrics.increment(f"delta_{name}", value)
+    return dict(self.stats)
+
+  def carry_over_gazettes(self, gazettes, state):
+    """
+    Args :
+      - gazettes (list) : the CAI-format source gazettes
+      - state (JournalState) : the work already done
+    """
+    slugs = set()
+    for gazette in gazettes:
+      slugs.add(gazette.get('slug'))
+      previous = self.gazettes.get(gazette.get('slug'))
+      if previous is None:
+        self.stats['added_gazettes'] += 1
+      elif previous[0] != gazette_fingerprint(gazette):
+        self.stats['changed_gazettes'] += 1
+      else:
+        self.stats['unchanged_gazettes'] += 1
+        state.gazettes.setdefault(gazette['slug'], previous[1]['synonyms'])
+    for slug in self.gazettes:
+      if slug not in slugs:
+        self.removed['gazettes'].append(slug)
+        self.stats['removed_gazettes'] += 1
+
+  def carry_over_intent(self, intent, state):
+    """
+    Args :
+      - intent (dict) : a CAI-format source intent
+      - state (JournalState) : the work already done
+    """
+    fingerprints = [expression_fingerprint(expression) for expression in intent['expressions']]
+    previous = self.intents.get(intent['name'])
+    if previous is None:
+      self.stats['added_intents'] += 1
+      self.stats['added_expressions'] += len(fingerprints)
+      return
+    unchanged = previous[0] == intent_fingerprint(intent, fingerprints)
+    self.stats['unchanged_intents' if unchanged else 'changed_intents'] += 1
+    candidates = {}
+    for content_hash, translated_expression, source_id in previous[1]:
+      candidates.setdefault(content_hash, deque()).append((translated_expression, source_id))
+    for index, content_hash in enumerate(fingerprints):
+      matches = candidates.get(content_hash)
+      if matches:
+        translated_expression, source_id = matches.popleft()
+        state.expressions.setdefault((intent['name'], index), self.entry(translated_expression, source_id))
+        self.stats['unchanged_expressions'] += 1
+      else:
+        self.stats['added_expressions'] += 1
+    for matches in candidates.values():
+      for translated_expression, source_id in matches:
+        expression_id = translated_expression.get('id')
+        self.removed['expressions'].append((intent['name'], translated_expression['source'],
+                                            expression_id if expression_id != source_id else None))
+        self.stats['removed_expressions'] += 1
+
+  @staticmethod
+  def entry(translated_expression, source_id):
+    """
+    Work already done for an unchanged expression, in the shape of the entries of a resumed journal
+
+    Args :
+      - translated_expression (dict) : the previous translation of the expression
+      - source_id (str) : the id of the source expression, kept by the translations that were not imported
+
+    Returns :
+      - dict : the translated source, tokens and compiled expression, with the id of the imported translation
+    """
+    entry = {key: translated_expression[key] for key in ('source', 'tokens', 'compiled')
+             if key in translated_expression}
+    if translated_expression.get('id') not in (None, source_id):
+      entry['id'] = translated_expression['id']
+    return entry
+
+  def delete(self, cai_client):
+    """
+    Delete on the platform the translations of the expressions removed from the intents still in the dataset
+
+    Args :
+      - cai_client (CaiClient) : the CAI client
+    """
+    missing_ids = 0
+    for intent_name, _, expression_id in self.removed['expressions']:
+      if expression_id is None:
+        missing_ids += 1
+        continue
+      cai_client.delete_expression(intent_name, expression_id)
+      self.stats['deleted_expressions'] += 1
+    if missing_ids:
+      self.logger.warning('%s removed expressions have no id in the previous translation and are not deleted',
+                          missing_ids)
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+import copy
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import timedelta
+from .cai_client import CaiClient
+from .dataset_translation import DatasetTranslation
+from .json_stream import loads
+from .records import Gazette, Intent, dataset_from_json, to_json
+from .run_metrics import RunMetrics
+from .token_manager import TokenManager
+from .translator import TranslationMemory
+from .transport import Transport
+
+
+def dumps(value):
+  """
+  Args :
+    - value (dict) : a job or a result, with records or dicts
+
+  Returns :
+    - str : the compact JSON of the value
+  """
+  return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=to_json)
+
+
+class DistributedTranslation:
+  """
+  Coordinator of the translation of a CAI-format json dataset by `TranslationWorker`s on one or more nodes.
+
+  The dataset is split into jobs on a `WorkQueue`: one job per gazette and target language first, whose synonyms are
+  translated by the workers and imported once by the coordinator, then jobs of a few intents per target language,
+  each one carrying the translated gazettes of the entities of its intents. The workers translate and import the
+  intents, and the results of the jobs are merged back into the translated dataset of each target language. The ids
+  of the jobs are prefixed by the id of the run, so that several coordinators can share a queue, and the jobs of a run
+  are removed from the queue once it is over.
+  """
+  INTENTS_PER_JOB = 1
+  POLL_INTERVAL = 1
+
+  def __init__(self, queue, cai_client, source_language, target_languages, intents_per_job=INTENTS_PER_JOB, poll_interval=POLL_INTERVAL, timeout=None, metrics=None):  # pylint: disable=line-too-long,too-many-arguments
+    """
+    Args :
+        - queue (WorkQueue) : the work queue shared with the workers
+        - cai_client (CaiClient) : the CAI client importing the translated synonyms
+        - source_language (str) : the isocode of the source language
+        - target_languages (list) : the isocodes of the target languages
+        - intents_per_job (int) : the number of intents translated by each job (optional)
+        - poll_interval (float) : the seconds between two checks of the results of the jobs (optional)
+        - timeout (float) : the maximum seconds to wait for the results of the jobs of a stage (optional)
+        - metrics (RunMetrics) : the metrics of the run (optional)
+    """
+    self.queue = queue
+    self.cai_client = cai_client
+    self.source_language = source_language
+    self.target_languages = list(dict.fromkeys(target_languages))
+    self.intents_per_job = max(intents_per_job, 1)
+    self.poll_interval = poll_interval
+    self.timeout = timeout
+    self.metrics = metrics if metrics is not None else RunMetrics()
+    self.run_id = None
+    self.logger = logging.getLogger(__name__)
+
+  def dataset_translation(self, original_dataset):
+    """
+    Translates the expressions and synonyms into each target language with the workers, and merges their results
+
+    Args :
+        - original_dataset (dict) : the CAI-format json dataset
+
+    Returns :
+        - dict : the translated dataset of each target language
+    """
+    start = time.time()
+    self.run_id = uuid.uuid4().hex
+    datasets = [copy.deepcopy(original_dataset) for _ in range(len(self.target_languages) - 1)] + [original_dataset]
+    datasets = dict(zip(self.target_languages, datasets))
+    with self.metrics.phase('distributed_gazettes'):
+      results = self.run_jobs({
+        f"{self.run_id}:{language}:gazette:{index}": self.job(language, [gazette], [])
+        for language, dataset in datasets.items() for index, gazette in enumerate(dataset['gazettes'])
+      })
+    for job_id, result in results.items():
+      _, language, _, index = job_id.split(':')
+      datasets[language]['gazettes'][int(index)] = Gazette.from_dict(result['gazettes'][0])
+    with self.metrics.phase('distributed_synonyms'):
+      self.post_synonyms(datasets)
+    with self.metrics.phase('distributed_intents'):
+      results = self.run_jobs({
+        f"{self.run_id}:{language}:intents:{index}": self.intents_job(language, dataset, index)
+        for language, dataset in datasets.items() for index in range(0, len(dataset['intents']), self.intents_per_job)
+      })
+    for job_id, result in results.items():
+      _, language, _, index = job_id.split(':')
+      intents = [Intent.from_dict(intent) for intent in result['intents']]
+      datasets[language]['intents'][int(index):int(index) + len(intents)] = intents
+    for language, dataset in datasets.items():
+      dataset['language'] = language
+    self.logger.info(" Handled %s languages in %s", len(datasets), timedelta(seconds=round(time.time()-start)))
+    return datasets
+
+  def post_synonyms(self, datasets):
+    """
+    Import the translated synonyms of each target language on the platform, once whatever the retries of their jobs
+
+    Args :
+        - datasets (dict) : the dataset of each target language, with the translated gazettes
+    """
+    for language, dataset in datasets.items():
+      for gazette in dataset['gazettes']:
+        if gazette['synonyms']:
+          self.cai_client.post_synonyms(gazette['slug'], gazette['synonyms'], language)
+
+  def job(self, target_language, gazettes, intents):
+    """
+    Args :
+        - target_language (str) : the isocode of the target language of the job
+        - gazettes (list) : the gazettes to translate, or the translated gazettes of the entities of the intents
+        - intents (list) : the intents to translate
+
+    Returns :
+        - dict : the job, translating the gazettes if there are no intents and else the intents
+    """
+    return {
+      'kind': 'intents' if intents else 'gazettes',
+      'target_language': target_language,
+      'dataset': {'language': self.source_language, 'gazettes': gazettes, 'intents': intents}
+    }
+
+  def intents_job(self, target_language, dataset, index):
+    """
+    Args :
+        - target_language (str) : the isocode of the target language of the job
+        - dataset (dict) : the CAI-format json dataset, with the translated gazettes
+        - index (int) : the index of the first intent of the job
+
+    Returns :
+        - dict : the job translating the intents from the index, with the translated gazettes of their entities
+    """
+    intents = dataset['intents'][index:index + self.intents_per_job]
+    names = {token['entity']['name'] for intent in intents for expression in intent['expressions']
+             for token in expression['tokens'] if token['entity'] is not None and token['entity']['type'] != 'gold'}
+    return self.job(target_language, [gazette for gazette in dataset['gazettes'] if gazette.get('name') in names],
+                    intents)
+
+  def run_jobs(self, jobs):
+    """
+    Queue jobs and wait for their results, then remove them from the queue
+
+    Args :
+        - jobs (dict) : the jobs by id
+
+    Returns :
+        - dict : the result of each job
+    """
+    for job_id, job in jobs.items():
+      self.queue.push(job_id, dumps(job))
+    self.metrics.increment('distributed_jobs', len(jobs))
+    try:
+      return self.wait_results(jobs)
+    finally:
+      self.queue.remove(list(jobs))
+
+  def wait_results(self, jobs):
+    """
+    Wait for the results of queued jobs
+
+    Args :
+        - jobs (dict) : the jobs by id
+
+    Returns :
+        - dict : the result of each job
+    """
+    deadline = time.monotonic() + self.timeout if self.timeout is not None else None
+    results = {}
+    while True:
+      pending = [job_id for job_id in jobs if job_id not in results]
+      results.update((job_id, loads(result)) for job_id, result in self.queue.results(pending).items())
+      pending = [job_id for job_id in pending if job_id not in results]
+      errors = self.queue.errors(pending)
+      if errors:
+        for job_id, error in errors.items():
+          self.logger.error('Job %s failed: %s', job_id, error)
+        raise ValueError(f"{len(errors)} jobs failed, {next(iter(errors))}: {next(iter(errors.values()))}")
+      if not pending:
+        return results
+      if deadline is not None and time.monotonic() > deadline:
+        raise TimeoutError(f"{len(pending)} of {len(jobs)} jobs still running after {self.timeout}s")
+      self.logger.debug('Completed %s of %s jobs', len(results), len(jobs))
+      time.sleep(self.poll_interval)
+
+
+class TranslationWorker:
+  """
+  Worker translating and importing the jobs of a `DistributedTranslation` coordinator, from a `WorkQueue`.
+
+  Each job is translated by its own `DatasetTranslation` (or `AsyncDatasetTranslation`), sharing the transport, the
+  token manager, the CAI client and the translator of its languages with the other jobs of the worker. The jobs of
+  gazettes are only translated, their synonyms being imported by the coordinator. A job whose translation fails is
+  delivered again by the queue, as well as the jobs of a worker that died, so the expressions of a job of intents may
+  already be on the platform: the retries of a job always skip the expressions already there.
+  """
+  POLL_INTERVAL = 1
+
+  def __init__(self, queue, api, user_slug, bot_slug, version_slug, developer_token, bot_client_id, bot_client_secret, engine=DatasetTranslation, transport=None, cai_client=None, token_manager=None, metrics=None, poll_interval=POLL_INTERVAL, **options):  # pylint: disable=line-too-long,too-many-arguments
+    """
+    Args :
+        - queue (WorkQueue) : the work queue shared with the coordinator
+        - api (str) : the Translator API
+        - user_slug (str) : the user slug of the bot owner on the CAI platform
+        - bot_slug (str) : the bot slug of the bot on the CAI platform
+        - version_slug (str) : the version of the bot on the CAI platform
+        - developer_token (str) : the developer token of the bot owner on the CAI platform
+        - bot_client_id (str) : the bot's OAuth client id for authentication of Designtime APIs on the CAI platform
+        - bot_client_secret (str) : the bot's OAuth client secret for authentication of Designtime APIs on the CAI platform
+        - engine (type) : `DatasetTranslation` or `AsyncDatasetTranslation` (optional)
+        - transport (Transport) : the HTTP transport shared by the jobs (optional)
+        - cai_client (CaiClient) : an already authenticated CAI client, instead of a new one (optional)
+        - token_manager (TokenManager) : the cache of the access tokens shared by the jobs (optional)
+        - metrics (RunMetrics) : the metrics of the jobs of the worker (optional)
+        - poll_interval (float) : the seconds to wait when no job is visible (optional)
+        - options : the other arguments of the engine, the same for all the jobs
+    """
+    self.queue = queue
+    self.api = api
+    self.credentials = (user_slug, bot_slug, version_slug, developer_token, bot_client_id, bot_client_secret)
+    self.engine = engine
+    self.transport = transport if transport is not None else Transport()
+    self.token_manager = token_manager if token_manager is not None else TokenManager()
+    if cai_client is None:
+      cai_client = CaiClient(*self.credentials, transport=self.transport, token_manager=self.token_manager)
+    self.cai_client = cai_client
+    self.metrics = metrics if metrics is not None else RunMetrics()
+    self.poll_interval = poll_interval
+    self.options = options
+    self.translators = {}
+    self.stopped = threading.Event()
+    self.logger = logging.getLogger(__name__)
+
+  def run(self, max_jobs=None, stop_when_idle=False):
+    """
+    Handle the jobs of the queue until the worker is stopped
+
+    Args :
+        - max_jobs (int) : the maximum number of jobs to handle (optional)
+        - stop_when_idle (bool) : to stop once no job is visible, instead of waiting for more (optional)
+
+    Returns :
+        - int : the number of jobs handled
+    """
+    handled = 0
+    while not self.stopped.is_set() and (max_jobs is None or handled < max_jobs):
+      reserved = self.queue.reserve()
+      if reserved is None:
+        if stop_when_idle:
+          break
+        self.stopped.wait(self.poll_interval)
+        continue
+      self.process(*reserved)
+      handled += 1
+    return handled
+
+  def stop(self):
+    """
+    Stop the worker once its current job is handled
+    """
+    self.stopped.set()
+
+  def close(self):
+    """
+    Close the translation memories of the translators of the worker
+    """
+    for translator in self.translators.values():
+      if isinstance(translator, TranslationMemory):
+        translator.close()
+
+  def process(self, job_id, job, attempt):
+    """
+    Handle a reserved job, and complete it with its result or fail it with its error
+
+    Args :
+        - job_id (str) : the id of the job
+        - job (str) : the job
+        - attempt (int) : the attempt number of the job
+    """
+    self.logger.info('Handling job %s, attempt %s', job_id, attempt)
+    try:
+      result = self.handle(loads(job), attempt)
+    except Exception as error:  # pylint: disable=broad-except
+      retried = self.queue.fail(job_id, attempt, f"{type(error).__name__}: {error}")
+      self.logger.warning('Job %s failed%s: %s', job_id, ', retrying' if retried else '', error)
+      self.metrics.increment('distributed_failed_jobs')
+      return
+    self.queue.ack(job_id, dumps(result))
+    self.metrics.increment('distributed_completed_jobs')
+
+  def handle(self, job, attempt=1):
+    """
+    Translate the synonyms of a job of gazettes, or translate and import the intents of a job of intents
+
+    Args :
+        - job (dict) : the job
+        - attempt (int) : the attempt number of the job, its retries skipping the expressions already imported
+
+    Returns :
+        - dict : the translated gazettes of a gazettes job, or the translated intents of an intents job
+    """
+    dataset = dataset_from_json(job['dataset'])
+    translation = self.translation(dataset['language'], job['target_language'], skip_existing=attempt > 1)
+    if job['kind'] == 'gazettes':
+      for gazette in dataset['gazettes']:
+        if gazette['synonyms']:
+          gazette['synonyms'] = translation.translate_texts(gazette['synonyms'], translation.SIZE_BATCH)
+      return {'gazettes': dataset['gazettes']}
+    for gazette in dataset['gazettes']:
+      translation.state.gazettes[gazette.get('slug')] = gazette['synonyms']
+    dataset = translation.dataset_translation(dataset)
+    return {'intents': dataset['intents']}
+
+  def translation(self, source_language, target_language, skip_existing=False):
+    """
+    Args :
+        - source_language (str) : the isocode of the source language of the job
+        - target_language (str) : the isocode of the target language of the job
+        - skip_existing (bool) : to skip the expressions already on the platform, whatever the options of the worker
+
+    Returns :
+        - DatasetTranslation : the translation of a job, with the translator of its languages
+    """
+    translator = self.translators.get((source_language, target_language))
+    options = self.options if translator is None else {**self.options, 'translation_memory': None}
+    if skip_existing:
+      options = {**options, 'skip_existing': True}
+    translation = self.engine(self.api, source_language, target_language, *self.credentials,
+                              transport=self.transport, cai_client=self.cai_client,
+                              token_manager=self.token_manager, metrics=self.metrics, translator=translator,
+                              **options)
+    self.translators[(source_language, target_language)] = translation.translator
+    return translation
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+from abc import ABC, abstractmethod
+from .run_metrics import timed
+from .records import Entity, Token
+from .compiled_expression import CompiledExpressionBuilder, entity_name_without_punctuation, duplicated_entity_name_regex
+
+
+class ExpressionAnnotation(ABC):
+  """
+  Annotation of the translated expressions imported on the platform: their free and restricted entity tokens are
+  updated with the translations of the original tokens, and their compiled expression is built.
+
+  Base of `DatasetTranslation`, which indexes the gazettes and fills the table of the token translations.
+  """
+
+  def __init__(self, cai_client, journal=None):
+    """
+    Args :
+        - cai_client (CaiClient) : the CAI client updating the tokens of the imported expressions
+        - journal (Journal) : the journal of the annotated expressions (optional)
+    """
+    self.cai_client = cai_client
+    self.journal = journal
+    self.token_translations = {}
+
+  @abstractmethod
+  def index_gazettes(self, dataset_gazettes):
+    """
+    Args :
+        - dataset_gazettes (list) : the list of the synonyms
+
+    Returns :
+        - dict : the gazettes of each name, with the set of their synonyms
+    """
+
+  @abstractmethod
+  def prefetch_token_translations(self, token_lists, dataset_gazettes):
+    """
+    Fill the table of the token translations with the words of the free/restricted entity tokens
+
+    Args :
+        - token_lists (list) : the lists of tokens of the expressions
+        - dataset_gazettes (list) : the list of the synonyms
+    """
+
+  def annotate_expression(self, intent_name, expression, response_expression, dataset_gazettes, index=None):  # pylint: disable=too-many-arguments
+    """
+    Update the free and restricted entities and the compiled expression of an imported expression
+
+    Args:
+      - intent_name (str) : the intent name of the expression
+      - expression (dict) : the translated expression
+      - response_expression (dict) : the expression imported on the platform
+      - dataset_gazettes (list) : the list of the translated synonyms
+      - index (int) : the index of the expression in its intent, to journal it (optional)
+    """
+    translated_non_gold_tokens = self.translate_non_gold_tokens(expression['tokens'], dataset_gazettes)
+    list_tokens = self.convert_token_cai(response_expression['tokens'])
+    expression['id'] = response_expression['id']
+    expression['tokens'], expression['compiled'] = self.update_and_compile_expressions(list_tokens, translated_non_gold_tokens, expression, intent_name, response_expression["id"])
+    if self.journal is not None and index is not None:
+      self.journal.record_annotation(intent_name, index, expression)
+
+  def translate_non_gold_tokens(self, tokens, dataset_gazettes):
+    """
+    Translate the tokens that are free or restricted entities and gather them in a hashmap with the corresponding
+    index of the token in the expression
+
+    Args:
+      - tokens (dict) : all the tokens in the expression
+      - dataset_gazettes (list) : the list of the synonyms
+
+    Returns:
+      - dict : all the possible translations of the free/restricted token with the corresponding index in the expression
+    """
+    gazettes_by_name = self.index_gazettes(dataset_gazettes)
+    self.prefetch_token_translations([tokens], dataset_gazettes)
+    translation_nongold_tokens = {}
+    for token_key, original_token in enumerate(tokens):
+      translation_tokens = []
+      if original_token['entity'] is not None and original_token['entity']['type'] != 'gold':
+        for gazette, synonyms in gazettes_by_name.get(original_token['entity']['name'], []):
+          translation_token = self.token_translations[original_token['word']]
+          translations_to_add = gazette['synonyms'] if len(gazette['synonyms']) != 0 else translation_token
+          translation_tokens.append(translations_to_add)
+          if len(gazette['synonyms']) != 0 and translation_token not in synonyms:
+            translation_tokens.append(translation_token)
+          translation_nongold_tokens[token_key] = translation_tokens
+    for key, value in translation_nongold_tokens.items():
+      translation_nongold_tokens[key] = self.flatten(value)
+    return translation_nongold_tokens
+
+  @timed('token_update')
+  def update_and_compile_expressions(self, list_tokens, translated_non_gold_tokens, expression, intent_name, expression_id):
+    """
+    Update the expression with free and restricted entities in a single request, unless the platform already has
+    them, and update the compiled expression
+
+    Args:
+    - list_tokens (list) : the list of CAI-format tokens
+    - translation_nongold_tokens (dict): all the possible translations of the free/restricted token with the
+    corresponding index in the expression
+    - expression (dict) : the expression
+    - intent_name (str) : the intent name of the expression
+
+    Returns:
+      - list : the list of updated tokens
+      - str : the updated compiled expression
+    """
+    token_keys_by_word = {}
+    for key, values in translated_non_gold_tokens.items():
+      for value in values:
+        token_keys_by_word.setdefault(value, key)
+    expression_compiled = CompiledExpressionBuilder()
+    updated_tokens = []
+    for index, token in enumerate(list_tokens):
+      non_gold_token_key = token_keys_by_word.get(token['word'].lower())
+      if non_gold_token_key is not None:
+        list_tokens[index] = expression['tokens'][non_gold_token_key]
+        list_tokens[index]['word'] = token['word']
+        if token['entity'] is None or token['entity']['name'] != list_tokens[index]['entity']['name']:
+          updated_tokens.append((index, dict(list_tokens[index])))
+        expression_compiled.add_entity_name(list_tokens[index]['entity']['name'])
+      elif token['entity'] is not None and token['entity']['type'] == 'gold':
+        expression_compiled.add_entity_name(list_tokens[index]['entity']['name'])
+      elif token['pos'] != 'PUNCT':
+        expression_compiled.add_word(token['word'])
+    if updated_tokens:
+      self.cai_client.update_expression_tokens(updated_tokens, intent_name, expression['source'], expression_id)
+    return list_tokens, expression_compiled.build()
+
+  @staticmethod
+  def convert_token_cai(tokens):
+    """
+    Convert import-format token to a CAI-format token
+
+    Args :
+        - tokens (list) : the import-format list of tokens
+
+    Returns:
+        - list : the list of CAI-format tokens
+    """
+    list_tokens = []
+    for token in tokens:
+      entity = Entity.intern(token['entity']['name'], token['entity']['type'], token['entity']['custom']) if 'entity' in token else None
+      list_tokens.append(Token(token['word']['name'], token['space'], token['part_of_speech'], entity))
+    return list_tokens
+
+  @staticmethod
+  def flatten(list_to_flatten):
+    """
+    Flatten an irregular list of lists
+
+    Args:
+      - list_to_flatten (list) : the list to flatten
+
+    Returns:
+      - list : the flatten list
+    """
+    final_list = []
+    for i in list_to_flatten:
+      if isinstance(i, list):
+        final_list.extend(i)
+      else:
+        final_list.append(i)
+    return final_list
+
+  @staticmethod
+  def add_entity_name(entity_name, expression_compiled):
+    """
+    Add an entity name without punctuations in the compiled expression without duplication of the entity name
+
+    Args :
+      - entity_name (str) : the name of the entity
+      - expression_compiled (str) : the compiled expression
+
+    Returns:
+      - str : the compiled expression with the entity name
+    """
+    new_token_name = entity_name_without_punctuation(entity_name)
+    return duplicated_entity_name_regex(new_token_name).sub(r"\1", expression_compiled + new_token_name + " ")
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+import json
+import logging
+import os
+import threading
+import time
+from .records import to_json
+
+
+class JournalState:
+  """
+  Work already done by a previous run, replayed from its journal, or carried over from a previous translation by a
+  `DatasetDelta`
+  """
+
+  def __init__(self):
+    self.gazettes = {}
+    self.expressions = {}
+
+  def apply(self, entry):
+    """
+    Replay an entry of the journal
+
+    Args :
+      - entry (dict) : the entry of the journal
+    """
+    if entry['kind'] == 'synonyms':
+      self.gazettes[entry['gazette']] = entry['synonyms']
+    elif entry['kind'] == 'expression':
+      self.expressions[(entry['intent'], entry['index'])] = {'source': entry['source'], 'response': entry['response']}
+    elif entry['kind'] == 'annotation':
+      self.expressions.setdefault((entry['intent'], entry['index']), {}).update(
+        tokens=entry['tokens'], compiled=entry['compiled'])
+
+  def restore(self, dataset):
+    """
+    Restore in a dataset the synonyms and the expressions translated and imported by the run of the journal
+
+    Args :
+      - dataset (dict) : the CAI-format json dataset
+
+    Returns :
+      - dict : the part of the dataset still to be translated
+    """
+    gazettes = []
+    for gazette in dataset['gazettes']:
+      if gazette.get('slug') in self.gazettes:
+        gazette['synonyms'] = self.gazettes[gazette['slug']]
+        gazette = {**gazette, 'synonyms': []}
+      gazettes.append(gazette)
+    intents = []
+    for intent in dataset['intents']:
+      expressions = []
+      for index, expression in enumerate(intent['expressions']):
+        entry = self.expressions.get((intent['name'], index))
+        if entry is None:
+          expressions.append(expression)
+        else:
+          expression.update({key: entry[key] for key in ('source', 'tokens', 'compiled', 'id') if key in entry})
+          if 'response' in entry:
+            expression['id'] = entry['response']['id']
+      intents.append({**intent, 'expressions': expressions})
+    return {**dataset, 'gazettes': gazettes, 'intents': intents}
+
+  @classmethod
+  def load(cls, path):
+    """
+    Replay a journal, a line left incomplete by an interrupted run is ignored
+
+    Args :
+      - path (str) : the path of the journal
+
+    Returns :
+      - JournalState : the work done by the run of the journal
+    """
+    state = cls()
+    with open(path, 'r', encoding='utf-8') as file:
+      for line in file:
+        try:
+          entry = json.loads(line)
+        except ValueError:
+          continue
+        state.apply(entry)
+    return state
+
+
+class Journal:
+  """
+  Append-only journal of the synonyms imported, the expressions imported with their ids, and the expressions
+  annotated on the platform, so that an interrupted run can be resumed without importing them again.
+
+  The entries are JSON lines, written by batches of `flush_size` entries or every `flush_interval` seconds, and when
+  the journal is closed. The journal of a previous run is only replaced when asked to, so that the work it recorded is
+  not imported again by a run that forgot to resume it.
+  """
+  FLUSH_SIZE = 100
+  FLUSH_INTERVAL = 1.0
+
+  def __init__(self, path, resume=False, overwrite=False, flush_size=FLUSH_SIZE, flush_interval=FLUSH_INTERVAL):  # pylint: disable=line-too-long,too-many-arguments
+    """
+    Args :
+      - path (str) : the path of the journal
+      - resume (bool) : to replay the journal of a previous run and go on with it, instead of starting a new one
+      - overwrite (bool) : to start a new journal even if the journal of a previous run is not empty
+      - flush_size (int) : the number of entries written at once
+      - flush_interval (float) : the maximum number of seconds an entry is kept before being written
+    """
+    self.logger = logging.getLogger(__name__)
+    self.path = path
+    self.state = JournalState()
+    if resume:
+      try:
+        self.state = JournalState.load(path)
+        self.logger.info('Resuming from %s: %s gazettes and %s expressions done', path, len(self.state.gazettes),
+                         len(self.state.expressions))
+      except FileNotFoundError:
+        self.logger.warning('No journal to resume from in %s', path)
+    elif not overwrite and os.path.exists(path) and os.path.getsize(path) > 0:
+      raise FileExistsError(f"The journal {path} of a previous run is not empty, resume it or overwrite it")
+    self.file = open(path, 'a' if resume else 'w', encoding='utf-8')  # pylint: disable=consider-using-with
+    self.flush_size = flush_size
+    self.flush_interval = flush_interval
+    self.buffer = []
+    self.flushed_at = time.monotonic()
+    self.lock = threading.Lock()
+
+  def record(self, kind, **entry):
+    """
+    Append an entry to the journal
+
+    Args :
+      - kind (str) : the kind of entry, synonyms, expression or annotation
+      - entry : the content of the entry
+    """
+    line = json.dumps({'kind': kind, **entry}, ensure_ascii=False, separators=(',', ':'), default=to_json)
+    with self.lock:
+      self.buffer.append(line + '\n')
+      if len(self.buffer) >= self.flush_size or time.monotonic() - self.flushed_at >= self.flush_interval:
+        self.write_buffer()
+
+  def write_buffer(self):
+    """
+    Write the buffered entries, the lock must be held
+    """
+    if self.buffer:
+      self.file.write(''.join(self.buffer))
+      self.file.flush()
+      self.buffer = []
+    self.flushed_at = time.monotonic()
+
+  def flush(self):
+    """
+    Write the buffered entries
+    """
+    with self.lock:
+      self.write_buffer()
+
+  def close(self):
+    """
+    Write the buffered entries and close the journal
+    """
+    with self.lock:
+      if not self.file.closed:
+        self.write_buffer()
+        self.file.close()
+
+  def record_synonyms(self, gazette):
+    """
+    Journal the import of the translated synonyms of a gazette
+
+    Args :
+      - gazette (dict) : the translated gazette
+    """
+    self.record('synonyms', gazette=gazette['slug'], synonyms=gazette['synonyms'])
+
+  def record_expression(self, intent_name, index, expression, response_expression):
+    """
+    Journal the import of a translated expression
+
+    Args :
+      - intent_name (str) : the intent name of the expression
+      - index (int) : the index of the expression in its intent
+      - expression (dict) : the translated expression
+      - response_expression (dict) : the expression imported on the platform
+    """
+    self.record('expression', intent=intent_name, index=index, source=expression['source'],
+                response={'id': response_expression['id'], 'tokens': response_expression['tokens']})
+
+  def record_annotation(self, intent_name, index, expression):
+    """
+    Journal the update of the entities and of the compiled expression of an imported expression
+
+    Args :
+      - intent_name (str) : the intent name of the expression
+      - index (int) : the index of the expression in its intent
+      - expression (dict) : the annotated expression
+    """
+    self.record('annotation', intent=intent_name, index=index, tokens=expression['tokens'],
+                compiled=expression['compiled'])
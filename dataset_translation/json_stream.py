@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+import codecs
+import json
+import mmap
+import os
+import zlib
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+CHUNK_SIZE = 1 << 16
+MMAP_THRESHOLD = 1 << 24
+MAX_VALUE_SIZE = 1 << 27
+WHITESPACE = ' \t\n\r'
+UTF8_BOM = codecs.BOM_UTF8
+WBITS = {
+  'zlib': zlib.MAX_WBITS,
+  'gzip': 16 + zlib.MAX_WBITS
+}
+
+
+def loads(document):
+  """
+  Parse a JSON document with orjson when it is installed, or else with the standard library
+
+  Args :
+    - document (str or bytes) : the JSON document
+
+  Returns :
+    - the parsed document
+  """
+  if orjson is not None:
+    return orjson.loads(document)
+  return json.loads(document)
+
+
+def sniff_format(header):
+  """
+  Detect the format of a file from its first bytes
+
+  Args :
+    - header (bytes) : the first bytes of the file
+
+  Returns :
+    - str : the format of the file, zlib, gzip or json
+  """
+  if header[:2] == b'\x1f\x8b':
+    return 'gzip'
+  if len(header) >= 2 and header[0] & 0x0f == 8 and (header[0] << 8 | header[1]) % 31 == 0:
+    return 'zlib'
+  return 'json'
+
+
+def iter_chunks(file, chunk_size=CHUNK_SIZE, compression=None):
+  """
+  Read a binary file chunk by chunk, decompressed on the fly if needed
+
+  Args :
+    - file (file) : the binary file
+    - chunk_size (int) : the size of the chunks read in the file
+    - compression (str) : the compression of the file, zlib or gzip (optional)
+
+  Returns :
+    - generator : the chunks of bytes
+  """
+  decompressor = zlib.decompressobj(WBITS[compression]) if compression is not None else None
+  while True:
+    chunk = file.read(chunk_size)
+    if not chunk:
+      break
+    if decompressor is not None:
+      chunk = decompressor.decompress(chunk)
+    if chunk:
+      yield chunk
+  if decompressor is not None:
+    chunk = decompressor.flush()
+    if chunk:
+      yield chunk
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE, mmap_threshold=MMAP_THRESHOLD):
+  """
+  Read a JSON file chunk by chunk whatever its format: raw JSON, or JSON compressed with zlib or gzip. The format is
+  detected from the first bytes of the file, and the large raw JSON files are memory-mapped.
+
+  Args :
+    - path (str) : the path of the file
+    - chunk_size (int) : the size of the chunks read in the file
+    - mmap_threshold (int) : the size in bytes from which a raw JSON file is memory-mapped
+
+  Returns :
+    - generator : the chunks of UTF-8 encoded bytes of the JSON document
+  """
+  with open(path, 'rb') as file:
+    header = file.read(len(UTF8_BOM))
+    file_format = sniff_format(header)
+    if file_format != 'json':
+      file.seek(0)
+      yield from iter_chunks(file, chunk_size, compression=file_format)
+      return
+    start = len(UTF8_BOM) if header == UTF8_BOM else 0
+    size = os.fstat(file.fileno()).st_size
+    if size < mmap_threshold:
+      file.seek(start)
+      yield from iter_chunks(file, chunk_size)
+      return
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+      for position in range(start, size, chunk_size):
+        yield mapped[position:position + chunk_size]
+
+
+def load_file(path, chunk_size=CHUNK_SIZE, mmap_threshold=MMAP_THRESHOLD):
+  """
+  Parse a JSON file whatever its format, like `read_chunks`. A large raw JSON file is parsed by orjson from its memory
+  map, or else decoded record by record, instead of being copied whole in memory before it is parsed.
+
+  Args :
+    - path (str) : the path of the file
+    - chunk_size (int) : the size of the chunks read in the file
+    - mmap_threshold (int) : the size in bytes from which a raw JSON file is memory-mapped
+
+  Returns :
+    - the parsed document
+  """
+  with open(path, 'rb') as file:
+    header = file.read(len(UTF8_BOM))
+    mapped = sniff_format(header) == 'json' and os.fstat(file.fileno()).st_size >= mmap_threshold
+    if mapped and orjson is not None:
+      with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as memory_map:
+        view = memoryview(memory_map)[len(UTF8_BOM) if header == UTF8_BOM else 0:]
+        try:
+          return orjson.loads(view)
+        finally:
+          view.release()
+  if mapped:
+    return JsonStreamReader(read_chunks(path, chunk_size, mmap_threshold)).load()
+  return loads(b''.join(read_chunks(path, chunk_size, mmap_threshold)))
+
+
+class JsonStreamReader:
+  """
+  Incremental reader of a JSON object whose values are mainly arrays of records, like the datasets exported from the
+  CAI platform.
+
+  The members of the top-level object are read from chunks of bytes and yielded as (key, record) for each record of
+  an array, or (key, value) for any other value, so that only one record is decoded in memory at a time:
+
+      for key, record in JsonStreamReader(iter_chunks(file)):
+        ...
+  """
+
+  def __init__(self, chunks, max_value_size=MAX_VALUE_SIZE):
+    """
+    Args :
+      - chunks (iterable) : the chunks of UTF-8 encoded bytes of the JSON document
+      - max_value_size (int) : the maximum number of characters of a record or of a value other than an array
+    """
+    self.chunks = iter(chunks)
+    self.max_value_size = max_value_size
+    self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+    self.decoder = json.JSONDecoder()
+    self.buffer = ''
+    self.position = 0
+    self.eof = False
+
+  def __iter__(self):
+    for key, value, is_array in self.iter_members():
+      if is_array:
+        yield from ((key, record) for record in value)
+      else:
+        yield key, value
+
+  def load(self):
+    """
+    Decode the whole top-level object, its arrays one record at a time
+
+    Returns :
+      - dict : the decoded object
+    """
+    return {key: list(value) if is_array else value for key, value, is_array in self.iter_members()}
+
+  def iter_members(self):
+    """
+    Decode the members of the top-level object
+
+    Returns :
+      - generator : the (key, value, is_array) members, the value of an array being the generator of its records,
+      consumed before the next member is decoded
+    """
+    self.expect('{')
+    if self.next_character() == '}':
+      self.position += 1
+    else:
+      while True:
+        key = self.decode_value()
+        if not isinstance(key, str):
+          raise ValueError(f"Expected a key at position {self.position}")
+        self.expect(':')
+        if self.next_character() == '[':
+          self.position += 1
+          records = self.iter_array()
+          yield key, records, True
+          for _ in records:
+            pass
+        else:
+          yield key, self.decode_value(), False
+        if self.expect(',}') == '}':
+          break
+    if self.next_character() is not None:
+      raise ValueError(f"Extra data at position {self.position}")
+
+  def iter_array(self):
+    """
+    Decode the records of the array being read
+
+    Returns :
+      - generator : the records of the array
+    """
+    if self.next_character() == ']':
+      self.position += 1
+      return
+    while True:
+      yield self.decode_value()
+      if self.expect(',]') == ']':
+        return
+
+  def read(self):
+    """
+    Read the next chunk in the buffer, dropping the already decoded part of the buffer
+
+    Returns :
+      - bool : False at the end of the document
+    """
+    if self.eof:
+      return False
+    chunk = next(self.chunks, None)
+    if chunk is None:
+      self.eof = True
+      text = self.text_decoder.decode(b'', final=True)
+    else:
+      text = self.text_decoder.decode(chunk)
+    self.buffer = self.buffer[self.position:] + text
+    self.position = 0
+    return True
+
+  def next_character(self):
+    """
+    Skip the whitespaces
+
+    Returns :
+      - str : the next character, None at the end of the document
+    """
+    while True:
+      while self.position < len(self.buffer) and self.buffer[self.position] in WHITESPACE:
+        self.position += 1
+      if self.position < len(self.buffer):
+        return self.buffer[self.position]
+      if not self.read():
+        return None
+
+  def expect(self, characters):
+    """
+    Consume the next character, which must be one of the expected characters
+
+    Args :
+      - characters (str) : the expected characters
+
+    Returns :
+      - str : the consumed character
+    """
+    character = self.next_character()
+    if character is None or character not in characters:
+      raise ValueError(f"Expected one of '{characters}' at position {self.position}, got {character!r}")
+    self.position += 1
+    return character
+
+  def decode_value(self):
+    """
+    Decode the next JSON value, reading more chunks until the value is complete. After each failed attempt, the part
+    of the buffer holding the value is at least doubled before the next one, so that a value spanning many chunks is
+    decoded a logarithmic number of times, in a time linear in its size.
+
+    Returns :
+      - object : the decoded value
+    """
+    self.next_character()
+    while True:
+      try:
+        value, end = self.decoder.raw_decode(self.buffer, self.position)
+        # a number at the end of the buffer may go on in the next chunk
+        if end < len(self.buffer) or self.eof:
+          self.position = end
+          return value
+      except json.JSONDecodeError:
+        if self.eof:
+          raise
+      attempted = len(self.buffer) - self.position
+      if attempted > self.max_value_size:
+        raise ValueError(f"JSON value of more than {self.max_value_size} characters at position {self.position}")
+      self.read()
+      while len(self.buffer) - self.position < 2 * attempted and self.read():
+        pass
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+import copy
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from .cai_client import CaiClient
+from .dataset_translation import DatasetTranslation
+from .token_manager import TokenManager
+from .transport import Transport
+
+
+class MultiLanguageTranslation:
+  """
+  Translates a CAI-format json dataset into several target languages in a single run.
+
+  The work shared by the languages is done once: the dataset is parsed and converted once by the caller, and a
+  single CAI client logs in and indexes the entities of the bot for all the languages. Each language is then
+  translated and imported concurrently by its own `DatasetTranslation` (or `AsyncDatasetTranslation`), on its own
+  copy of the dataset, the last language working on the dataset itself.
+  """
+
+  def __init__(self, api, source_language, target_languages, user_slug, bot_slug, version_slug, developer_token, bot_client_id, bot_client_secret, engine=DatasetTranslation, writers=None, journals=None, deltas=None, transport=None, cai_client=None, token_manager=None, **options):  # pylint: disable=line-too-long,too-many-arguments
+    """
+    Args :
+        - api (str) : the Translator API
+        - source_language (str) : the isocode of the source language
+        - target_languages (list) : the isocodes of the target languages
+        - user_slug (str) : the user slug of the bot owner on the CAI platform
+        - bot_slug (str) : the bot slug of the bot on the CAI platform
+        - version_slug (str) : the version of the bot on the CAI platform
+        - developer_token (str) : the developer token of the bot owner on the CAI platform
+        - bot_client_id (str) : the bot's OAuth client id for authentication of Designtime APIs on the CAI platform
+        - bot_client_secret (str) : the bot's OAuth client secret for authentication of Designtime APIs on the CAI platform
+        - engine (type) : `DatasetTranslation` or `AsyncDatasetTranslation` (optional)
+        - writers (dict) : the writer of each target language (optional)
+        - journals (dict) : the journal of each target language (optional)
+        - deltas (dict) : the `DatasetDelta` of each target language with a previous translation (optional)
+        - transport (Transport) : the HTTP transport shared by all the languages (optional)
+        - cai_client (CaiClient) : an already authenticated CAI client, instead of a new one (optional)
+        - token_manager (TokenManager) : the cache of the access tokens shared by all the languages (optional)
+        - options : the other arguments of the engine, the same for all the languages
+    """
+    self.logger = logging.getLogger(__name__)
+    self.transport = transport if transport is not None else Transport()
+    self.token_manager = token_manager if token_manager is not None else TokenManager()
+    if cai_client is None:
+      cai_client = CaiClient(user_slug, bot_slug, version_slug, developer_token, bot_client_id, bot_client_secret,
+                             transport=self.transport, token_manager=self.token_manager)
+    self.cai_client = cai_client
+    writers = writers or {}
+    journals = journals or {}
+    deltas = deltas or {}
+    self.translations = {
+      target_language: engine(api, source_language, target_language, user_slug, bot_slug, version_slug,
+                              developer_token, bot_client_id, bot_client_secret, transport=self.transport,
+                              cai_client=self.cai_client, token_manager=self.token_manager,
+                              writer=writers.get(target_language),
+                              journal=journals.get(target_language), delta=deltas.get(target_language),
+                              **options)
+      for target_language in dict.fromkeys(target_languages)
+    }
+
+  def dataset_translation(self, original_dataset):
+    """
+    Translates the expressions and synonyms into each target language and imports them on the platform,
+    and/or saves the translated CAI-format json datasets.
+
+    Args :
+        - original_dataset (dict) : the CAI-format json dataset
+
+    Returns :
+        - dict : the translated dataset of each target language
+    """
+    start = time.time()
+    datasets = [copy.deepcopy(original_dataset) for _ in range(len(self.translations) - 1)] + [original_dataset]
+    with ThreadPoolExecutor(max_workers=len(self.translations)) as executor:
+      futures = {target_language: executor.submit(translation.dataset_translation, dataset)
+                 for (target_language, translation), dataset in zip(self.translations.items(), datasets)}
+      errors = {target_language: future.exception() for target_language, future in futures.items()
+                if future.exception() is not None}
+    for target_language, error in errors.items():
+      self.logger.error('Translation into %s failed: %s', target_language, error)
+    if errors:
+      raise next(iter(errors.values()))
+    self.logger.info(" Handled %s languages in %s", len(futures), timedelta(seconds=round(time.time()-start)))
+    return {target_language: future.result() for target_language, future in futures.items()}
+
+  def close(self):
+    """
+    Close the translation memories of the languages
+    """
+    for translation in self.translations.values():
+      translation.close()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+import email.utils
+import random
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+FAMILIES = {
+  'translation': re.compile(r"/translation$"),
+  'expression_import': re.compile(r"/intents/[^/]+/expressions(/bulk_create)?$"),
+  'token_update': re.compile(r"/intents/[^/]+/expressions/[^/]+$"),
+  'synonyms': re.compile(r"/entities/[^/]+/synonyms/bulk_create$"),
+  'expression_listing': re.compile(r"/intents/[^/]+/expressions$")
+}
+FAMILY_METHODS = {
+  'translation': 'POST',
+  'expression_import': 'POST',
+  'token_update': 'PUT',
+  'synonyms': 'POST',
+  'expression_listing': 'GET'
+}
+
+
+def endpoint_family(method, url):
+  """
+  Family of the endpoint of a request
+
+  Args :
+    - method (str) : the HTTP method
+    - url (str) : the url of the request
+
+  Returns :
+    - str : translation, expression_import, token_update, synonyms or expression_listing, None for the other endpoints
+  """
+  path = urlsplit(url).path.rstrip('/')
+  for family, regex in FAMILIES.items():
+    if FAMILY_METHODS[family] == method.upper() and regex.search(path):
+      return family
+  return None
+
+
+class TokenBucket:
+  """
+  Token bucket letting through `rate` requests per second on average, with bursts of at most `capacity` requests
+  """
+
+  def __init__(self, rate, capacity=None):
+    """
+    Args :
+      - rate (float) : the number of requests per second
+      - capacity (float) : the maximum burst of requests, one second of requests by default
+    """
+    self.rate = rate
+    self.capacity = capacity if capacity is not None else max(1.0, rate)
+    self.tokens = self.capacity
+    self.updated_at = time.monotonic()
+    self.lock = threading.Lock()
+
+  def acquire(self):
+    """
+    Take a token from the bucket, waiting until there is one
+
+    Returns :
+      - float : the number of seconds waited
+    """
+    with self.lock:
+      now = time.monotonic()
+      self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+      self.updated_at = now
+      self.tokens -= 1
+      wait = -self.tokens / self.rate if self.tokens < 0 else 0
+    if wait:
+      time.sleep(wait)
+    return wait
+
+
+class RateLimiter:
+  """
+  Token buckets of the endpoint families of the CAI platform and of SAP Translation Hub
+  """
+
+  def __init__(self, rates):
+    """
+    Args :
+      - rates (dict) : the number of requests per second of each endpoint family
+    """
+    unknown_families = set(rates) - set(FAMILIES)
+    if unknown_families:
+      raise ValueError(f"Unknown endpoint families {sorted(unknown_families)}, expected some of {list(FAMILIES)}")
+    self.buckets = {family: TokenBucket(rate) for family, rate in rates.items() if rate}
+
+  def acquire(self, method, url):
+    """
+    Wait until a request can be sent without exceeding the rate of its endpoint family
+
+    Args :
+      - method (str) : the HTTP method
+      - url (str) : the url of the request
+
+    Returns :
+      - float : the number of seconds waited
+    """
+    bucket = self.buckets.get(endpoint_family(method, url))
+    return bucket.acquire() if bucket is not None else 0
+
+
+class RetryPolicy:
+  """
+  Retries of the requests answered with 429 or 5xx, after an exponential backoff with jitter, or after the delay
+  asked by the `Retry-After` header of the response.
+
+  A POST may have been committed by the platform before it answered 500, 502 or 504, and sending it again would
+  import its expressions or synonyms twice, so the POSTs are only retried when answered with 429 or 503, meaning
+  they were not processed, unless their endpoint family is idempotent.
+  """
+  MAX_RETRIES = 4
+  BACKOFF = 0.5
+  MAX_BACKOFF = 30
+  STATUSES = frozenset({429, 500, 502, 503, 504})
+  UNPROCESSED_STATUSES = frozenset({429, 503})
+  IDEMPOTENT_FAMILIES = frozenset({'translation'})
+
+  def __init__(self, max_retries=MAX_RETRIES, backoff=BACKOFF, max_backoff=MAX_BACKOFF, statuses=STATUSES, idempotent_families=IDEMPOTENT_FAMILIES):  # pylint: disable=line-too-long,too-many-arguments
+    """
+    Args :
+      - max_retries (int) : the maximum number of retries of a request, 0 to never retry
+      - backoff (float) : the delay in seconds before the first retry, doubled on each retry
+      - max_backoff (float) : the maximum delay in seconds before a retry
+      - statuses (set) : the status codes of the responses to retry
+      - idempotent_families (set) : the endpoint families whose POSTs are retried on all the statuses
+    """
+    self.max_retries = max_retries
+    self.backoff = backoff
+    self.max_backoff = max_backoff
+    self.statuses = statuses
+    self.idempotent_families = idempotent_families
+
+  def should_retry(self, attempt, response, method='GET', url=''):
+    """
+    Args :
+      - attempt (int) : the number of retries already done
+      - response (requests.Response) : the response
+      - method (str) : the HTTP method of the request
+      - url (str) : the url of the request
+
+    Returns :
+      - bool : whether the request should be sent again
+    """
+    if attempt >= self.max_retries or response.status_code not in self.statuses:
+      return False
+    if method.upper() == 'POST' and endpoint_family(method, url) not in self.idempotent_families:
+      return response.status_code in self.UNPROCESSED_STATUSES
+    return True
+
+  def delay(self, attempt, response):
+    """
+    Delay before the next retry
+
+    Args :
+      - attempt (int) : the number of retries already done
+      - response (requests.Response) : the response
+
+    Returns :
+      - float : the delay in seconds
+    """
+    retry_after = self.retry_after(response.headers.get('Retry-After'))
+    if retry_after is not None:
+      return min(retry_after, self.max_backoff)
+    backoff = min(self.max_backoff, self.backoff * 2 ** attempt)
+    return backoff / 2 + random.uniform(0, backoff / 2)
+
+  @staticmethod
+  def retry_after(value):
+    """
+    Parse a `Retry-After` header
+
+    Args :
+      - value (str) : the header, a number of seconds or an HTTP date
+
+    Returns :
+      - float : the number of seconds to wait, None if there is no valid header
+    """
+    if not value:
+      return None
+    try:
+      return max(0.0, float(value))
+    except ValueError:
+      pass
+    try:
+      date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+      return None
+    return max(0.0, date.timestamp() - time.time())
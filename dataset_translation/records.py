@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+import sys
+import threading
+import weakref
+from collections.abc import Mapping, MutableMapping
+
+
+class Record(Mapping):
+  """
+  Compact record of a CAI-format dataset, storing its fields in `__slots__` instead of a dict per record.
+
+  A record behaves like the dict of the JSON shape it replaces (`record['name']`, `record.get('slug')`,
+  `{**record}`, equality with a dict), so that the pipeline handles records and dicts alike. An optional field that
+  was never set is missing, like a missing key. Records are converted back to the JSON shapes only when they are
+  serialized, with `to_json` as the `default` of `json.dumps`.
+  """
+  __slots__ = ()
+  FIELDS = ()
+
+  def __getitem__(self, key):
+    if key in self.FIELDS:
+      try:
+        return getattr(self, key)
+      except AttributeError:
+        pass
+    raise KeyError(key)
+
+  def __iter__(self):
+    return (field for field in self.FIELDS if hasattr(self, field))
+
+  def __len__(self):
+    return sum(1 for _ in self)
+
+  def __repr__(self):
+    return f"{type(self).__name__}({self.to_dict()!r})"
+
+  def to_dict(self):
+    """
+    Returns :
+      - dict : the JSON shape of the record, with its nested records left as they are
+    """
+    return {key: self[key] for key in self}
+
+
+class MutableRecord(Record, MutableMapping):  # pylint: disable=too-many-ancestors
+  """
+  Record whose fields can be updated like the keys of a dict. The keys of its JSON shape that are not fields, such as
+  the ids of the platform, are kept in the `extra` dict, only allocated for the records that have some.
+  """
+  __slots__ = ('extra',)
+
+  def __getitem__(self, key):
+    try:
+      return super().__getitem__(key)
+    except KeyError:
+      if self.extra is None:
+        raise
+      return self.extra[key]
+
+  def __setitem__(self, key, value):
+    if key in self.FIELDS:
+      setattr(self, key, value)
+    else:
+      if self.extra is None:
+        self.extra = {}  # pylint: disable=attribute-defined-outside-init
+      self.extra[key] = value
+
+  def __delitem__(self, key):
+    if self.extra is not None and key in self.extra:
+      del self.extra[key]
+    elif key in self.FIELDS and hasattr(self, key):
+      delattr(self, key)
+    else:
+      raise KeyError(key)
+
+  def __iter__(self):
+    yield from super().__iter__()
+    if self.extra:
+      yield from self.extra
+
+  @classmethod
+  def from_dict(cls, values):
+    """
+    Args :
+      - values (dict) : the JSON shape of the record
+
+    Returns :
+      - MutableRecord : the record
+    """
+    # the record is built without the __init__ of its class, whose arguments are not known here
+    record = cls.__new__(cls)
+    record.extra = None  # pylint: disable=attribute-defined-outside-init
+    for key, value in values.items():
+      record[key] = value
+    return record
+
+
+class Entity(Record):
+  """
+  Entity of a token, interned: the tokens of the same entity share a single immutable record. The records are only
+  interned while a token refers to them, so that the entities of the previous datasets are not kept.
+  """
+  __slots__ = ('name', 'type', 'is_custom', '__weakref__')
+  FIELDS = ('name', 'type', 'is_custom')
+  INTERNED = weakref.WeakValueDictionary()
+  INTERNED_LOCK = threading.Lock()
+
+  def __init__(self, name, entity_type, is_custom):
+    object.__setattr__(self, 'name', name)
+    object.__setattr__(self, 'type', entity_type)
+    object.__setattr__(self, 'is_custom', is_custom)
+
+  def __setattr__(self, key, value):
+    raise TypeError('Entity records are shared between tokens and cannot be modified')
+
+  def __copy__(self):
+    return self
+
+  def __deepcopy__(self, memo):
+    return self
+
+  def __reduce__(self):
+    # the fields are set with object.__setattr__ in __init__, which pylint does not follow
+    return self.intern, (self.name, self.type, self.is_custom)  # pylint: disable=no-member
+
+  @classmethod
+  def intern(cls, name, entity_type, is_custom):
+    """
+    Getter of the shared record of an entity
+
+    Args :
+      - name (str) : the name of the entity
+      - entity_type (str) : the type of the entity, gold, free or restricted
+      - is_custom (bool) : whether the entity is a custom entity
+
+    Returns :
+      - Entity : the record of the entity
+    """
+    key = (name, entity_type, is_custom)
+    entity = cls.INTERNED.get(key)
+    if entity is None:
+      with cls.INTERNED_LOCK:
+        entity = cls.INTERNED.setdefault(key, cls(sys.intern(name), sys.intern(entity_type), is_custom))
+    return entity
+
+  @classmethod
+  def from_dict(cls, values):
+    return cls.intern(values['name'], values['type'], values['is_custom'])
+
+
+class Token(MutableRecord):
+  """
+  Token of an expression, with its part-of-speech tag interned and its entity shared with the other tokens of the
+  entity
+  """
+  __slots__ = ('word', 'space', 'pos', 'entity')
+  FIELDS = __slots__
+
+  def __init__(self, word, space, pos, entity=None):
+    self.word = word
+    self.space = space
+    self.pos = sys.intern(pos) if isinstance(pos, str) else pos
+    self.entity = entity
+    self.extra = None
+
+  def __setitem__(self, key, value):
+    if key == 'pos' and isinstance(value, str):
+      value = sys.intern(value)
+    elif key == 'entity' and isinstance(value, dict):
+      value = Entity.from_dict(value)
+    super().__setitem__(key, value)
+
+  @classmethod
+  def from_dict(cls, values, entity=None):
+    """
+    Args :
+      - values (dict) : the JSON shape of the token
+      - entity (Entity) : the entity of the token when its JSON shape has none, like an exported token (optional)
+
+    Returns :
+      - Token : the token
+    """
+    size = len(values)
+    if 'entity' in values:
+      entity = values['entity']
+      entity = Entity.from_dict(entity) if isinstance(entity, dict) else entity
+      size -= 1
+    if size == 3 and 'word' in values and 'space' in values and 'pos' in values:
+      return cls(values['word'], values['space'], values['pos'], entity)
+    token = cls.__new__(cls)
+    token.extra = None
+    token.entity = entity
+    for key, value in values.items():
+      token[key] = value
+    return token
+
+
+class Expression(MutableRecord):
+  """
+  Expression of an intent, with its compiled expression once it is annotated
+  """
+  __slots__ = ('source', 'tokens', 'compiled')
+  FIELDS = __slots__
+
+  def __init__(self, source, tokens):
+    self.source = source
+    self.tokens = tokens
+    self.extra = None
+
+  def __setitem__(self, key, value):
+    if key == 'tokens':
+      value = [Token.from_dict(token) if isinstance(token, dict) else token for token in value]
+    super().__setitem__(key, value)
+
+
+class Intent(MutableRecord):
+  """
+  Intent with its expressions
+  """
+  __slots__ = ('name', 'description', 'strictness', 'expressions')
+  FIELDS = __slots__
+
+  def __init__(self, name, description, strictness, expressions):
+    self.name = name
+    self.description = description
+    self.strictness = strictness
+    self.expressions = expressions
+    self.extra = None
+
+  def __setitem__(self, key, value):
+    if key == 'expressions':
+      value = [Expression.from_dict(expression) if isinstance(expression, dict) else expression
+               for expression in value]
+    super().__setitem__(key, value)
+
+
+class Gazette(MutableRecord):
+  """
+  Gazette of an entity with its synonyms
+  """
+  __slots__ = ('name', 'slug', 'locked', 'type', 'is_open', 'strictness', 'enrichment_strictness', 'synonyms',
+               'regex_pattern', 'regex_flags')
+  FIELDS = __slots__
+
+  def __init__(self, **fields):
+    self.extra = None
+    for key, value in fields.items():
+      self[key] = value
+
+
+def to_json(value):
+  """
+  `default` of `json.dumps` converting the records to their JSON shapes
+
+  Args :
+    - value : a value that the json module cannot serialize
+
+  Returns :
+    - dict : the JSON shape of the record
+  """
+  if isinstance(value, Record):
+    return value.to_dict()
+  raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dataset_from_json(dataset):
+  """
+  Convert the intents and the gazettes of a CAI-format json dataset to records
+
+  Args :
+    - dataset (dict) : the CAI-format json dataset
+
+  Returns :
+    - dict : the CAI-format dataset with records
+  """
+  return {
+    **dataset,
+    'intents': [Intent.from_dict(intent) for intent in dataset['intents']],
+    'gazettes': [Gazette.from_dict(gazette) for gazette in dataset['gazettes']]
+  }
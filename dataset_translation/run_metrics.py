@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+import bisect
+import functools
+import json
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from .rate_limit import endpoint_family
+
+
+def timed(phase):
+  """
+  Decorator of a method of an object with run metrics, adding the duration of its calls to a phase
+
+  Args :
+    - phase (str) : the name of the phase
+  """
+  def decorator(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+      with self.metrics.phase(phase):
+        return method(self, *args, **kwargs)
+    return wrapper
+  return decorator
+
+
+def request_endpoint(method, url):
+  """
+  Endpoint of a request in the metrics
+
+  Args :
+    - method (str) : the HTTP method
+    - url (str) : the url of the request
+
+  Returns :
+    - str : the endpoint family of the request, authentication or other
+  """
+  family = endpoint_family(method, url)
+  if family is not None:
+    return family
+  return 'authentication' if urlsplit(url).path.endswith('/oauth/token') else 'other'
+
+
+def body_size(body):
+  """
+  Args :
+    - body (bytes or str) : the body of a request
+
+  Returns :
+    - int : the size of the body in bytes
+  """
+  if body is None:
+    return 0
+  if isinstance(body, str):
+    return len(body.encode('utf-8'))
+  try:
+    return len(body)
+  except TypeError:
+    return 0
+
+
+class LatencyHistogram:
+  """
+  Histogram of the latencies of requests, with the cumulative buckets of the Prometheus histograms
+  """
+  BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+  def __init__(self, buckets=BUCKETS):
+    """
+    Args :
+      - buckets (tuple) : the increasing upper bounds of the buckets in seconds
+    """
+    self.buckets = buckets
+    self.counts = [0] * (len(buckets) + 1)
+    self.sum = 0.0
+    self.count = 0
+
+  def observe(self, seconds):
+    """
+    Args :
+      - seconds (float) : the latency of a request
+    """
+    self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+    self.sum += seconds
+    self.count += 1
+
+  def cumulative_counts(self):
+    """
+    Returns :
+      - list : the (upper bound, number of latencies lower or equal) pairs, the last upper bound is +Inf
+    """
+    counts, total = [], 0
+    for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+      total += count
+      counts.append((bound, total))
+    return counts
+
+  def report(self):
+    """
+    Returns :
+      - dict : the number, sum and mean of the latencies, and the cumulative buckets
+    """
+    return {
+      'count': self.count,
+      'sum': self.sum,
+      'mean': self.sum / self.count if self.count else 0,
+      'buckets': {str(bound): count for bound, count in self.cumulative_counts()}
+    }
+
+
+class RunMetrics:
+  """
+  Metrics of a translation run: the time spent in each phase, the requests of each endpoint with their bytes and
+  latency histogram, counters such as the characters sent to the translator, and the hit rates of the caches.
+
+  The metrics are shared by the threads and the languages of a run. The time of a phase is the sum of the durations
+  of its calls, which can exceed the wall time when the calls are concurrent. They are emitted as a JSON run report,
+  or in the Prometheus text format.
+  """
+  PREFIX = 'dataset_translation'
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.started_at = time.time()
+    self.start = time.perf_counter()
+    self.phases = {}
+    self.endpoints = {}
+    self.counters = Counter()
+    self.caches = {}
+
+  @contextmanager
+  def phase(self, name):
+    """
+    Context adding its duration to a phase
+
+    Args :
+      - name (str) : the name of the phase
+    """
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.add_phase(name, time.perf_counter() - start)
+
+  def iterate(self, name, iterable):
+    """
+    Iterate over an iterable, adding the time spent waiting for its items to a phase
+
+    Args :
+      - name (str) : the name of the phase
+      - iterable (iterable) : the iterable, such as a generator reading a file
+
+    Returns :
+      - generator : the items of the iterable
+    """
+    seconds = 0.0
+    iterator = iter(iterable)
+    try:
+      while True:
+        start = time.perf_counter()
+        try:
+          item = next(iterator)
+        except StopIteration:
+          return
+        finally:
+          seconds += time.perf_counter() - start
+        yield item
+    finally:
+      self.add_phase(name, seconds)
+
+  def phase_seconds(self, name):
+    """
+    Args :
+      - name (str) : the name of the phase
+
+    Returns :
+      - float : the time spent in the phase
+    """
+    with self.lock:
+      return self.phases.get(name, {}).get('seconds', 0.0)
+
+  def add_phase(self, name, seconds):
+    """
+    Args :
+      - name (str) : the name of the phase
+      - seconds (float) : the duration of a call of the phase
+    """
+    with self.lock:
+      phase = self.phases.setdefault(name, {'seconds': 0.0, 'calls': 0})
+      phase['seconds'] += seconds
+      phase['calls'] += 1
+
+  def record_request(self, method, url, status, seconds, bytes_sent, bytes_received):  # pylint: disable=line-too-long,too-many-arguments
+    """
+    Record a request sent by the transport
+
+    Args :
+      - method (str) : the HTTP method
+      - url (str) : the url of the request
+      - status (int) : the status code of the response, None if no response was received
+      - seconds (float) : the latency of the request
+      - bytes_sent (int) : the size of the body of the request
+      - bytes_received (int) : the size of the body of the response
+    """
+    name = request_endpoint(method, url)
+    with self.lock:
+      endpoint = self.endpoints.get(name)
+      if endpoint is None:
+        endpoint = {'statuses': Counter(), 'bytes_sent': 0, 'bytes_received': 0, 'latency': LatencyHistogram()}
+        self.endpoints[name] = endpoint
+      endpoint['statuses'][str(status) if status is not None else 'error'] += 1
+      endpoint['bytes_sent'] += bytes_sent
+      endpoint['bytes_received'] += bytes_received
+      endpoint['latency'].observe(seconds)
+
+  def increment(self, name, value=1):
+    """
+    Args :
+      - name (str) : the name of the counter
+      - value (int) : the increment of the counter
+    """
+    with self.lock:
+      self.counters[name] += value
+
+  def record_cache(self, name, hits, misses):
+    """
+    Args :
+      - name (str) : the name of the cache
+      - hits (int) : the number of lookups found in the cache
+      - misses (int) : the number of lookups not found in the cache
+    """
+    with self.lock:
+      cache = self.caches.setdefault(name, {'hits': 0, 'misses': 0})
+      cache['hits'] += hits
+      cache['misses'] += misses
+
+  def report(self):
+    """
+    Run report
+
+    Returns :
+      - dict : the metrics of the run
+    """
+    with self.lock:
+      return {
+        'started_at': self.started_at,
+        'wall_seconds': time.perf_counter() - self.start,
+        'phases': {name: dict(phase) for name, phase in self.phases.items()},
+        'endpoints': {
+          name: {
+            'requests': sum(endpoint['statuses'].values()),
+            'statuses': dict(endpoint['statuses']),
+            'bytes_sent': endpoint['bytes_sent'],
+            'bytes_received': endpoint['bytes_received'],
+            'latency': endpoint['latency'].report()
+          }
+          for name, endpoint in self.endpoints.items()
+        },
+        'counters': dict(self.counters),
+        'caches': {
+          name: {**cache, 'hit_rate': cache['hits'] / (cache['hits'] + cache['misses'])
+                 if cache['hits'] + cache['misses'] else 0}
+          for name, cache in self.caches.items()
+        }
+      }
+
+  def to_prometheus(self):
+    """
+    Metrics of the run in the Prometheus text exposition format
+
+    Returns :
+      - str : the metrics
+    """
+    report = self.report()
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+      lines.extend([f"# HELP {self.PREFIX}_{name} {help_text}", f"# TYPE {self.PREFIX}_{name} {kind}"])
+      for suffix, labels, value in samples:
+        label_text = ','.join(f'{key}="{label}"' for key, label in labels.items())
+        lines.append(f"{self.PREFIX}_{name}{suffix}{{{label_text}}} {value}" if labels else
+                     f"{self.PREFIX}_{name}{suffix} {value}")
+
+    metric('wall_seconds', 'gauge', 'Wall time of the run in seconds.', [('', {}, report['wall_seconds'])])
+    metric('phase_seconds_total', 'counter', 'Time spent in each phase in seconds.',
+           [('', {'phase': name}, phase['seconds']) for name, phase in report['phases'].items()])
+    metric('requests_total', 'counter', 'Requests sent to each endpoint by status.',
+           [('', {'endpoint': name, 'status': status}, count) for name, endpoint in report['endpoints'].items()
+            for status, count in endpoint['statuses'].items()])
+    metric('request_bytes_total', 'counter', 'Bytes of the bodies of the requests and responses of each endpoint.',
+           [('', {'endpoint': name, 'direction': direction}, endpoint[f"bytes_{direction}"])
+            for name, endpoint in report['endpoints'].items() for direction in ('sent', 'received')])
+    samples = []
+    for name, endpoint in report['endpoints'].items():
+      latency = endpoint['latency']
+      samples.extend(('_bucket', {'endpoint': name, 'le': bound}, count) for bound, count in latency['buckets'].items())
+      samples.extend([('_sum', {'endpoint': name}, latency['sum']), ('_count', {'endpoint': name}, latency['count'])])
+    metric('request_duration_seconds', 'histogram', 'Latency of the requests of each endpoint in seconds.', samples)
+    for name, value in report['counters'].items():
+      metric(f"{name}_total", 'counter', f"Number of {name.replace('_', ' ')}.", [('', {}, value)])
+    metric('cache_hits_total', 'counter', 'Lookups found in each cache.',
+           [('', {'cache': name}, cache['hits']) for name, cache in report['caches'].items()])
+    metric('cache_misses_total', 'counter', 'Lookups not found in each cache.',
+           [('', {'cache': name}, cache['misses']) for name, cache in report['caches'].items()])
+    return '\n'.join(lines) + '\n'
+
+  def write_report(self, path):
+    """
+    Save the JSON run report
+
+    Args :
+      - path (str) : the path of the report
+    """
+    with open(path, 'w', encoding='utf-8') as file:
+      json.dump(self.report(), file, indent=2)
+
+  def write_prometheus(self, path):
+    """
+    Save the metrics in the Prometheus text format, for the textfile collector of the node exporter
+
+    Args :
+      - path (str) : the path of the metrics file
+    """
+    with open(path, 'w', encoding='utf-8') as file:
+      file.write(self.to_prometheus())
@@ -2,9 +2,9 @@
 
 import os
 
-os.environ['REDIS_MESSAGING_HOST'] = 'localhost'
-os.environ['REDIS_MESSAGING_PORT'] = '6379'
-os.environ['REDIS_MESSAGING_PASSWORD'] = ''
-os.environ['REDIS_MESSAGING_BROKER_DB'] = '3'
-os.environ['REDIS_MESSAGING_SSL'] = '0'
-os.environ['REDIS_MESSAGING_TIMEOUT'] = '10'
+os.environ.setdefault('REDIS_MESSAGING_HOST', 'localhost')
+os.environ.setdefault('REDIS_MESSAGING_PORT', '6379')
+os.environ.setdefault('REDIS_MESSAGING_PASSWORD', '')
+os.environ.setdefault('REDIS_MESSAGING_BROKER_DB', '3')
+os.environ.setdefault('REDIS_MESSAGING_SSL', '0')
+os.environ.setdefault('REDIS_MESSAGING_TIMEOUT', '10')
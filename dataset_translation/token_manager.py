@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+import json
+import logging
+import os
+import stat
+import threading
+import time
+
+
+class TokenManager:
+  """
+  Cache of the OAuth access tokens of the CAI platform and of SAP Translation Hub, by client id, with their expiry.
+
+  The tokens are kept in memory and optionally in a local file only readable by its owner, so that short runs launched
+  back to back reuse the same tokens. A token is refreshed in the background shortly before it expires, and the
+  clients drop a token refused with a 401 to get a new one:
+
+      token = token_manager.token(key, fetch)
+
+  where `fetch` returns a new (access token, lifetime in seconds) pair.
+  """
+  REFRESH_MARGIN = 60
+  EXPIRES_IN = 3600
+
+  def __init__(self, cache_path=None, refresh_margin=REFRESH_MARGIN, background_refresh=True):
+    """
+    Args :
+      - cache_path (str) : the path of the file caching the tokens between runs (optional)
+      - refresh_margin (float) : the number of seconds before its expiry a token is refreshed
+      - background_refresh (bool) : to refresh the tokens in the background before they expire
+    """
+    self.logger = logging.getLogger(__name__)
+    self.cache_path = cache_path
+    self.refresh_margin = refresh_margin
+    self.background_refresh = background_refresh
+    self.lock = threading.Lock()
+    self.key_locks = {}
+    self.timers = {}
+    self.tokens = self.load_cache()
+
+  def token(self, key, fetch):
+    """
+    Getter of a valid access token, fetched if there is none in the cache or if it expires soon
+
+    Args :
+      - key (str) : the key of the token, made of the authentication url and the client id
+      - fetch (callable) : the function fetching a new (access token, lifetime in seconds) pair
+
+    Returns :
+      - str : the access token
+    """
+    with self.key_lock(key):
+      entry = self.tokens.get(key)
+      if entry is None or entry['refresh_at'] <= time.time():
+        entry = self.refresh(key, fetch)
+      elif key not in self.timers:
+        self.schedule(key, fetch, entry)
+      return entry['access_token']
+
+  def invalidate(self, key, access_token):
+    """
+    Drop a token refused by the server, unless it was already replaced
+
+    Args :
+      - key (str) : the key of the token
+      - access_token (str) : the refused access token
+    """
+    with self.lock:
+      if self.tokens.get(key, {}).get('access_token') == access_token:
+        del self.tokens[key]
+        self.save_cache(dropped_key=key)
+
+  def key_lock(self, key):
+    """
+    Lock of a key, so that a token is fetched once at a time
+
+    Args :
+      - key (str) : the key of the token
+
+    Returns :
+      - threading.Lock : the lock of the key
+    """
+    with self.lock:
+      return self.key_locks.setdefault(key, threading.Lock())
+
+  def refresh(self, key, fetch):
+    """
+    Fetch a new token and cache it, the lock of the key must be held
+
+    Args :
+      - key (str) : the key of the token
+      - fetch (callable) : the function fetching a new (access token, lifetime in seconds) pair
+
+    Returns :
+      - dict : the cached token with its expiry
+    """
+    access_token, expires_in = fetch()
+    now = time.time()
+    expires_in = expires_in or self.EXPIRES_IN
+    entry = {
+      'access_token': access_token,
+      'expires_at': now + expires_in,
+      'refresh_at': now + max(expires_in - self.refresh_margin, expires_in / 2)
+    }
+    with self.lock:
+      self.tokens[key] = entry
+      self.save_cache()
+    self.schedule(key, fetch, entry)
+    return entry
+
+  def schedule(self, key, fetch, entry):
+    """
+    Schedule the background refresh of a token
+
+    Args :
+      - key (str) : the key of the token
+      - fetch (callable) : the function fetching a new (access token, lifetime in seconds) pair
+      - entry (dict) : the cached token with its expiry
+    """
+    if not self.background_refresh:
+      return
+    timer = threading.Timer(max(entry['refresh_at'] - time.time(), 0), self.refresh_in_background, (key, fetch))
+    timer.daemon = True
+    with self.lock:
+      previous_timer = self.timers.get(key)
+      self.timers[key] = timer
+    if previous_timer is not None and previous_timer is not threading.current_thread():
+      previous_timer.cancel()
+    timer.start()
+
+  def refresh_in_background(self, key, fetch):
+    """
+    Refresh a token from a background timer, on error the token is fetched again by the next request
+
+    Args :
+      - key (str) : the key of the token
+      - fetch (callable) : the function fetching a new (access token, lifetime in seconds) pair
+    """
+    try:
+      with self.key_lock(key):
+        self.refresh(key, fetch)
+    except Exception as error:  # pylint: disable=broad-except
+      self.logger.warning('Background refresh of a token failed: %s', error)
+      with self.lock:
+        self.timers.pop(key, None)
+
+  def close(self):
+    """Cancel the background refreshes"""
+    with self.lock:
+      for timer in self.timers.values():
+        timer.cancel()
+      self.timers = {}
+
+  def load_cache(self):
+    """
+    Load the unexpired tokens of the cache file, ignored if other users can read it
+
+    Returns :
+      - dict : the cached tokens by key
+    """
+    if self.cache_path is None:
+      return {}
+    try:
+      if os.stat(self.cache_path).st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+        self.logger.warning('Token cache %s ignored, it must only be readable by its owner', self.cache_path)
+        return {}
+      with open(self.cache_path, 'r', encoding='utf-8') as file:
+        tokens = json.load(file)
+    except FileNotFoundError:
+      return {}
+    except (OSError, ValueError) as error:
+      self.logger.warning('Token cache %s ignored: %s', self.cache_path, error)
+      return {}
+    now = time.time()
+    return {key: entry for key, entry in tokens.items() if entry.get('refresh_at', 0) > now}
+
+  def save_cache(self, dropped_key=None):
+    """
+    Save the tokens in the cache file, with the tokens cached by other runs meanwhile, the lock must be held
+
+    Args :
+      - dropped_key (str) : the key of a token to remove from the cache file (optional)
+    """
+    if self.cache_path is None:
+      return
+    tokens = {**self.load_cache(), **self.tokens}
+    tokens.pop(dropped_key, None)
+    temporary_path = f"{self.cache_path}.{os.getpid()}.tmp"
+    try:
+      file_descriptor = os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+      if hasattr(os, 'fchmod'):
+        os.fchmod(file_descriptor, 0o600)
+      with os.fdopen(file_descriptor, 'w', encoding='utf-8') as file:
+        json.dump(tokens, file)
+      os.replace(temporary_path, self.cache_path)
+    except OSError as error:
+      self.logger.warning('Token cache %s not saved: %s', self.cache_path, error)
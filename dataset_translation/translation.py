@@ -1,16 +1,29 @@
 #!/usr/bin/env python3
 
 import argparse
-import json
-import zlib
+import time
 
 from .dataset_translation import DatasetTranslation
+from .async_dataset_translation import AsyncDatasetTranslation
+from .multi_language_translation import MultiLanguageTranslation
 from .dataset import Dataset
+from .transport import Transport
+from .rate_limit import FAMILIES, RateLimiter, RetryPolicy
+from .cai_client import CaiClient
+from .dataset_writer import DatasetWriter
+from .journal import Journal
+from .token_manager import TokenManager
+from .run_metrics import RunMetrics
+from .json_stream import JsonStreamReader, load_file, read_chunks
+from .records import dataset_from_json
+from .delta import DatasetDelta
+from .distributed import DistributedTranslation, TranslationWorker
+from .work_queue import RedisWorkQueue, WorkQueue
 
 
 def open_file(dataset_path):
   """
-  Open a JSON dataset in the dataset path
+  Open a JSON dataset in the dataset path, raw or compressed with zlib or gzip
 
   Args :
     - dataset_path (str) :  the dataset path
@@ -18,13 +31,21 @@ def open_file(dataset_path):
   Returns :
     - dict : the loaded dataset
   """
-  try :
-    with open(dataset_path, 'r') as file:
-      return json.load(file)
-  except UnicodeDecodeError:
-    with open(dataset_path, 'rb') as file:
-      read_file = file.read()
-      return json.loads(zlib.decompress(read_file), encoding='utf-8')
+  return load_file(dataset_path)
+
+
+def read_records(dataset_path):
+  """
+  Read the records of a JSON dataset exported from the CAI platform in the dataset path one by one, without loading
+  the whole dataset in memory
+
+  Args :
+    - dataset_path (str) : the dataset path
+
+  Returns :
+    - generator : the (section, record) pairs of the dataset
+  """
+  yield from JsonStreamReader(read_chunks(dataset_path))
 
 
 def write_file(dataset_path, dataset):
@@ -35,22 +56,225 @@ def write_file(dataset_path, dataset):
       - dataset_path (str) : the dataset path
       - data (dict) : the dataset to save
   """
-  with open(dataset_path, 'w') as outfile:
-    json.dump(dataset, outfile, indent=4, ensure_ascii=False)
+  DatasetWriter(dataset_path).write_dataset(dataset)
+
+
+def read_dataset(dataset_path, format_file, source_language, metrics):
+  """
+  Load a dataset and convert it to the CAI format records, from the export of the CAI platform if needed, timing both
+  phases
+
+  Args :
+    - dataset_path (str) : the dataset path
+    - format_file (str) : the format of the dataset, cai_platform or cai
+    - source_language (str) : the isocode of the source language
+    - metrics (RunMetrics) : the metrics of the run
+
+  Returns :
+    - dict : the CAI-format dataset
+  """
+  if format_file != 'cai_platform':
+    with metrics.phase('load'):
+      dataset = open_file(dataset_path)
+    with metrics.phase('convert'):
+      return dataset_from_json(dataset)
+  loaded = metrics.phase_seconds('load')
+  start = time.perf_counter()
+  dataset = Dataset().records_to_cai_format(metrics.iterate('load', read_records(dataset_path)), source_language)
+  metrics.add_phase('convert', time.perf_counter() - start - (metrics.phase_seconds('load') - loaded))
+  return dataset
+
+
+def read_deltas(previous_path, translated_paths, format_file, source_language, metrics, delete_removed=False):  # pylint: disable=too-many-arguments
+  """
+  Load the previous snapshot of a dataset and its translations, to only translate what changed since
+
+  Args :
+    - previous_path (str) : the path of the previous snapshot of the dataset
+    - translated_paths (dict) : the path of the CAI-format dataset translated from the snapshot, by target language
+    - format_file (str) : the format of the snapshot, cai_platform or cai
+    - source_language (str) : the isocode of the source language
+    - metrics (RunMetrics) : the metrics of the run
+    - delete_removed (bool) : to delete on the platform the translations of the removed expressions
+
+  Returns :
+    - dict : the `DatasetDelta` of each target language
+  """
+  previous_source = read_dataset(previous_path, format_file, source_language, metrics)
+  with metrics.phase('load'):
+    translated = {language: dataset_from_json(open_file(path)) for language, path in translated_paths.items()}
+  with metrics.phase('delta'):
+    return {language: DatasetDelta(previous_source, previous_translated, delete_removed)
+            for language, previous_translated in translated.items()}
+
+
+def parse_language_path(language_path):
+  """
+  Parse the path of a dataset of a target language given in the command line
+
+  Args :
+      - language_path (str) : the LANGUAGE=PATH path
+
+  Returns :
+      - tuple : the isocode of the language and the path
+  """
+  language, separator, path = language_path.partition('=')
+  if not separator or not path:
+    raise argparse.ArgumentTypeError(f"invalid dataset path {language_path}, expected LANGUAGE=PATH")
+  return language, path
+
+
+def parse_rate_limit(rate_limit):
+  """
+  Parse the rate limit of an endpoint family given in the command line
+
+  Args :
+      - rate_limit (str) : the FAMILY=RATE rate limit
+
+  Returns :
+      - tuple : the endpoint family and its number of requests per second
+  """
+  family, _, rate = rate_limit.partition('=')
+  if family not in FAMILIES:
+    raise argparse.ArgumentTypeError(f"unknown endpoint family {family}, expected one of {', '.join(FAMILIES)}")
+  try:
+    return family, float(rate)
+  except ValueError:
+    raise argparse.ArgumentTypeError(f"invalid rate limit {rate_limit}, expected FAMILY=RATE") from None
+
+
+def add_distributed_arguments(argparser):
+  """
+  Add the arguments of the distributed runs to the command line
+
+  Args :
+      - argparser (argparse.ArgumentParser) : the parser of the command line
+  """
+  argparser.add_argument('--distributed', '-distributed', choices=['coordinator', 'worker'], nargs='?',
+                         metavar='ROLE', type=str,
+                         help='to translate with the workers of a Redis work queue (coordinator), or to be one of them '
+                              '(worker), the workers taking the languages from the jobs')
+  argparser.add_argument('--queue', '-queue', default='dataset-translation', nargs='?', metavar='QUEUE_NAME', type=str,
+                         help='the name of the Redis work queue of the coordinator and its workers')
+  argparser.add_argument('--intentsperjob', '-intentsperjob', default=DistributedTranslation.INTENTS_PER_JOB,
+                         nargs='?', metavar='INTENTS_PER_JOB', type=int,
+                         help='the number of intents translated by each job of the coordinator')
+  argparser.add_argument('--visibilitytimeout', '-visibility', default=WorkQueue.VISIBILITY_TIMEOUT, nargs='?',
+                         metavar='VISIBILITY_TIMEOUT', type=float,
+                         help='the seconds a job is leased to its worker before it is delivered to another one')
+  argparser.add_argument('--maxattempts', '-attempts', default=WorkQueue.MAX_ATTEMPTS, nargs='?',
+                         metavar='MAX_ATTEMPTS', type=int, help='the maximum number of deliveries of a failed job')
+
+
+def check_distributed_arguments(argparser, args):
+  """
+  Exit with an error if the arguments of the command line do not fit the role of the run
+
+  Args :
+      - argparser (argparse.ArgumentParser) : the parser of the command line
+      - args (argparse.Namespace) : the arguments of the command line
+  """
+  if not args.path and args.distributed != 'worker':
+    argparser.error('the path of the dataset is required (--path)')
+  if args.distributed and (args.resume or args.previous):
+    argparser.error('the distributed runs do not resume from journals (--resume) nor use previous snapshots '
+                    '(--previous)')
+
+
+def run_translation(args, target_languages, options, metrics):
+  """
+  Translate the dataset into the target languages and import it, keeping a journal per target language
+
+  Args :
+      - args (argparse.Namespace) : the arguments of the command line
+      - target_languages (list) : the isocodes of the target languages
+      - options (dict) : the options of the translations
+      - metrics (RunMetrics) : the metrics of the run
+  """
+  options['journals'] = {
+    target_language: Journal(f"{args.journal or args.path[:-5]}-{target_language}-journal.ndjson", resume=args.resume,
+                             overwrite=args.overwritejournal)
+    for target_language in target_languages
+  }
+  if args.api == 'saptranslationhub':
+    data_translator = MultiLanguageTranslation(args.api, args.sourcelang, target_languages, args.userslug,
+                                               args.botslug, args.versionslug, args.developertoken, args.botclientid,
+                                               args.botclientsecret, client_id=args.clientid,
+                                               client_secret=args.clientsecret, **options)
+  elif args.api == 'none':
+    data_translator = MultiLanguageTranslation(args.api, args.sourcelang, target_languages, args.userslug,
+                                               args.botslug, args.versionslug, args.developertoken, args.botclientid,
+                                               args.botclientsecret, **options)
+  else:
+    raise ValueError('translator API is not valid')
+  try:
+    data_translator.dataset_translation(read_dataset(args.path, args.formatfile, args.sourcelang, metrics))
+  finally:
+    data_translator.close()
+
+
+def run_distributed(args, target_languages, options, metrics):
+  """
+  Coordinate the translation of the dataset by the workers of the Redis work queue, and save the translated datasets,
+  or handle the jobs of the queue as one of its workers until interrupted
+
+  Args :
+      - args (argparse.Namespace) : the arguments of the command line
+      - target_languages (list) : the isocodes of the target languages
+      - options (dict) : the options of the translations
+      - metrics (RunMetrics) : the metrics of the run
+  """
+  queue = RedisWorkQueue(args.queue, visibility_timeout=args.visibilitytimeout, max_attempts=args.maxattempts)
+  writers = options.pop('writers', {})
+  if args.distributed == 'worker':
+    worker = TranslationWorker(queue, args.api, args.userslug, args.botslug, args.versionslug, args.developertoken,
+                               args.botclientid, args.botclientsecret, client_id=args.clientid,
+                               client_secret=args.clientsecret, **options)
+    try:
+      worker.run()
+    except KeyboardInterrupt:
+      worker.stop()
+    finally:
+      worker.close()
+    return
+  cai_client = CaiClient(args.userslug, args.botslug, args.versionslug, args.developertoken, args.botclientid,
+                         args.botclientsecret, transport=options['transport'], token_manager=options['token_manager'])
+  coordinator = DistributedTranslation(queue, cai_client, args.sourcelang, target_languages, args.intentsperjob,
+                                       metrics=metrics)
+  translated = coordinator.dataset_translation(read_dataset(args.path, args.formatfile, args.sourcelang, metrics))
+  for target_language, writer in writers.items():
+    writer.write_dataset(translated[target_language])
+
+
+def finish_run(args, options, metrics):
+  """
+  Close the HTTP sessions and the background token refreshes of the run, and save its metrics
+
+  Args :
+      - args (argparse.Namespace) : the arguments of the command line
+      - options (dict) : the options of the translations
+      - metrics (RunMetrics) : the metrics of the run
+  """
+  options['transport'].close()
+  options['token_manager'].close()
+  if args.metrics:
+    metrics.write_report(args.metrics)
+  if args.prometheus:
+    metrics.write_prometheus(args.prometheus)
 
 
 def main():
   argparser = argparse.ArgumentParser(prog='dataset_translation.py', description='Translate a CAI json dataset')
-  argparser.add_argument('--path', '-p', nargs='?', metavar='DATASET_PATH', type=str, required=True,
-                         help='the path of the dataset')
+  argparser.add_argument('--path', '-p', nargs='?', metavar='DATASET_PATH', type=str,
+                         help='the path of the dataset, required unless the run is a distributed worker')
   argparser.add_argument('--api', '-a', choices=['saptranslationhub', 'none'], default='saptranslationhub',
                          nargs='?', metavar='API_TRANSLATOR', type=str,
                          help='the API translator (saptranslationhub or none)')
   argparser.add_argument('--sourcelang', '-s', choices=['en', 'de', 'fr', 'es'], default='en', nargs='?',
                          metavar='SOURCE_LANGUAGE', type=str, required=True, help='the source language')
-  argparser.add_argument('--targetlang', '-t', choices=['en', 'fr', 'es', 'de'], default='fr', nargs='?',
+  argparser.add_argument('--targetlang', '-t', choices=['en', 'fr', 'es', 'de'], default=['fr'], nargs='+',
                          metavar='TARGET_LANGUAGE', type=str, required=True,
-                         help='the target language (en, fr, es or de)')
+                         help='the target languages (en, fr, es or de), translated concurrently')
   argparser.add_argument('--userslug', '-user', nargs='?', metavar='USER_SLUG', type=str, required=True,
                          help='the user slug of the bot')
   argparser.add_argument('--botslug', '-bot', nargs='?', metavar='BOT_SLUG', type=str, required=True,
@@ -71,23 +295,105 @@ def main():
                          help='to save the translated CAI JSON dataset')
   argparser.add_argument('--formatfile', '-format', choices=['cai_platform', 'cai'], default='cai_platform', nargs='?',
                          metavar='FORMAT_FILE', type=str, help='the format of the dataset in input')
+  argparser.add_argument('--outputformat', '-outformat', choices=list(DatasetWriter.MODES), default='indent', nargs='?',
+                         metavar='OUTPUT_FORMAT', type=str,
+                         help='the format of the saved dataset (indent, compact or ndjson)')
+  argparser.add_argument('--compression', '-compress', choices=['none', *DatasetWriter.COMPRESSIONS], default='none',
+                         nargs='?', metavar='COMPRESSION', type=str,
+                         help='the compression of the saved dataset (none, gzip or zlib)')
+  argparser.add_argument('--journal', '-journal', nargs='?', metavar='JOURNAL_PREFIX', type=str,
+                         help='the path prefix of the journals of the work done, the dataset path by default')
+  argparser.add_argument('--resume', '-resume', action='store_true',
+                         help='to resume an interrupted run from its journal, without importing its work again')
+  argparser.add_argument('--overwritejournal', '-overwritejournal', action='store_true',
+                         help='to start a new journal over the non-empty journal of a previous run, instead of failing')
+  argparser.add_argument('--previous', '-previous', nargs='?', metavar='PREVIOUS_PATH', type=str,
+                         help='the path of the previous snapshot of the dataset, in the same format, to only translate '
+                              'and import what was added or changed since')
+  argparser.add_argument('--previoustranslated', '-prevtranslated', default=[], nargs='*', metavar='LANGUAGE=PATH',
+                         type=parse_language_path,
+                         help='the CAI-format datasets translated from the previous snapshot, saved in the indent or '
+                              'compact format')
+  argparser.add_argument('--deleteremoved', '-deleteremoved', action='store_true',
+                         help='to delete on the platform the translations of the expressions removed since the '
+                              'previous snapshot')
+  argparser.add_argument('--skipexisting', '-skipexisting', action='store_true',
+                         help='to list the expressions already on the platform in the target languages, and not import '
+                              'them again')
+  argparser.add_argument('--tokencache', '-tokencache', nargs='?', metavar='TOKEN_CACHE_PATH', type=str,
+                         help='the path of the file caching the access tokens between runs, readable by its owner only')
+  argparser.add_argument('--translationmemory', '-tm', nargs='?', metavar='TRANSLATION_MEMORY_PATH', type=str,
+                         help='the path of the SQLite translation memory reused between runs')
+  argparser.add_argument('--translationmemorysize', '-tmsize', nargs='?', metavar='TRANSLATION_MEMORY_SIZE', type=int,
+                         help='the maximum number of translations kept in the translation memory')
+  argparser.add_argument('--poolsize', '-pool', default=Transport.POOL_SIZE, nargs='?', metavar='POOL_SIZE', type=int,
+                         help='the maximum number of kept-alive connections per host')
+  argparser.add_argument('--timeout', '-timeout', default=Transport.TIMEOUT[1], nargs='?', metavar='TIMEOUT', type=float,
+                         help='the timeout in seconds of the HTTP requests')
+  argparser.add_argument('--ratelimit', '-ratelimit', default=[], nargs='*', metavar='FAMILY=RATE',
+                         type=parse_rate_limit,
+                         help=f"the maximum number of requests per second of endpoint families ({', '.join(FAMILIES)})")
+  argparser.add_argument('--maxretries', '-retries', default=RetryPolicy.MAX_RETRIES, nargs='?', metavar='MAX_RETRIES',
+                         type=int, help='the maximum number of retries of a request answered with 429 or 5xx')
+  argparser.add_argument('--metrics', '-metrics', nargs='?', metavar='METRICS_PATH', type=str,
+                         help='the path of the JSON run report with the timings, requests and cache hits of the run')
+  argparser.add_argument('--prometheus', '-prometheus', nargs='?', metavar='PROMETHEUS_PATH', type=str,
+                         help='the path of the metrics of the run in the Prometheus text format')
+  argparser.add_argument('--engine', '-engine', choices=['sequential', 'asyncio'], default='sequential', nargs='?',
+                         metavar='ENGINE', type=str,
+                         help='the execution engine (sequential, or asyncio to send the requests concurrently)')
+  argparser.add_argument('--maxinflight', '-inflight', default=AsyncDatasetTranslation.MAX_IN_FLIGHT, nargs='?',
+                         metavar='MAX_IN_FLIGHT', type=int,
+                         help='the maximum number of concurrent requests per host with the asyncio engine')
+  argparser.add_argument('--bulksize', '-bulk', default=CaiClient.SIZE_BULK, nargs='?', metavar='BULK_SIZE', type=int,
+                         help='the number of expressions imported per request, 0 to import them one by one')
+  add_distributed_arguments(argparser)
 
   args = argparser.parse_args()
-
-  if args.api == 'saptranslationhub':
-    data_translator = DatasetTranslation(args.api, args.sourcelang, args.targetlang, args.userslug, args.botslug,
-                                         args.versionslug, args.developertoken, args.botclientid, args.botclientsecret,
-                                         client_id=args.clientid, client_secret=args.clientsecret)
-  elif args.api == 'none':
-    data_translator = DatasetTranslation(args.api, args.sourcelang, args.targetlang, args.userslug, args.botslug,
-                                         args.versionslug, args.developertoken, args.botclientid, args.botclientsecret)
+  target_languages = list(dict.fromkeys(args.targetlang))
+  check_distributed_arguments(argparser, args)
+  previous_translated = dict(args.previoustranslated)
+  if previous_translated and not args.previous:
+    argparser.error('the previous translated datasets require the previous snapshot of the dataset (--previous)')
+  if set(previous_translated) - set(target_languages):
+    argparser.error(f"no target language for the previous translated datasets of "
+                    f"{', '.join(set(previous_translated) - set(target_languages))}")
+  pool_size = args.poolsize
+  metrics = RunMetrics()
+  if args.engine == 'asyncio':
+    pool_size = max(args.poolsize, args.maxinflight * len(target_languages))
+  options = {
+    'translation_memory': args.translationmemory,
+    'translation_memory_size': args.translationmemorysize,
+    'transport': Transport(pool_size=pool_size, timeout=(Transport.TIMEOUT[0], args.timeout),
+                           rate_limiter=RateLimiter(dict(args.ratelimit)),
+                           retry_policy=RetryPolicy(max_retries=args.maxretries), metrics=metrics),
+    'metrics': metrics,
+    'bulk_size': args.bulksize,
+    'skip_existing': args.skipexisting,
+    'token_manager': TokenManager(args.tokencache)
+  }
+  if args.previous:
+    options['deltas'] = read_deltas(args.previous, previous_translated, args.formatfile, args.sourcelang, metrics,
+                                    args.deleteremoved)
+  if args.savefile and args.distributed != 'worker':
+    compression = args.compression if args.compression != 'none' else None
+    extension = DatasetWriter.extension(args.outputformat, compression)
+    options['writers'] = {
+      target_language: DatasetWriter(f"{args.path[:-5]}-{target_language}-translated-{args.api}{extension}",
+                                     args.outputformat, compression)
+      for target_language in target_languages
+    }
+  if args.engine == 'asyncio':
+    options['engine'] = AsyncDatasetTranslation
+    options['max_in_flight'] = args.maxinflight
   else:
-    raise ValueError('translator API is not valid')
-
-  dataset = open_file(args.path)
-  if args.formatfile == 'cai_platform':
-    dataset = Dataset().to_cai_format(dataset, args.sourcelang)
-  translated_data = data_translator.dataset_translation(dataset)
+    options['engine'] = DatasetTranslation
 
-  if args.savefile:
-    write_file(f"{args.path[:-5]}-{args.targetlang}-translated-{args.api}.json", translated_data)
+  try:
+    if args.distributed:
+      run_distributed(args, target_languages, options, metrics)
+    else:
+      run_translation(args, target_languages, options, metrics)
+  finally:
+    finish_run(args, options, metrics)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+
+class TranslationPlan:
+  """
+  The unique source strings of a CAI-format dataset (expressions, synonyms and free/restricted entity tokens), so that
+  each of them is translated exactly once and the translations are scattered back from a lookup table.
+  """
+
+  def __init__(self):
+    self.sources = {}
+    self.occurrences = 0
+    self.translations = {}
+
+  @classmethod
+  def from_dataset(cls, dataset):
+    """
+    Collect the source strings of a CAI-format dataset
+
+    Args :
+        - dataset (dict) : the CAI-format json dataset
+
+    Returns :
+        - TranslationPlan : the plan of the unique source strings of the dataset
+    """
+    plan = cls()
+    gazette_names = set()
+    for gazette in dataset['gazettes']:
+      gazette_names.add(gazette.get('name'))
+      if gazette['synonyms']:
+        plan.add(gazette['synonyms'])
+    for intent in dataset['intents']:
+      plan.add([expression['source'] for expression in intent['expressions']])
+      for expression in intent['expressions']:
+        plan.add([token['word'] for token in expression['tokens']
+                  if token['entity'] is not None and token['entity']['type'] != 'gold'
+                  and token['entity']['name'] in gazette_names])
+    return plan
+
+  def add(self, texts):
+    """
+    Add source strings to the plan
+
+    Args :
+        - texts (list) : the source strings
+    """
+    self.occurrences += len(texts)
+    self.sources.update(dict.fromkeys(texts))
+
+  def translate(self, translator, batch_size):
+    """
+    Translate the source strings not translated yet, in as few batches as possible
+
+    Args :
+        - translator (Translator) : the translator
+        - batch_size (int) : the size of the batch to split the strings to translate
+    """
+    texts = [text for text in self.sources if text not in self.translations]
+    if not texts:
+      return
+    translations = translator.batch_translate(texts, batch_size)
+    if len(translations) != len(texts):
+      raise ValueError(f"{len(translations)} translations received for {len(texts)} expressions")
+    self.translations.update(zip(texts, translations))
+
+  def get(self, texts):
+    """
+    Getter of the translations of source strings
+
+    Args :
+        - texts (list) : the source strings
+
+    Returns :
+        - list : the translations, or None if one of the strings is not translated by the plan
+    """
+    if not all(text in self.translations for text in texts):
+      return None
+    return [self.translations[text] for text in texts]
+
+  def stats(self):
+    """
+    Statistics of the plan
+
+    Returns :
+        - dict : the number of source strings, of unique source strings and of characters to translate
+    """
+    return {
+      'strings': self.occurrences,
+      'unique_strings': len(self.sources),
+      'characters': sum(len(text) for text in self.sources)
+    }
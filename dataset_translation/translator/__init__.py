@@ -1,7 +1,9 @@
 from .sap_translation_hub_translator import SAPTranslationHubTranslator
 from .none_translator import NoneTranslator
+from .translation_memory import TranslationMemory
 
 __all__ = (
   'SAPTranslationHubTranslator',
   'NoneTranslator',
+  'TranslationMemory',
 )
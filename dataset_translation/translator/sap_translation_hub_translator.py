@@ -1,41 +1,83 @@
+import logging
+import re
 import unicodedata
-import requests
 from requests_toolbelt.multipart.encoder import MultipartEncoder
 
 from .translator import Translator
+from ..token_manager import TokenManager
+from ..transport import Transport
 
 
 class SAPTranslationHubTranslator(Translator):
   """Translator using the SAP Translation Hub API"""
-  def __init__(self, source_language, target_language, client_id, client_secret):
+  SEPARATOR = '\n'
+  FRAME = '[[{}]] '
+  LINE_FRAME = '[[{}.{}]] '
+  FRAME_REGEX = re.compile(r"^\s*\[\[\s*(\d+)\s*(?:\.\s*(\d+)\s*)?\]\]\s?(.*)$")
+  ESCAPE_REGEX = re.compile(r"\[\[")
+  UNESCAPE_REGEX = re.compile(r"\[\[\[")
+  MAX_BATCH_BYTES = 5000
+  TOKEN_URL = 'https://translation.authentication.sap.hana.ondemand.com/oauth/token'
+  API_URL = 'https://document-translation.cfapps.sap.hana.ondemand.com/api/v1/translation'
+
+  def __init__(self, source_language, target_language, client_id, client_secret, transport=None, max_batch_bytes=MAX_BATCH_BYTES, token_manager=None, api_url=API_URL, token_url=TOKEN_URL):  # pylint: disable=line-too-long,too-many-arguments
     """
     Args :
     - source_language (str) : the isocode of the source language
     - target_language (str) : the isocode of the target language
     - client_id (str) : the client id of the SAP Translation Hub API account
     - client_secret (str) : the client secret of the SAP Translation Hub API account
+    - transport (Transport) : the HTTP transport shared with the CAI client (optional)
+    - max_batch_bytes (int) : the maximum size in bytes of the text of a translation request (optional)
+    - token_manager (TokenManager) : the cache of the access tokens, shared with the CAI client (optional)
+    - api_url (str) : the url of the document translation endpoint (optional)
+    - token_url (str) : the url of the OAuth token endpoint (optional)
     """
     if self.supported_translation(source_language, target_language):
+      self.transport = transport if transport is not None else Transport()
+      self.max_batch_bytes = max_batch_bytes
+      self.logger = logging.getLogger(__name__)
       source_language_sapcode = self.sapcode_language(source_language)
       target_language_sapcode = self.sapcode_language(target_language)
       super().__init__(source_language_sapcode, target_language_sapcode)
       self.client_id = client_id
       self.client_secret = client_secret
-      self.token = self.login()
-      self.url = f"https://document-translation.cfapps.sap.hana.ondemand.com/api/v1/translation?sourceLanguage={source_language_sapcode}&targetLanguage={target_language_sapcode}"
+      self.token_manager = token_manager if token_manager is not None else TokenManager()
+      self.token_url = token_url
+      self.url = f"{api_url}?sourceLanguage={source_language_sapcode}&targetLanguage={target_language_sapcode}"
     else:
       raise ValueError('Translation not supported')
 
+  @property
+  def token_key(self):
+    return f"{self.token_url}#{self.client_id}"
+
+  @property
+  def token(self):
+    return self.login()
+
   def login(self):
-    """Login method
+    """Login method, the access token is fetched on first use and then taken from the cache of the access tokens
+
+    Returns :
+        - str : the access token
+    """
+    return self.token_manager.token(self.token_key, self.fetch_token)
+
+  def fetch_token(self):
+    """Fetch a new access token
 
     Returns :
         - str : the access token
+        - int : the lifetime of the access token in seconds
     """
-    token_url = 'https://translation.authentication.sap.hana.ondemand.com/oauth/token'
-    access_token_response = requests.post(token_url, data={'grant_type': 'client_credentials'}, verify=False,
-                                          allow_redirects=False, auth=(self.client_id, self.client_secret))
-    return access_token_response.json()['access_token']
+    access_token_response = self.transport.post(self.token_url, data={'grant_type': 'client_credentials'},
+                                                verify=False, allow_redirects=False,
+                                                auth=(self.client_id, self.client_secret))
+    if access_token_response.status_code != 200:
+      raise ValueError(access_token_response.text)
+    content = access_token_response.json()
+    return content['access_token'], content.get('expires_in')
 
 
   def batch_translate(self, expressions, batch_size):
@@ -43,35 +85,153 @@ class SAPTranslationHubTranslator(Translator):
 
     Args :
         - expressions (list) : a list of expressions to be translated
-        - batch_size (int) : the size of the batch to split the expressions to translate
+        - batch_size (int) : the maximum number of expressions of a batch, batches are also limited in bytes
 
     Returns:
         - list : the list of translated expressions
     """
     translations = []
-    for i in range(0, len(expressions), batch_size):
-      batch_expressions = []
-      for expression in expressions[i:min(i+batch_size, len(expressions))]:
-        batch_expressions.append(expression)
-
-        encoder = MultipartEncoder(
-          fields={
-            'file': ('null', ' \n '.join(batch_expressions), 'text/plain'),
-          }
-        )
-
-        headers = {
-          'Authorization': f"Bearer {self.token}",
-          'Content-type': encoder.content_type
+    for batch_expressions in self.pack_batches(expressions, batch_size, self.max_batch_bytes):
+      translations.extend(self.translate_batch(batch_expressions))
+    return translations
+
+  def translate_batch(self, batch_expressions):
+    """
+    Translate a batch of expressions with each line tagged by its index in the batch. If the translated lines do not
+    match the expressions, the batch is bisected and translated again in smaller batches.
+
+    Args :
+        - batch_expressions (list) : a batch of expressions to be translated
+
+    Returns :
+        - list : the list of translated expressions
+    """
+    text = self.SEPARATOR.join(self.frame(i, expression) for i, expression in enumerate(batch_expressions))
+    translations = self.unframe(self.request_translation(text), len(batch_expressions),
+                                [expression.count('\n') + 1 for expression in batch_expressions])
+    if translations is not None:
+      return translations
+    if len(batch_expressions) == 1:
+      self.logger.warning('Tagged translation not recovered, translating the expression without tag')
+      return [self.request_translation(batch_expressions[0]).strip()]
+    self.logger.debug('Translated lines do not match a batch of %s expressions, bisecting it', len(batch_expressions))
+    middle = len(batch_expressions) // 2
+    return self.translate_batch(batch_expressions[:middle]) + self.translate_batch(batch_expressions[middle:])
+
+  def request_translation(self, text):
+    """
+    Send a translation request
+
+    Args :
+        - text (str) : the text to be translated
+
+    Returns :
+        - str : the translated text
+    """
+    for attempt in range(2):
+      encoder = MultipartEncoder(
+        fields={
+          'file': ('null', text, 'text/plain'),
         }
+      )
+
+      token = self.token
+      headers = {
+        'Authorization': f"Bearer {token}",
+        'Content-type': encoder.content_type
+      }
 
-      response = requests.request('POST', self.url, headers=headers, data=encoder)
+      response = self.transport.request('POST', self.url, headers=headers, data=encoder.to_string())
+      if response.status_code != 401 or attempt:
+        break
+      self.token_manager.invalidate(self.token_key, token)
 
-      if response.status_code == 200:
-        translations.append(unicodedata.normalize('NFKD', response.text).split(' \n '))
-      else:
-        raise ValueError(response.text)
-    return [item for sublist in translations for item in sublist]
+    if response.status_code == 200:
+      return unicodedata.normalize('NFKD', response.text)
+    raise ValueError(response.text)
+
+  @classmethod
+  def frame(cls, index, expression):
+    """
+    Tag the lines of an expression with its index in the batch, and the lines after the first one with their index in
+    the expression. The `[[` of the expression are escaped as `[[[`, so that they are never taken for a tag.
+
+    Args :
+        - index (int) : the index of the expression in the batch
+        - expression (str) : the expression
+
+    Returns :
+        - str : the tagged lines of the expression
+    """
+    lines = cls.ESCAPE_REGEX.sub('[[[', expression).split('\n')
+    return cls.SEPARATOR.join((cls.LINE_FRAME.format(index, line_index) if line_index else cls.FRAME.format(index))
+                              + line for line_index, line in enumerate(lines))
+
+  @classmethod
+  def unframe(cls, text, size, line_counts=None):
+    """
+    Recover the translated expressions from the tagged lines of a translated batch. Untagged lines are joined to the
+    previous tagged line, and the tagged lines of an expression are joined back with newlines.
+
+    Args :
+        - text (str) : the translated text
+        - size (int) : the number of expressions of the batch
+        - line_counts (list) : the number of lines of each expression of the batch, one each by default
+
+    Returns :
+        - list : the translated expressions, or None if the tags do not match the lines of the batch
+    """
+    line_counts = line_counts if line_counts is not None else [1] * size
+    lines = {}
+    key = None
+    for line in text.split(cls.SEPARATOR):
+      match = cls.FRAME_REGEX.match(line)
+      if match:
+        key = (int(match.group(1)), int(match.group(2) or 0))
+        if key in lines or key[0] >= size or key[1] >= line_counts[key[0]]:
+          return None
+        lines[key] = [match.group(3)]
+      elif key is not None:
+        lines[key].append(line)
+      elif line.strip():
+        return None
+    if len(lines) != sum(line_counts):
+      return None
+    translations = []
+    for index in range(size):
+      expression = '\n'.join(' '.join(part.strip() for part in lines[(index, line_index)] if part.strip())
+                             for line_index in range(line_counts[index]))
+      translations.append(cls.UNESCAPE_REGEX.sub('[[', expression))
+    return translations
+
+  @classmethod
+  def pack_batches(cls, expressions, max_items, max_bytes):
+    """
+    Split the expressions in consecutive batches limited in number of expressions and in bytes of tagged lines, an
+    expression larger than the limit in bytes is sent alone in its batch
+
+    Args :
+        - expressions (list) : a list of expressions to be translated
+        - max_items (int) : the maximum number of expressions of a batch
+        - max_bytes (int) : the maximum size in bytes of the joined tagged expressions of a batch
+
+    Returns :
+        - list : the batches of expressions
+    """
+    batches = []
+    batch, batch_bytes = [], 0
+    separator_bytes = len(cls.SEPARATOR.encode('utf-8'))
+    for expression in expressions:
+      expression_bytes = len(cls.frame(len(batch), expression).encode('utf-8'))
+      if batch and (len(batch) >= max_items or batch_bytes + separator_bytes + expression_bytes > max_bytes):
+        batches.append(batch)
+        batch, batch_bytes = [], 0
+        expression_bytes = len(cls.frame(0, expression).encode('utf-8'))
+      batch_bytes += expression_bytes + (separator_bytes if batch else 0)
+      batch.append(expression)
+    if batch:
+      batches.append(batch)
+    return batches
 
   @staticmethod
   def sapcode_language(language):
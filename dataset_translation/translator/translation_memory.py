@@ -0,0 +1,179 @@
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from .translator import Translator
+
+
+class TranslationMemory(Translator):
+  """
+  Translator keeping the translations of another translator in a local SQLite file, so that only the texts never
+  translated before are sent to the wrapped translator.
+
+  The memories of several language pairs can share the same file from concurrent threads or processes: the file is
+  in WAL mode, so that readers do not block the writer, and a writer waits up to the busy timeout for the lock of the
+  file instead of failing with "database is locked". The lookups only read the file: the times the translations were
+  last used are kept in memory, and written with the next stored translations or when the memory is closed.
+  """
+  SIZE_LOOKUP = 500
+  SIZE_RECENCY = 10000
+  BUSY_TIMEOUT = 30
+
+  def __init__(self, translator, path, max_entries=None):
+    """
+    Args :
+    - translator (Translator) : the wrapped translator, called for the texts missing from the memory
+    - path (str) : the path of the SQLite file of the memory
+    - max_entries (int) : the maximum number of translations kept, the least recently used are evicted (optional)
+    """
+    super().__init__(translator.source_language, translator.target_language)
+    self.translator = translator
+    self.max_entries = max_entries
+    self.hits = 0
+    self.misses = 0
+    self.last_used = 0.0
+    self.recency = {}
+    self.lock = threading.Lock()
+    self.connection = sqlite3.connect(path, timeout=self.BUSY_TIMEOUT, check_same_thread=False)
+    self.connection.execute('PRAGMA journal_mode=WAL')
+    self.connection.execute('CREATE TABLE IF NOT EXISTS translations ('
+                            'source_language TEXT NOT NULL, target_language TEXT NOT NULL, text TEXT NOT NULL, '
+                            'translation TEXT NOT NULL, last_used REAL NOT NULL, '
+                            'PRIMARY KEY (source_language, target_language, text))')
+    self.connection.execute('CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)')
+    self.connection.commit()
+    self.logger = logging.getLogger(__name__)
+
+  def batch_translate(self, expressions, batch_size):
+    """Translation method, only the texts missing from the memory are translated by the wrapped translator
+
+    Args :
+        - expressions (list) : a list of expressions to be translated
+        - batch_size (int) : the size of the batch to split the missing expressions to translate
+
+    Returns:
+        - list : the list of translated expressions
+    """
+    keys = [self.normalize(expression) for expression in expressions]
+    with self.lock:
+      translations = self.lookup(set(keys))
+      missing = {}
+      for key, expression in zip(keys, expressions):
+        if key not in translations and key not in missing:
+          missing[key] = expression
+      self.hits += len(keys) - len(missing)
+      self.misses += len(missing)
+
+    if missing:
+      translated = self.translator.batch_translate(list(missing.values()), batch_size)
+      if len(translated) != len(missing):
+        raise ValueError(f"{len(translated)} translations received for {len(missing)} expressions")
+      new_translations = dict(zip(missing.keys(), translated))
+      with self.lock:
+        self.store(new_translations)
+      translations.update(new_translations)
+    return [translations[key] for key in keys]
+
+  def lookup(self, keys):
+    """
+    Get the stored translations of the normalized texts and mark them as recently used, the marks being written with
+    the next stored translations
+
+    Args :
+        - keys (set) : the normalized texts
+
+    Returns :
+        - dict : the translation of each normalized text found in the memory
+    """
+    keys = list(keys)
+    translations = {}
+    for i in range(0, len(keys), self.SIZE_LOOKUP):
+      chunk = keys[i:i + self.SIZE_LOOKUP]
+      rows = self.connection.execute('SELECT text, translation FROM translations WHERE source_language = ? AND '
+                                     f"target_language = ? AND text IN ({','.join('?' * len(chunk))})",
+                                     [self.source_language, self.target_language] + chunk)
+      translations.update(rows.fetchall())
+    if translations:
+      now = self.now()
+      self.recency.update(dict.fromkeys(translations, now))
+      if len(self.recency) >= self.SIZE_RECENCY:
+        self.write_recency()
+        self.connection.commit()
+    return translations
+
+  def write_recency(self):
+    """
+    Write the times the translations were last used since the previous write, without committing them
+    """
+    if self.recency:
+      self.connection.executemany('UPDATE translations SET last_used = ? WHERE source_language = ? AND '
+                                  'target_language = ? AND text = ?',
+                                  [(last_used, self.source_language, self.target_language, key)
+                                   for key, last_used in self.recency.items()])
+      self.recency = {}
+
+  def store(self, translations):
+    """
+    Store new translations with the times the translations were last used, and evict the least recently used ones
+    above the size cap
+
+    Args :
+        - translations (dict) : the translation of each normalized text
+    """
+    self.write_recency()
+    now = self.now()
+    self.connection.executemany('INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?)',
+                                [(self.source_language, self.target_language, key, translation, now)
+                                 for key, translation in translations.items()])
+    if self.max_entries is not None:
+      size = self.connection.execute('SELECT COUNT(*) FROM translations').fetchone()[0]
+      if size > self.max_entries:
+        self.connection.execute('DELETE FROM translations WHERE rowid IN '
+                                '(SELECT rowid FROM translations ORDER BY last_used LIMIT ?)',
+                                (size - self.max_entries,))
+        self.logger.debug('Evicted %s translations from the translation memory', size - self.max_entries)
+    self.connection.commit()
+
+  def now(self):
+    """
+    Timestamp of the current use of the memory, strictly increasing so that the eviction order is deterministic
+
+    Returns :
+        - float : the timestamp
+    """
+    self.last_used = max(time.time(), self.last_used + 1e-6)
+    return self.last_used
+
+  def stats(self):
+    """
+    Statistics of the translation memory
+
+    Returns :
+        - dict : the number of hits, misses and stored translations
+    """
+    with self.lock:
+      size = self.connection.execute('SELECT COUNT(*) FROM translations').fetchone()[0]
+    return {'hits': self.hits, 'misses': self.misses, 'size': size}
+
+  def close(self):
+    """Write the times the translations were last used and close the SQLite file of the memory"""
+    with self.lock:
+      if self.recency:
+        self.write_recency()
+        self.connection.commit()
+      self.connection.close()
+
+  @staticmethod
+  def normalize(text):
+    """
+    Normalize a text to be used as a key of the memory
+
+    Args :
+        - text (str) : the text to normalize
+
+    Returns :
+        - str : the text in NFC form with collapsed whitespaces
+    """
+    return unicodedata.normalize('NFC', ' '.join(text.split()))
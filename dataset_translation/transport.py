@@ -0,0 +1,134 @@
+# coding: utf-8
+
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from .rate_limit import RetryPolicy
+from .run_metrics import body_size
+
+
+class Transport:
+  """
+  HTTP transport shared by the CAI client and the translators, keeping a pooled keep-alive session per host so that
+  the TCP and TLS handshakes are not paid on every request.
+
+  The requests can be limited in rate per endpoint family, and the requests answered with 429 or 5xx are sent again
+  after a backoff, the POSTs only when they were not processed. Each request sent is recorded in the run metrics, if
+  any.
+  """
+  POOL_SIZE = 10
+  TIMEOUT = (10, 60)
+
+  def __init__(self, pool_size=POOL_SIZE, timeout=TIMEOUT, rate_limiter=None, retry_policy=None, metrics=None):
+    """
+    Args :
+        - pool_size (int) : the maximum number of kept-alive connections per host
+        - timeout (float or tuple) : the default (connect, read) timeout in seconds of the requests
+        - rate_limiter (RateLimiter) : the limits of requests per second of the endpoint families (optional)
+        - retry_policy (RetryPolicy) : the retries of the requests answered with 429 or 5xx (optional)
+        - metrics (RunMetrics) : the metrics recording the count, bytes and latency of the requests (optional)
+    """
+    self.pool_size = pool_size
+    self.timeout = timeout
+    self.rate_limiter = rate_limiter
+    self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+    self.metrics = metrics
+    self.logger = logging.getLogger(__name__)
+    self.sessions = {}
+    self.lock = threading.Lock()
+
+  def session(self, url):
+    """
+    Getter of the session of the host of an url, created on first use
+
+    Args :
+        - url (str) : the url of the request
+
+    Returns :
+        - requests.Session : the session of the host
+    """
+    parsed_url = urlsplit(url)
+    host = (parsed_url.scheme, parsed_url.netloc)
+    with self.lock:
+      if host not in self.sessions:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount(f"{parsed_url.scheme}://", adapter)
+        self.sessions[host] = session
+      return self.sessions[host]
+
+  def request(self, method, url, **kwargs):
+    """
+    Send a request with the session of the host, with the default timeout if none is given, once the rate limit of
+    its endpoint family allows it, and again after a backoff while the retry policy allows it
+
+    Args :
+        - method (str) : the HTTP method
+        - url (str) : the url of the request
+        - kwargs : the arguments of `requests.Session.request`, the body must not be a stream to be sent again
+
+    Returns :
+        - requests.Response : the response
+    """
+    kwargs.setdefault('timeout', self.timeout)
+    session = self.session(url)
+    attempt = 0
+    response = self.send(session, method, url, **kwargs)
+    while self.retry_policy.should_retry(attempt, response, method, url):
+      delay = self.retry_policy.delay(attempt, response)
+      self.logger.warning('%s %s answered %s, retrying in %.1fs', method, urlsplit(url).path, response.status_code,
+                          delay)
+      response.close()
+      time.sleep(delay)
+      attempt += 1
+      response = self.send(session, method, url, **kwargs)
+    return response
+
+  def send(self, session, method, url, **kwargs):
+    """
+    Send a request once the rate limit of its endpoint family allows it, and record it in the run metrics
+
+    Args :
+        - session (requests.Session) : the session of the host
+        - method (str) : the HTTP method
+        - url (str) : the url of the request
+        - kwargs : the arguments of `requests.Session.request`
+
+    Returns :
+        - requests.Response : the response
+    """
+    if self.rate_limiter is not None:
+      self.rate_limiter.acquire(method, url)
+    if self.metrics is None:
+      return session.request(method, url, **kwargs)
+    start = time.perf_counter()
+    try:
+      response = session.request(method, url, **kwargs)
+    except requests.RequestException:
+      self.metrics.record_request(method, url, None, time.perf_counter() - start, body_size(kwargs.get('data')), 0)
+      raise
+    self.metrics.record_request(method, url, response.status_code, time.perf_counter() - start,
+                                body_size(response.request.body), len(response.content))
+    return response
+
+  def get(self, url, **kwargs):
+    return self.request('GET', url, **kwargs)
+
+  def post(self, url, **kwargs):
+    return self.request('POST', url, **kwargs)
+
+  def put(self, url, **kwargs):
+    return self.request('PUT', url, **kwargs)
+
+  def delete(self, url, **kwargs):
+    return self.request('DELETE', url, **kwargs)
+
+  def close(self):
+    """Close the sessions of all the hosts"""
+    with self.lock:
+      for session in self.sessions.values():
+        session.close()
+      self.sessions = {}
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+
+try:
+  import redis
+except ImportError:
+  redis = None
+
+RESERVE_SCRIPT = """
+local now, deadline, max_attempts = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+while true do
+  local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now, 'LIMIT', 0, 1)
+  if #due == 0 then
+    return false
+  end
+  local job_id = due[1]
+  local attempt = redis.call('HINCRBY', KEYS[3], job_id, 1)
+  if attempt <= max_attempts then
+    redis.call('ZADD', KEYS[1], deadline, job_id)
+    return {job_id, redis.call('HGET', KEYS[2], job_id), attempt}
+  end
+  redis.call('ZREM', KEYS[1], job_id)
+  redis.call('HSET', KEYS[4], job_id, ARGV[4])
+end
+"""
+
+FAIL_SCRIPT = """
+local attempt = tonumber(redis.call('HGET', KEYS[2], ARGV[1]))
+if not redis.call('ZSCORE', KEYS[1], ARGV[1]) or attempt ~= tonumber(ARGV[2]) then
+  return -1
+end
+if tonumber(ARGV[2]) >= tonumber(ARGV[3]) then
+  redis.call('ZREM', KEYS[1], ARGV[1])
+  redis.call('HSET', KEYS[3], ARGV[1], ARGV[5])
+  return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[4], ARGV[1])
+return 1
+"""
+
+
+class WorkQueue(ABC):
+  """
+  Queue of jobs shared by a coordinator and its workers, with at-least-once delivery.
+
+  A reserved job is leased to its worker until its visibility timeout, after which it is delivered again to another
+  worker, so that the jobs of a worker that died are not lost. A failed job is delivered again after the retry delay,
+  until it has been delivered the maximum number of attempts. The result or the last error of each job is kept for
+  the coordinator. The jobs, results and errors are strings.
+  """
+  VISIBILITY_TIMEOUT = 600
+  RETRY_DELAY = 5
+  MAX_ATTEMPTS = 3
+
+  def __init__(self, name, visibility_timeout=VISIBILITY_TIMEOUT, retry_delay=RETRY_DELAY, max_attempts=MAX_ATTEMPTS, clock=time.time):  # pylint: disable=line-too-long,too-many-arguments
+    """
+    Args :
+      - name (str) : the name of the queue, shared by the coordinator and its workers
+      - visibility_timeout (float) : the seconds a reserved job is leased to its worker, longer than the longest job
+      - retry_delay (float) : the seconds before a failed job is delivered again
+      - max_attempts (int) : the maximum number of deliveries of a job
+      - clock (function) : the current time in seconds, shared by the nodes of the queue (optional)
+    """
+    self.name = name
+    self.visibility_timeout = visibility_timeout
+    self.retry_delay = retry_delay
+    self.max_attempts = max_attempts
+    self.clock = clock
+
+  def expired_error(self):
+    """
+    Returns :
+      - str : the error of a job whose lease expired on its last attempt
+    """
+    return f"no result after {self.max_attempts} attempts, the visibility timeout of {self.visibility_timeout}s expired"
+
+  @abstractmethod
+  def push(self, job_id, job):
+    """
+    Queue a job, visible at once
+
+    Args :
+      - job_id (str) : the id of the job, unique in the queue
+      - job (str) : the job
+    """
+
+  @abstractmethod
+  def reserve(self):
+    """
+    Lease the next visible job until its visibility timeout
+
+    Returns :
+      - tuple : the id, the job and the attempt number of the job, None if no job is visible
+    """
+
+  @abstractmethod
+  def ack(self, job_id, result):
+    """
+    Complete a job with its result, the first result of a job delivered several times is kept
+
+    Args :
+      - job_id (str) : the id of the job
+      - result (str) : the result of the job
+
+    Returns :
+      - bool : False if the job already had a result
+    """
+
+  @abstractmethod
+  def fail(self, job_id, attempt, error):
+    """
+    Fail an attempt of a job, delivered again after the retry delay unless it was its last attempt
+
+    Args :
+      - job_id (str) : the id of the job
+      - attempt (int) : the attempt number of the job, ignored if the job was delivered again since
+      - error (str) : the error of the attempt
+
+    Returns :
+      - bool : True if the job will be delivered again
+    """
+
+  @abstractmethod
+  def results(self, job_ids):
+    """
+    Args :
+      - job_ids (list) : the ids of the jobs
+
+    Returns :
+      - dict : the result of each completed job
+    """
+
+  @abstractmethod
+  def errors(self, job_ids):
+    """
+    Args :
+      - job_ids (list) : the ids of the jobs
+
+    Returns :
+      - dict : the last error of each job failed on its last attempt
+    """
+
+  @abstractmethod
+  def remove(self, job_ids):
+    """
+    Remove jobs with their results and errors, leaving the other jobs of the queue untouched
+
+    Args :
+      - job_ids (list) : the ids of the jobs
+    """
+
+  @abstractmethod
+  def clear(self):
+    """
+    Remove the jobs, results and errors of the queue
+    """
+
+
+class MemoryWorkQueue(WorkQueue):
+  """
+  In-process stand-in of `RedisWorkQueue`, for the workers running as threads of the coordinator and for the tests
+  """
+
+  def __init__(self, name='dataset-translation', **options):
+    super().__init__(name, **options)
+    self.lock = threading.Lock()
+    self.jobs = {}
+    self.visible_at = {}
+    self.attempts = {}
+    self.completed = {}
+    self.failed = {}
+
+  def push(self, job_id, job):
+    with self.lock:
+      self.jobs[job_id] = job
+      self.visible_at[job_id] = self.clock()
+      for table in (self.attempts, self.completed, self.failed):
+        table.pop(job_id, None)
+
+  def reserve(self):
+    with self.lock:
+      now = self.clock()
+      while True:
+        due = [(visible_at, job_id) for job_id, visible_at in self.visible_at.items() if visible_at <= now]
+        if not due:
+          return None
+        job_id = min(due)[1]
+        self.attempts[job_id] = self.attempts.get(job_id, 0) + 1
+        if self.attempts[job_id] <= self.max_attempts:
+          self.visible_at[job_id] = now + self.visibility_timeout
+          return job_id, self.jobs[job_id], self.attempts[job_id]
+        del self.visible_at[job_id]
+        self.failed[job_id] = self.expired_error()
+
+  def ack(self, job_id, result):
+    with self.lock:
+      self.visible_at.pop(job_id, None)
+      if job_id in self.completed:
+        return False
+      self.completed[job_id] = result
+      return True
+
+  def fail(self, job_id, attempt, error):
+    with self.lock:
+      if job_id not in self.visible_at or self.attempts.get(job_id) != attempt:
+        return False
+      if attempt >= self.max_attempts:
+        del self.visible_at[job_id]
+        self.failed[job_id] = error
+        return False
+      self.visible_at[job_id] = self.clock() + self.retry_delay
+      return True
+
+  def results(self, job_ids):
+    with self.lock:
+      return {job_id: self.completed[job_id] for job_id in job_ids if job_id in self.completed}
+
+  def errors(self, job_ids):
+    with self.lock:
+      return {job_id: self.failed[job_id] for job_id in job_ids if job_id in self.failed}
+
+  def remove(self, job_ids):
+    with self.lock:
+      for table in (self.jobs, self.visible_at, self.attempts, self.completed, self.failed):
+        for job_id in job_ids:
+          table.pop(job_id, None)
+
+  def clear(self):
+    with self.lock:
+      for table in (self.jobs, self.visible_at, self.attempts, self.completed, self.failed):
+        table.clear()
+
+
+class RedisWorkQueue(WorkQueue):
+  """
+  Work queue in Redis, shared by workers on several nodes.
+
+  The jobs waiting or leased are in a sorted set scored by the time they are visible at, a lease moving the score of
+  its job to the end of its visibility timeout, so that the expired leases are due again without a reaper. The jobs,
+  their number of attempts, results and errors are in hashes, and the leases are taken and failed by Lua scripts
+  atomically.
+  """
+
+  def __init__(self, name='dataset-translation', client=None, **options):
+    """
+    Args :
+      - name (str) : the name of the queue, the prefix of its Redis keys
+      - client (redis.Redis) : the Redis client, decoding the responses, instead of the one of the settings (optional)
+      - options : the visibility timeout, retry delay, maximum number of attempts and clock of the queue
+    """
+    super().__init__(name, **options)
+    self.client = client if client is not None else self.connect()
+    self.keys = {key: f"{name}:{key}" for key in ('queue', 'jobs', 'attempts', 'results', 'errors')}
+    self.reserve_script = self.client.register_script(RESERVE_SCRIPT)
+    self.fail_script = self.client.register_script(FAIL_SCRIPT)
+
+  @staticmethod
+  def connect():
+    """
+    Connect to the Redis server of the REDIS_MESSAGING_* settings, the environment variables taking precedence
+
+    Returns :
+      - redis.Redis : the Redis client
+    """
+    if redis is None:
+      raise ImportError('The Redis work queue requires the redis package')
+    from .settings import dist  # pylint: disable=import-outside-toplevel,unused-import
+    return redis.Redis(host=os.environ['REDIS_MESSAGING_HOST'], port=int(os.environ['REDIS_MESSAGING_PORT']),
+                       password=os.environ['REDIS_MESSAGING_PASSWORD'] or None,
+                       db=int(os.environ['REDIS_MESSAGING_BROKER_DB']),
+                       ssl=os.environ['REDIS_MESSAGING_SSL'] == '1',
+                       socket_timeout=float(os.environ['REDIS_MESSAGING_TIMEOUT']), decode_responses=True)
+
+  def push(self, job_id, job):
+    pipeline = self.client.pipeline()
+    pipeline.hset(self.keys['jobs'], job_id, job)
+    for key in ('attempts', 'results', 'errors'):
+      pipeline.hdel(self.keys[key], job_id)
+    pipeline.zadd(self.keys['queue'], {job_id: self.clock()})
+    pipeline.execute()
+
+  def reserve(self):
+    now = self.clock()
+    reserved = self.reserve_script(
+      keys=[self.keys['queue'], self.keys['jobs'], self.keys['attempts'], self.keys['errors']],
+      args=[now, now + self.visibility_timeout, self.max_attempts, self.expired_error()])
+    if not reserved:
+      return None
+    job_id, job, attempt = reserved
+    return job_id, job, int(attempt)
+
+  def ack(self, job_id, result):
+    pipeline = self.client.pipeline()
+    pipeline.hsetnx(self.keys['results'], job_id, result)
+    pipeline.zrem(self.keys['queue'], job_id)
+    return bool(pipeline.execute()[0])
+
+  def fail(self, job_id, attempt, error):
+    return self.fail_script(keys=[self.keys['queue'], self.keys['attempts'], self.keys['errors']],
+                            args=[job_id, attempt, self.max_attempts, self.clock() + self.retry_delay, error]) == 1
+
+  def results(self, job_ids):
+    return self.fetch('results', job_ids)
+
+  def errors(self, job_ids):
+    return self.fetch('errors', job_ids)
+
+  def fetch(self, key, job_ids):
+    """
+    Args :
+      - key (str) : the hash of the values, results or errors
+      - job_ids (list) : the ids of the jobs
+
+    Returns :
+      - dict : the value of each job having one
+    """
+    if not job_ids:
+      return {}
+    values = self.client.hmget(self.keys[key], list(job_ids))
+    return {job_id: value for job_id, value in zip(job_ids, values) if value is not None}
+
+  def remove(self, job_ids):
+    if not job_ids:
+      return
+    pipeline = self.client.pipeline()
+    pipeline.zrem(self.keys['queue'], *job_ids)
+    for key in ('jobs', 'attempts', 'results', 'errors'):
+      pipeline.hdel(self.keys[key], *job_ids)
+    pipeline.execute()
+
+  def clear(self):
+    self.client.delete(*self.keys.values())
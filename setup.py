@@ -39,6 +39,10 @@ setup(
   description="SAP Conversational AI dataset translation",
   cmdclass={"install_cython": InstallCythonCommand},
   install_requires=open(os.path.abspath(os.path.join(os.path.dirname(__file__), 'requirements.txt')), 'r').read().strip(),
+  extras_require={
+    'orjson': ['orjson'],
+    'distributed': ['redis']
+  },
   name="datasettranslation",
   entry_points={
       'console_scripts': [
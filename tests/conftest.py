@@ -0,0 +1,80 @@
+# coding: utf-8
+import io
+import json
+import pytest
+import requests
+from mock import Mock
+
+
+def mock_response(status=200, content=None, headers=None):
+  """
+  Response of a mocked request
+
+  Args :
+    - status (int) : the status code of the response
+    - content (dict or bytes) : the JSON body or the raw body of the response (optional)
+    - headers (dict) : the headers of the response (optional)
+
+  Returns :
+    - requests.Response : the response
+  """
+  response = requests.Response()
+  response.status_code = status
+  body = content if isinstance(content, bytes) or content is None else json.dumps(content).encode('utf-8')
+  response._content = body  # pylint: disable=protected-access
+  response.raw = io.BytesIO(body or b'')
+  response.headers.update(headers or {})
+  return response
+
+def mock_transport(response=None, **methods):
+  """
+  Mocked `Transport` answering every request with the same response, or with the response or the side effect given
+  for its method
+
+  Args :
+    - response (requests.Response) : the response of every request (optional)
+    - methods : the response or the side effect of get, post, put, delete or request
+
+  Returns :
+    - Mock : the mocked transport
+  """
+  mocked_transport = Mock()
+  for method in ('get', 'post', 'put', 'delete', 'request'):
+    answer = methods.get(method, response)
+    if callable(answer):
+      getattr(mocked_transport, method).side_effect = answer
+    else:
+      getattr(mocked_transport, method).return_value = answer
+  return mocked_transport
+
+def cai_post(url, json=None, **kwargs):  # pylint: disable=redefined-outer-name,unused-argument
+  """
+  Answer of the mocked CAI platform to a POST, the imported expressions of a bulk import or else an expression and an
+  access token
+  """
+  expression = {'id': 'id0', 'source': 'hello', 'tokens': [{'word': {'name': 'hello'}, 'space': False, 'part_of_speech': 'INTJ'}]}
+  if json is not None and 'expressions' in json:
+    return mock_response(content={'results': [expression for _ in json['expressions']]})
+  return mock_response(content={'results': expression, 'access_token': 'token'})
+
+def mock_cai_transport():
+  """
+  Mocked `Transport` answering like the CAI platform an import without entities
+
+  Returns :
+    - Mock : the mocked transport
+  """
+  return mock_transport(get=mock_response(content={'results': []}), post=cai_post,
+                        put=mock_response(content={'results': {}}))
+
+@pytest.fixture
+def response_mocked():
+  return mock_response
+
+@pytest.fixture
+def transport_mocked():
+  return mock_transport
+
+@pytest.fixture
+def cai_transport_mocked():
+  return mock_cai_transport
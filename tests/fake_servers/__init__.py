@@ -0,0 +1,12 @@
+from .fake_server import FakeServer
+from .cai_server import FakeCaiServer
+from .translation_hub_server import FakeTranslationHubServer
+from .generated_dataset import generate_dataset, dataset_entities
+
+__all__ = (
+  'FakeServer',
+  'FakeCaiServer',
+  'FakeTranslationHubServer',
+  'generate_dataset',
+  'dataset_entities',
+)
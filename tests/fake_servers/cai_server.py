@@ -0,0 +1,160 @@
+# coding: utf-8
+
+import itertools
+import re
+import uuid
+from urllib.parse import parse_qs
+from .fake_server import FakeServer
+
+TOKEN_REGEX = re.compile(r"\w+|[^\w\s]")
+DATASET_PATH_REGEX = re.compile(r"^/api/train/v2/users/[^/]+/bots/[^/]+/versions/[^/]+/dataset(?P<path>/.*)$")
+
+
+class FakeCaiServer(FakeServer):
+  """
+  Local stand-in of the CAI platform: the OAuth token endpoint and the train API endpoints used by `CaiClient`
+  (entities, expressions GET/POST/PUT/DELETE/bulk_create and synonyms bulk_create), with an in-memory dataset.
+
+  The server runs on a background thread:
+
+      with FakeCaiServer(entities) as server:
+        cai_client = CaiClient(..., api_url=server.api_url, auth_url=server.auth_url)
+  """
+
+  def __init__(self, entities=None, host='127.0.0.1', port=0, **options):
+    """
+    Args :
+        - entities (list) : the entities of the bot returned by the entities endpoint (optional)
+        - host (str) : the host to listen on
+        - port (int) : the port to listen on, a free port by default
+        - options : the latency, jitter, error rate and seed of the `FakeServer`
+    """
+    super().__init__(host, port, **options)
+    self.entities = entities if entities is not None else []
+    self.expressions = {}
+    self.synonyms = {}
+    self.ids = itertools.count()
+
+  @property
+  def api_url(self):
+    return f"{self.url}/api/train/v2"
+
+  @property
+  def auth_url(self):
+    return f"{self.url}/oauth/token"
+
+  def request_key(self, method, path):
+    return method, DATASET_PATH_REGEX.sub(r'\g<path>', path)
+
+  def handle(self, method, path, query, headers, body):  # pylint: disable=too-many-arguments
+    return self.route(method, path, self.parse_json(body), parse_qs(query))
+
+  @staticmethod
+  def tokenize(source):
+    """
+    Tokenize an expression like the platform, without part-of-speech tagging nor entity recognition
+
+    Args :
+        - source (str) : the expression
+
+    Returns :
+        - list : the import-format tokens
+    """
+    tokens = []
+    for match in TOKEN_REGEX.finditer(source):
+      tokens.append({
+        'word': {'name': match.group()},
+        'space': source[match.end():match.end() + 1] == ' ',
+        'part_of_speech': 'NOUN' if match.group()[0].isalnum() or match.group()[0] == '_' else 'PUNCT'
+      })
+    return tokens
+
+  def create_expression(self, intent, source, language):
+    """
+    Store a new expression
+
+    Args :
+        - intent (str) : the intent slug
+        - source (str) : the expression
+        - language (dict) : the language of the expression
+
+    Returns :
+        - dict : the created expression
+    """
+    expression = {
+      'id': str(uuid.UUID(int=next(self.ids))),
+      'source': source,
+      'language': language,
+      'tokens': self.tokenize(source)
+    }
+    with self.lock:
+      self.expressions.setdefault(intent, []).append(expression)
+    return expression
+
+  def list_expressions(self, intent, query):
+    """
+    Page of the expressions of an intent, in a language if the query has one
+
+    Args :
+        - intent (str) : the intent slug
+        - query (dict) : the language, page and per_page parameters of the query string
+
+    Returns :
+        - dict : the expressions of the page and the total number of expressions
+    """
+    page = int(query.get('page', ['1'])[0])
+    per_page = int(query.get('per_page', ['100'])[0])
+    with self.lock:
+      expressions = [expression for expression in self.expressions.get(intent, [])
+                     if 'language' not in query or expression['language']['isocode'] == query['language'][0]]
+    return {'results': expressions[(page - 1) * per_page:page * per_page], 'total': len(expressions)}
+
+  def route(self, method, path, body, query=None):
+    """
+    Handle a request
+
+    Args :
+        - method (str) : the HTTP method
+        - path (str) : the path of the request
+        - body (dict) : the JSON body of the request
+        - query (dict) : the values of the parameters of the query string (optional)
+
+    Returns :
+        - int : the status code of the response
+        - dict : the JSON body of the response
+    """
+    if path == '/oauth/token':
+      return 200, {'access_token': 'fake-access-token', 'token_type': 'bearer', 'expires_in': 43199}
+    match = DATASET_PATH_REGEX.match(path)
+    parts = match.group('path').strip('/').split('/') if match else []
+    if method == 'GET' and parts == ['entities']:
+      return 200, {'results': self.entities}
+    if method == 'POST' and len(parts) == 4 and parts[0] == 'intents' and parts[2:] == ['expressions', 'bulk_create']:
+      return 201, {'results': [self.create_expression(parts[1], expression['source'], expression['language'])
+                               for expression in body['expressions']]}
+    if method == 'GET' and len(parts) == 3 and parts[0] == 'intents' and parts[2] == 'expressions':
+      return 200, self.list_expressions(parts[1], query or {})
+    if method == 'POST' and len(parts) == 3 and parts[0] == 'intents' and parts[2] == 'expressions':
+      return 201, {'results': self.create_expression(parts[1], body['source'], body['language'])}
+    if method == 'PUT' and len(parts) == 4 and parts[0] == 'intents' and parts[2] == 'expressions':
+      with self.lock:
+        expression = next((expression for expression in self.expressions.get(parts[1], [])
+                           if expression['id'] == parts[3]), None)
+        if expression is None:
+          return 404, {'message': 'Expression not found'}
+        for token in body['tokens']:
+          expression['tokens'][token['ind']] = token
+      return 200, {'results': expression}
+    if method == 'DELETE' and len(parts) == 4 and parts[0] == 'intents' and parts[2] == 'expressions':
+      with self.lock:
+        expressions = self.expressions.get(parts[1], [])
+        kept = [expression for expression in expressions if expression['id'] != parts[3]]
+        if len(kept) == len(expressions):
+          return 404, {'message': 'Expression not found'}
+        self.expressions[parts[1]] = kept
+      return 200, {'results': None}
+    if method == 'POST' and len(parts) == 4 and parts[0] == 'entities' and parts[2:] == ['synonyms', 'bulk_create']:
+      with self.lock:
+        self.synonyms.setdefault(parts[1], []).extend(body['synonyms'])
+      return 201, {'results': body['synonyms']}
+    return 404, {'message': f"No route for {method} {path}"}
@@ -0,0 +1,177 @@
+# coding: utf-8
+
+import json
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeServer(ABC):
+  """
+  Base of the local stand-in servers: an HTTP server on a background thread, counting the requests it receives and
+  answering them after a configurable latency, or with a 503 error at a configurable rate.
+
+  The subclasses implement `handle`, returning the status code and the body of the response of a request.
+  """
+
+  def __init__(self, host='127.0.0.1', port=0, latency=0, jitter=0, error_rate=0, seed=None):  # pylint: disable=too-many-arguments
+    """
+    Args :
+        - host (str) : the host to listen on
+        - port (int) : the port to listen on, a free port by default
+        - latency (float) : the mean delay in seconds before a response is sent
+        - jitter (float) : the maximum deviation in seconds of the delay from the latency
+        - error_rate (float) : the fraction of the requests answered with a 503 error
+        - seed (int) : the seed of the random delays and errors, for reproducible runs (optional)
+    """
+    self.latency = latency
+    self.jitter = jitter
+    self.error_rate = error_rate
+    self.random = random.Random(seed)
+    self.requests = Counter()
+    self.errors = 0
+    self.bytes_received = 0
+    self.lock = threading.Lock()
+    self.server = ThreadingHTTPServer((host, port), self.handler())
+    self.server.daemon_threads = True
+    self.thread = None
+
+  @property
+  def url(self):
+    host, port = self.server.server_address[:2]
+    return f"http://{host}:{port}"
+
+  def start(self):
+    """Start serving on a background thread"""
+    self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+    self.thread.start()
+    return self
+
+  def stop(self):
+    """Stop serving and close the socket"""
+    self.server.shutdown()
+    self.server.server_close()
+
+  def __enter__(self):
+    return self.start()
+
+  def __exit__(self, *args):
+    self.stop()
+
+  def request_key(self, method, path):
+    """
+    Key of a request in the counter of the requests
+
+    Args :
+        - method (str) : the HTTP method
+        - path (str) : the path of the request
+
+    Returns :
+        - tuple : the key of the request
+    """
+    return method, path
+
+  @abstractmethod
+  def handle(self, method, path, query, headers, body):  # pylint: disable=too-many-arguments
+    """
+    Handle a request
+
+    Args :
+        - method (str) : the HTTP method
+        - path (str) : the path of the request
+        - query (str) : the query string of the request
+        - headers (email.message.Message) : the headers of the request
+        - body (bytes) : the body of the request
+
+    Returns :
+        - int : the status code of the response
+        - dict or str : the JSON body or the text of the response
+    """
+
+  def draw(self):
+    """
+    Draw the delay of a response and whether it is an error
+
+    Returns :
+        - float : the delay in seconds
+        - bool : whether the request is answered with an error
+    """
+    with self.lock:
+      delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+      failed = self.error_rate > 0 and self.random.random() < self.error_rate
+      if failed:
+        self.errors += 1
+    return delay, failed
+
+  @staticmethod
+  def parse_json(body):
+    """
+    Args :
+        - body (bytes) : the body of a request
+
+    Returns :
+        - dict : the JSON body, empty if the body is not JSON
+    """
+    try:
+      return json.loads(body) if body else {}
+    except ValueError:
+      return {}
+
+  def handler(self):
+    """
+    Request handler class bound to this server
+
+    Returns :
+        - type : the request handler class
+    """
+    fake_server = self
+
+    class Handler(BaseHTTPRequestHandler):
+      protocol_version = 'HTTP/1.1'
+      disable_nagle_algorithm = True
+
+      def handle_request(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        path, _, query = self.path.partition('?')
+        with fake_server.lock:
+          fake_server.requests[fake_server.request_key(method, path)] += 1
+          fake_server.bytes_received += length
+        delay, failed = fake_server.draw()
+        if delay:
+          time.sleep(delay)
+        if failed:
+          status, response = 503, {'message': 'Service temporarily unavailable'}
+        else:
+          status, response = fake_server.handle(method, path, query, self.headers, body)
+        if isinstance(response, str):
+          content, content_type = response.encode('utf-8'), 'text/plain; charset=utf-8'
+        else:
+          content, content_type = json.dumps(response).encode('utf-8'), 'application/json'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        if failed:
+          self.send_header('Retry-After', '0')
+        self.end_headers()
+        self.wfile.write(content)
+
+      def do_GET(self):  # pylint: disable=invalid-name
+        self.handle_request('GET')
+
+      def do_POST(self):  # pylint: disable=invalid-name
+        self.handle_request('POST')
+
+      def do_PUT(self):  # pylint: disable=invalid-name
+        self.handle_request('PUT')
+
+      def do_DELETE(self):  # pylint: disable=invalid-name
+        self.handle_request('DELETE')
+
+      def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+    return Handler
@@ -0,0 +1,57 @@
+# coding: utf-8
+
+import random
+
+WORDS = ('please', 'book', 'show', 'me', 'the', 'a', 'for', 'tomorrow', 'cheapest', 'next', 'with', 'my', 'order',
+         'flight', 'room', 'table', 'change', 'cancel', 'price', 'of', 'to', 'from', 'today', 'again')
+
+
+def generate_dataset(intents, expressions, entities, synonyms=5, seed=0, language='en'):  # pylint: disable=too-many-arguments
+  """
+  Generate a CAI-format json dataset of random expressions, where half of the expressions contain a synonym of one of
+  the restricted entities
+
+  Args :
+      - intents (int) : the number of intents
+      - expressions (int) : the number of expressions of each intent
+      - entities (int) : the number of restricted entities, each with its gazette
+      - synonyms (int) : the number of synonyms of each gazette
+      - seed (int) : the seed of the random expressions
+      - language (str) : the isocode of the language of the dataset
+
+  Returns :
+      - dict : the CAI-format json dataset
+  """
+  generator = random.Random(seed)
+  gazettes = [{'name': f"ENTITY-{i}", 'slug': f"entity-{i}", 'type': 'restricted',
+               'synonyms': [f"synonym{i}x{j}" for j in range(synonyms)]} for i in range(entities)]
+  dataset_intents = []
+  for i in range(intents):
+    intent_expressions = []
+    for _ in range(expressions):
+      tokens = [{'word': word, 'space': True, 'pos': 'NOUN', 'entity': None}
+                for word in generator.sample(WORDS, generator.randint(3, 8))]
+      if gazettes and synonyms and generator.random() < 0.5:
+        gazette = generator.choice(gazettes)
+        tokens.insert(generator.randrange(len(tokens) + 1), {
+          'word': generator.choice(gazette['synonyms']), 'space': True, 'pos': 'NOUN',
+          'entity': {'name': gazette['name'], 'type': 'restricted', 'is_custom': True}
+        })
+      tokens[-1]['space'] = False
+      intent_expressions.append({'source': ' '.join(token['word'] for token in tokens), 'tokens': tokens})
+    dataset_intents.append({'name': f"intent-{i}", 'expressions': intent_expressions})
+  return {'language': language, 'gazettes': gazettes, 'intents': dataset_intents}
+
+
+def dataset_entities(dataset):
+  """
+  Entities of the bot of a generated dataset, as returned by the entities endpoint of the platform
+
+  Args :
+      - dataset (dict) : the CAI-format json dataset
+
+  Returns :
+      - list : the entities of the bot
+  """
+  return [{'name': gazette['name'], 'slug': gazette['slug'], 'type': gazette['type'], 'custom': True}
+          for gazette in dataset['gazettes']]
@@ -0,0 +1,58 @@
+# coding: utf-8
+
+from urllib.parse import parse_qs
+from requests_toolbelt.multipart.decoder import MultipartDecoder
+from .fake_server import FakeServer
+
+
+class FakeTranslationHubServer(FakeServer):
+  """
+  Local stand-in of SAP Translation Hub: the OAuth token endpoint and the document translation endpoint used by
+  `SAPTranslationHubTranslator`, translating the uploaded text file line by line, by default into the same text.
+
+  The server runs on a background thread:
+
+      with FakeTranslationHubServer() as server:
+        translator = SAPTranslationHubTranslator(..., api_url=server.api_url, token_url=server.token_url)
+  """
+
+  def __init__(self, translate=None, host='127.0.0.1', port=0, **options):
+    """
+    Args :
+        - translate (callable) : the translation of a line, given the line and the source and target language codes
+        (optional)
+        - host (str) : the host to listen on
+        - port (int) : the port to listen on, a free port by default
+        - options : the latency, jitter, error rate and seed of the `FakeServer`
+    """
+    super().__init__(host, port, **options)
+    self.translate = translate if translate is not None else self.echo
+    self.characters = 0
+
+  @staticmethod
+  def echo(line, source_language, target_language):  # pylint: disable=unused-argument
+    return line
+
+  @property
+  def api_url(self):
+    return f"{self.url}/api/v1/translation"
+
+  @property
+  def token_url(self):
+    return f"{self.url}/oauth/token"
+
+  def handle(self, method, path, query, headers, body):  # pylint: disable=too-many-arguments
+    if method == 'POST' and path == '/oauth/token':
+      return 200, {'access_token': 'fake-access-token', 'token_type': 'bearer', 'expires_in': 43199}
+    if method == 'POST' and path == '/api/v1/translation':
+      parameters = parse_qs(query)
+      try:
+        parts = MultipartDecoder(body, headers.get('Content-Type', '')).parts
+      except Exception:  # pylint: disable=broad-except
+        return 400, {'message': 'Expected a multipart body with a file'}
+      text = parts[0].text if parts else ''
+      with self.lock:
+        self.characters += len(text)
+      source, target = parameters.get('sourceLanguage', [''])[0], parameters.get('targetLanguage', [''])[0]
+      return 200, '\n'.join(self.translate(line, source, target) for line in text.split('\n'))
+    return 404, {'message': f"No route for {method} {path}"}
@@ -0,0 +1,158 @@
+# coding: utf-8
+import copy
+import json
+import threading
+import time
+import requests
+
+from mock import patch
+import pytest
+from dataset_translation.async_dataset_translation import AsyncDatasetTranslation
+from dataset_translation.cai_client import CaiClient
+from dataset_translation.dataset_translation import DatasetTranslation
+from dataset_translation.dataset_writer import DatasetWriter
+from tests.fake_servers import FakeCaiServer, dataset_entities, generate_dataset
+from dataset_translation.journal import Journal
+from dataset_translation.transport import Transport
+
+
+class ConcurrencyCounter:
+  """Side effect of a mocked request keeping the highest number of concurrent calls"""
+
+  def __init__(self, response):
+    self.response = response
+    self.lock = threading.Lock()
+    self.in_flight = 0
+    self.max_in_flight = 0
+
+  def __call__(self, *args, **kwargs):
+    with self.lock:
+      self.in_flight += 1
+      self.max_in_flight = max(self.max_in_flight, self.in_flight)
+    time.sleep(0.01)
+    with self.lock:
+      self.in_flight -= 1
+    return self.response(*args, **kwargs)
+
+def response_post_failing(response_post):
+  def response(url, json=None, **kwargs):
+    if '/intents/intent-2/' in url:
+      raise requests.ConnectionError('Connection reset')
+    return response_post(url, json=json, **kwargs)
+  return response
+
+def dataset_mocked():
+  return {
+    'language': 'en',
+    'gazettes': [{'name': f"GAZETTE-{i}", 'slug': f"gazette-{i}", 'type': 'restricted', 'synonyms': ['synonym0', 'synonym1']} for i in range(5)],
+    'intents': [{'name': f"intent-{i}", 'expressions': [{'source': 'hello', 'tokens': [{'word': 'hello', 'space': False, 'pos': 'INTJ', 'entity': None}]} for _ in range(8)]} for i in range(3)]
+  }
+
+@pytest.fixture
+def async_dataset_translation_mocked(cai_transport_mocked):
+  transport = cai_transport_mocked()
+  transport.post.side_effect = ConcurrencyCounter(transport.post.side_effect)
+  return AsyncDatasetTranslation('none', 'en', 'fr', 'user_slug', 'bot_slug', 'version_slug', 'developer_token', 'bot_client_id', 'bot_client_secret', transport=transport, max_in_flight=4)
+
+
+class TestAsyncDatasetTranslation:
+
+  @staticmethod
+  def test_dataset_translation(async_dataset_translation_mocked, cai_transport_mocked):
+    sequential_dataset_translation = DatasetTranslation('none', 'en', 'fr', 'user_slug', 'bot_slug', 'version_slug', 'developer_token', 'bot_client_id', 'bot_client_secret', transport=cai_transport_mocked())
+    expected_dataset = sequential_dataset_translation.dataset_translation(dataset_mocked())
+    translated_dataset = async_dataset_translation_mocked.dataset_translation(dataset_mocked())
+    assert translated_dataset == expected_dataset
+    assert translated_dataset['language'] == 'fr'
+    assert translated_dataset['intents'][0]['expressions'][0]['compiled'] == 'hello '
+
+  @staticmethod
+  def test_max_in_flight(async_dataset_translation_mocked):
+    dataset = dataset_mocked()
+    async_dataset_translation_mocked.dataset_translation(copy.deepcopy(dataset))
+    counter = async_dataset_translation_mocked.transport.post.side_effect
+    assert 1 < counter.max_in_flight <= 4
+    assert async_dataset_translation_mocked.transport.post.call_count == 1 + 5 + 3
+
+  @staticmethod
+  def test_max_in_flight_listing(cai_transport_mocked, response_mocked):
+    transport = cai_transport_mocked()
+    transport.get.side_effect = ConcurrencyCounter(lambda *args, **kwargs: response_mocked(content={'results': [], 'total': 1000}))
+    translation = AsyncDatasetTranslation('none', 'en', 'fr', 'user_slug', 'bot_slug', 'version_slug', 'developer_token', 'bot_client_id', 'bot_client_secret', transport=transport, max_in_flight=2, skip_existing=True)
+    translation.dataset_translation(dataset_mocked())
+    assert transport.get.side_effect.max_in_flight == 2
+    assert transport.get.call_count == 1 + 3 * 10
+
+  @staticmethod
+  def test_dataset_translation_without_bulk(async_dataset_translation_mocked):
+    async_dataset_translation_mocked.bulk_size = 0
+    translated_dataset = async_dataset_translation_mocked.dataset_translation(dataset_mocked())
+    assert translated_dataset['intents'][2]['expressions'][7]['compiled'] == 'hello '
+    assert async_dataset_translation_mocked.transport.post.call_count == 1 + 5 + 24
+
+  @staticmethod
+  def test_annotation_failure(async_dataset_translation_mocked):
+    annotated = []
+
+    def annotate_expression(intent_name, expression, response_expression, dataset_gazettes, expression_index):  # pylint: disable=unused-argument
+      if expression_index == 0:
+        raise requests.ConnectionError('Connection reset')
+      time.sleep(0.05)
+      annotated.append((intent_name, expression_index))
+
+    with patch.object(async_dataset_translation_mocked, 'annotate_expression', side_effect=annotate_expression), \
+         pytest.raises(requests.ConnectionError):
+      async_dataset_translation_mocked.dataset_translation(dataset_mocked())
+    assert len(annotated) == 3 * 7
+
+  @staticmethod
+  def test_dataset_translation_writer(async_dataset_translation_mocked, tmp_path):
+    path = tmp_path / 'dataset-fr.json'
+    async_dataset_translation_mocked.writer = DatasetWriter(str(path), 'compact')
+    translated_dataset = async_dataset_translation_mocked.dataset_translation(dataset_mocked())
+    assert json.loads(path.read_text(encoding='utf-8')) == translated_dataset
+
+  @staticmethod
+  @pytest.mark.parametrize('engine', [DatasetTranslation, AsyncDatasetTranslation])
+  @pytest.mark.parametrize('bulk_size', [0, 100])
+  def test_dataset_translation_resume(tmp_path, engine, bulk_size, cai_transport_mocked):
+    path = str(tmp_path / 'journal.ndjson')
+    arguments = ('none', 'en', 'fr', 'user_slug', 'bot_slug', 'version_slug', 'developer_token', 'bot_client_id', 'bot_client_secret')
+    expected_dataset = engine(*arguments, transport=cai_transport_mocked(), bulk_size=bulk_size).dataset_translation(dataset_mocked())
+
+    transport = cai_transport_mocked()
+    transport.post.side_effect = response_post_failing(transport.post.side_effect)
+    with pytest.raises(requests.ConnectionError):
+      engine(*arguments, transport=transport, bulk_size=bulk_size, journal=Journal(path)).dataset_translation(dataset_mocked())
+
+    transport = cai_transport_mocked()
+    translated_dataset = engine(*arguments, transport=transport, bulk_size=bulk_size, journal=Journal(path, resume=True)).dataset_translation(dataset_mocked())
+    assert translated_dataset == expected_dataset
+    urls = [call[0][0] for call in transport.post.call_args_list]
+    assert not [url for url in urls if 'synonyms' in url or '/intents/intent-0/' in url or '/intents/intent-1/' in url]
+    assert len([url for url in urls if '/intents/intent-2/' in url]) == (8 if bulk_size == 0 else 1)
+
+  @staticmethod
+  @pytest.mark.parametrize('engine', [DatasetTranslation, AsyncDatasetTranslation])
+  def test_dataset_translation_resume_chunk(tmp_path, engine):
+    path = str(tmp_path / 'journal.ndjson')
+    dataset = generate_dataset(1, 4, 1, seed=2)
+    second_chunk = [expression['source'] for expression in dataset['intents'][0]['expressions'][2:]]
+    with FakeCaiServer(dataset_entities(dataset)) as cai_server:
+      cai_client = CaiClient('user', 'bot', 'v1', 'developer_token', 'bot_client_id', 'bot_client_secret',
+                             transport=Transport(), api_url=cai_server.api_url, auth_url=cai_server.auth_url)
+      send = cai_client.send
+
+      def send_failing(method, url, **kwargs):
+        if [expression['source'] for expression in kwargs.get('json', {}).get('expressions', [])] == second_chunk:
+          raise requests.ConnectionError('Connection reset')
+        return send(method, url, **kwargs)
+
+      arguments = ('none', 'en', 'fr', 'user', 'bot', 'v1', 'developer_token', 'bot_client_id', 'bot_client_secret')
+      with patch.object(cai_client, 'send', side_effect=send_failing), pytest.raises(requests.ConnectionError):
+        engine(*arguments, cai_client=cai_client, bulk_size=2, journal=Journal(path)).dataset_translation(copy.deepcopy(dataset))
+      assert len(cai_server.expressions['intent-0']) == 2
+      translated_dataset = engine(*arguments, cai_client=cai_client, bulk_size=2,
+                                  journal=Journal(path, resume=True)).dataset_translation(copy.deepcopy(dataset))
+    assert len(cai_server.expressions['intent-0']) == 4
+    assert all(expression['compiled'] for expression in translated_dataset['intents'][0]['expressions'])
@@ -1,30 +1,46 @@
 # coding: utf-8
-import requests
 import pytest
-from mock import patch, Mock
+from mock import Mock
 from dataset_translation.cai_client import CaiClient
+from tests.fake_servers import FakeCaiServer
+from dataset_translation.transport import Transport
 
 
-def requests_mocked(status):
-  mocked_requests = Mock()
-  response = requests.Response()
-  response.status_code = status
-  response._content = b'{"results":[{"source":"expression0", "id":0}], "access_token":"access_token0"}'
-  mocked_requests.get.return_value = response
-  mocked_requests.put.return_value = response
-  mocked_requests.post.return_value = response
-  return mocked_requests
+CONTENT = b'{"results":[{"source":"expression0", "id":0}], "access_token":"access_token0"}'
 
 @pytest.fixture
-@patch('dataset_translation.cai_client.requests', requests_mocked(200))
-def cai_client_mocked():
-  cai_client_object = CaiClient('user_slug', 'bot_slug', 'version_slug', 'developer_token', 'bot_client_id', 'bot_client_secret')
+def cai_client_mocked(transport_mocked, response_mocked):
+  cai_client_object = CaiClient('user_slug', 'bot_slug', 'version_slug', 'developer_token', 'bot_client_id', 'bot_client_secret', transport=transport_mocked(response_mocked(200, CONTENT)))
   return cai_client_object
 
+@pytest.fixture
+def fake_cai_server():
+  with FakeCaiServer([{'name': 'PRONOUN', 'slug': 'pronoun'}]) as server:
+    yield server
+
+@pytest.fixture
+def cai_client_fake_server(fake_cai_server):
+  return CaiClient('user_slug', 'bot_slug', 'version_slug', 'developer_token', 'bot_client_id', 'bot_client_secret',
+                   transport=Transport(), api_url=fake_cai_server.api_url, auth_url=fake_cai_server.auth_url)
+
 class TestCaiClient:
 
-  @patch('dataset_translation.cai_client.requests', new_callable=lambda: requests_mocked(200))
-  def test_update_expression(self, mocked_request, cai_client_mocked):
+  def test_access_token_refused(self, cai_client_mocked, response_mocked):
+    refused = response_mocked(401, {'message': 'Unauthorized'})
+    accepted = cai_client_mocked.transport.post.return_value
+    cai_client_mocked.transport.post.reset_mock()
+    cai_client_mocked.transport.post.side_effect = [refused, accepted, accepted]
+    cai_client_mocked.post_expression('intent-name', 'expression0', 'en')
+    assert cai_client_mocked.transport.post.call_count == 3
+    assert cai_client_mocked.transport.post.call_args_list[1][0][0] == CaiClient.AUTH_URL
+
+  def test_access_token_cached(self, cai_client_mocked):
+    cai_client_mocked.transport.post.reset_mock()
+    cai_client_mocked.post_expression('intent-name', 'expression0', 'en')
+    cai_client_mocked.post_synonyms('entity_slug', ['synonym0'], 'en')
+    assert cai_client_mocked.transport.post.call_count == 2
+
+  def test_update_expression(self, cai_client_mocked):
     token = {
               'ind': 0,
               'space': True,
@@ -45,11 +61,11 @@ class TestCaiClient:
                 'X-Token': 'Token developer_token'
               }
 
-    mocked_request.put.assert_called_with('https://api.cai.tools.sap/train/v2/users/user_slug/bots/bot_slug/versions/version_slug/dataset/intents/intent-name/expressions/id0',
-                                          json={'source': 'expression0', 'tokens': [token_formatted]}, headers=headers)
+    cai_client_mocked.transport.put.assert_called_with('https://cai.tools.sap/api/train/v2/users/user_slug/bots/bot_slug/versions/version_slug/dataset/intents/intent-name/expressions/id0',
+                                                      json={'source': 'expression0', 'tokens': [token_formatted]}, headers=headers)
 
-  @patch('dataset_translation.cai_client.requests', requests_mocked(400))
-  def test_update_expression_error(self, cai_client_mocked):
+  def test_update_expression_error(self, cai_client_mocked, transport_mocked, response_mocked):
+    cai_client_mocked.transport = transport_mocked(response_mocked(400, CONTENT))
     token = {
               'ind': 0,
               'space': True,
@@ -60,18 +76,16 @@ class TestCaiClient:
     with pytest.raises(ValueError):
       assert cai_client_mocked.update_expression(0, token, 'intent-name', 'expression0', 'id0')
 
-  @patch('dataset_translation.cai_client.requests', requests_mocked(200))
   def test_post_expression(self, cai_client_mocked):
     results = cai_client_mocked.post_expression('intent-name', 'expression0', 'en')
     assert results == [{'source': 'expression0', 'id': 0}]
 
-  @patch('dataset_translation.cai_client.requests', requests_mocked(400))
-  def test_post_expression_error(self, cai_client_mocked):
+  def test_post_expression_error(self, cai_client_mocked, transport_mocked, response_mocked):
+    cai_client_mocked.transport = transport_mocked(response_mocked(400, CONTENT))
     with pytest.raises(ValueError):
       assert cai_client_mocked.post_expression('intent-name', 'expression0', 'en')
 
-  @patch('dataset_translation.cai_client.requests', new_callable=lambda: requests_mocked(200))
-  def test_post_synonyms(self, mocked_request, cai_client_mocked):
+  def test_post_synonyms(self, cai_client_mocked):
     cai_client_mocked.post_synonyms('entity_slug', ['synonym0', 'synonym1'], 'en')
     headers = {
                 'Authorization': 'Bearer access_token0',
@@ -80,15 +94,14 @@ class TestCaiClient:
               }
     list_synonyms = [{'value': 'synonym0', 'language': {'isocode': 'en'}},
                      {'value': 'synonym1', 'language': {'isocode': 'en'}}]
-    mocked_request.post.assert_called_with('https://api.cai.tools.sap/train/v2/users/user_slug/bots/bot_slug/versions/version_slug/dataset/entities/entity_slug/synonyms/bulk_create',
-                                           json={'synonyms': list_synonyms}, headers=headers)
+    cai_client_mocked.transport.post.assert_called_with('https://cai.tools.sap/api/train/v2/users/user_slug/bots/bot_slug/versions/version_slug/dataset/entities/entity_slug/synonyms/bulk_create',
+                                                       json={'synonyms': list_synonyms}, headers=headers)
 
-  @patch('dataset_translation.cai_client.requests', requests_mocked(400))
-  def test_post_synonyms_error(self, cai_client_mocked):
+  def test_post_synonyms_error(self, cai_client_mocked, transport_mocked, response_mocked):
+    cai_client_mocked.transport = transport_mocked(response_mocked(400, CONTENT))
     with pytest.raises(ValueError):
       assert cai_client_mocked.post_synonyms('entity_slug', ['synonym0', 'synonym1'], 'en')
 
-  @patch('dataset_translation.cai_client.requests', requests_mocked(200))
   def test_token_cai_convert(self, cai_client_mocked):
     token_none = {
                     'ind': 0,
@@ -107,3 +120,77 @@ class TestCaiClient:
 
     token_none_convert = cai_client_mocked.convert_token_cai(0, token_none)
     assert token_none_convert == {'ind': 0, 'space': True, 'part_of_speech': 'VERB', 'word': {'name': 'expression0'}}
+
+  def test_index_entities(self, cai_client_mocked):
+    entities = [{'name': 'PRONOUN', 'id': 0}, {'name': 'MASS', 'id': 1}, {'name': 'PRONOUN', 'id': 2}]
+    cai_client_mocked.entities_by_name = cai_client_mocked.index_entities(entities)
+    assert cai_client_mocked.entities_by_name == {'PRONOUN': {'name': 'PRONOUN', 'id': 0}, 'MASS': {'name': 'MASS', 'id': 1}}
+    token_entity = {'space': True, 'pos': 'NOUN', 'word': '7', 'entity': {'name': 'MASS', 'type': 'gold', 'is_custom': False}}
+    assert cai_client_mocked.convert_token_cai(3, token_entity)['entity'] == {'name': 'MASS', 'id': 1}
+
+  def test_update_expression_tokens(self, cai_client_mocked):
+    token_verb = {'space': True, 'pos': 'VERB', 'word': 'want', 'entity': None}
+    token_noun = {'space': False, 'pos': 'NOUN', 'word': 'rock', 'entity': None}
+    cai_client_mocked.update_expression_tokens([(1, token_verb), (4, token_noun)], 'intent-name', 'I want some rock', 'id0')
+    assert cai_client_mocked.transport.put.call_count == 1
+    assert cai_client_mocked.transport.put.call_args[1]['json'] == {
+      'source': 'I want some rock',
+      'tokens': [{'ind': 1, 'space': True, 'part_of_speech': 'VERB', 'word': {'name': 'want'}},
+                 {'ind': 4, 'space': False, 'part_of_speech': 'NOUN', 'word': {'name': 'rock'}}]
+    }
+
+  def test_post_expressions(self, fake_cai_server, cai_client_fake_server):
+    expressions = ['hello', 'I want some rock', 'hello', 'yes !', 'my order']
+    results = cai_client_fake_server.post_expressions('intent-name', expressions, 'fr', chunk_size=2)
+    assert [result['source'] for result in results] == expressions
+    assert len({result['id'] for result in results}) == 5
+    assert [token['word']['name'] for token in results[3]['tokens']] == ['yes', '!']
+    assert fake_cai_server.requests[('POST', '/intents/intent-name/expressions/bulk_create')] == 3
+    assert [expression['source'] for expression in fake_cai_server.expressions['intent-name']] == expressions
+
+  def test_get_expressions(self, fake_cai_server, cai_client_fake_server):
+    sources = [f"expression{i}" for i in range(7)]
+    cai_client_fake_server.post_expressions('intent-name', sources, 'fr')
+    cai_client_fake_server.post_expressions('intent-name', ['hello'], 'es')
+    expressions = cai_client_fake_server.get_expressions('intent-name', 'fr', page_size=2)
+    assert [expression['source'] for expression in expressions] == sources
+    assert fake_cai_server.requests[('GET', '/intents/intent-name/expressions')] == 4
+    assert cai_client_fake_server.get_expressions('intent-other', 'fr') == []
+
+  @staticmethod
+  def test_get_expressions_without_total(cai_client_mocked):
+    pages = {1: ['a', 'b'], 2: ['c', 'd'], 3: []}
+    cai_client_mocked.get_expressions_page = Mock(side_effect=lambda intent, language, page, size: {'results': pages[page]})
+    assert cai_client_mocked.get_expressions('intent-name', 'fr', page_size=2) == ['a', 'b', 'c', 'd']
+    assert cai_client_mocked.get_expressions_page.call_count == 3
+
+  def test_delete_expression(self, fake_cai_server, cai_client_fake_server):
+    results = cai_client_fake_server.post_expressions('intent-name', ['hello', 'bye'], 'fr')
+    cai_client_fake_server.delete_expression('intent-name', results[0]['id'])
+    cai_client_fake_server.delete_expression('intent-name', results[0]['id'])
+    assert [expression['source'] for expression in fake_cai_server.expressions['intent-name']] == ['bye']
+    assert fake_cai_server.requests[('DELETE', f"/intents/intent-name/expressions/{results[0]['id']}")] == 2
+
+  def test_post_expressions_error(self, cai_client_mocked, transport_mocked, response_mocked):
+    cai_client_mocked.transport = transport_mocked(response_mocked(400, CONTENT))
+    with pytest.raises(ValueError):
+      assert cai_client_mocked.post_expressions('intent-name', ['expression0'], 'en')
+
+  def test_align_results(self, cai_client_mocked, caplog):
+    results = [{'source': 'hello', 'id': 0}, {'source': 'yes', 'id': 1}, {'source': 'yes', 'id': 2}]
+    assert cai_client_mocked.align_results(['hello', 'yes', 'yes'], results) == results
+    assert cai_client_mocked.align_results(['a', 'b'], [{'id': 0}, {'id': 1}]) == [{'id': 0}, {'id': 1}]
+    assert not caplog.records
+    normalized = [{'source': 'hello world', 'id': 0}, {'source': 'café', 'id': 1}]
+    assert cai_client_mocked.align_results(['hello  world', 'cafe\u0301'], normalized) == normalized
+    assert '2 of 2 results' in caplog.text
+    with pytest.raises(ValueError):
+      assert cai_client_mocked.align_results(['hello'], results)
+
+  def test_align_results_reordered(self, cai_client_mocked):
+    results = [{'source': 'yes', 'id': 1}, {'source': 'hello  world', 'id': 0}, {'source': 'yes', 'id': 2}]
+    assert [result['id'] for result in cai_client_mocked.align_results(['hello world', 'yes', 'yes'], results)] == [0, 1, 2]
+    with pytest.raises(ValueError, match='matches none'):
+      cai_client_mocked.align_results(['hello', 'no'], [{'source': 'hello', 'id': 0}, {'source': 'yes', 'id': 1}])
+    with pytest.raises(ValueError, match='matches none'):
+      cai_client_mocked.align_results(['yes', 'no'], [{'source': 'yes', 'id': 0}, {'source': 'yes', 'id': 1}])
@@ -0,0 +1,64 @@
+# coding: utf-8
+import random
+import re
+import string
+from dataset_translation.compiled_expression import CompiledExpressionBuilder
+
+
+def add_entity_name_reference(entity_name, expression_compiled):
+  regex = re.compile(f"[{re.escape(string.punctuation)}]")
+  new_token_name = regex.sub('', entity_name)
+  return re.sub(r"\b({})( \1\b)+".format(new_token_name), r"\1", expression_compiled + new_token_name + " ")
+
+def compile_reference(tokens):
+  expression_compiled = ''
+  for kind, value in tokens:
+    if kind == 'entity':
+      expression_compiled = add_entity_name_reference(value, expression_compiled)
+    else:
+      expression_compiled += value + " "
+  return expression_compiled
+
+def compile_builder(tokens):
+  builder = CompiledExpressionBuilder()
+  for kind, value in tokens:
+    if kind == 'entity':
+      builder.add_entity_name(value)
+    else:
+      builder.add_word(value)
+  return builder.build()
+
+
+class TestCompiledExpressionBuilder:
+
+  @staticmethod
+  def test_build():
+    tokens = [('entity', 'PRONOUN'), ('word', 'want'), ('entity', 'MASS'), ('entity', 'MASS'), ('word', 'of'),
+              ('entity', 'BOX_OPTION'), ('entity', 'BOX-OPTION')]
+    assert compile_builder(tokens) == 'PRONOUN want MASS of BOXOPTION '
+    assert compile_builder(tokens) == compile_reference(tokens)
+
+  @staticmethod
+  def test_build_entity_name_in_words():
+    tokens = [('word', 'ROCK'), ('word', 'ROCK'), ('word', 'and'), ('entity', 'ROCK'), ('word', 'x.MASS'),
+              ('entity', 'MASS'), ('entity', 'MY ENTITY'), ('entity', 'MY ENTITY'), ('entity', 'ENTITY')]
+    assert compile_builder(tokens) == compile_reference(tokens)
+
+  @staticmethod
+  def test_build_entity_names_with_spaces():
+    tokens = [('entity', 'ROCK'), ('entity', 'ROCK MY'), ('entity', 'ROCK')]
+    assert compile_builder(tokens) == compile_reference(tokens) == 'ROCK MY ROCK '
+    tokens = [('entity', 'MY'), ('entity', 'ROCK MY'), ('entity', 'MY'), ('word', 'want'), ('entity', 'MY ROCK'),
+              ('entity', 'ROCK')]
+    assert compile_builder(tokens) == compile_reference(tokens)
+
+  @staticmethod
+  def test_build_random():
+    generator = random.Random(0)
+    vocabulary = [('word', 'rock'), ('word', 'ROCK'), ('word', 'MASS'), ('word', 'want'), ('word', 'x.ROCK'),
+                  ('word', 'ROCK.x'), ('word', 'é'), ('entity', 'ROCK'), ('entity', 'MASS'), ('entity', 'M-ASS'),
+                  ('entity', 'PRONOUN'), ('entity', 'MY ROCK'), ('entity', 'ROCK MY'), ('entity', 'MY'),
+                  ('entity', 'é')]
+    for _ in range(2000):
+      tokens = [generator.choice(vocabulary) for _ in range(generator.randint(0, 30))]
+      assert compile_builder(tokens) == compile_reference(tokens), tokens
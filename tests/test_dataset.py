@@ -1,5 +1,8 @@
 # coding: utf-8
+import pytest
+from dataset_translation import json_stream
 from dataset_translation.dataset import Dataset
+from dataset_translation.records import Token
 
 
 class TestDataset:
@@ -181,6 +184,39 @@ class TestDataset:
     Dataset().fill_expressions(intents, cai_synonyms, expressions, 'fr')
     assert intents == cai_intents_fr
 
+  @staticmethod
+  @pytest.mark.parametrize('parser', ['orjson', 'stdlib'])
+  def test_decode_tokens(parser, monkeypatch):
+    if parser == 'orjson' and json_stream.orjson is None:
+      pytest.skip('orjson is not installed')
+    if parser == 'stdlib':
+      monkeypatch.setattr(json_stream, 'orjson', None)
+    gazettes = [{'name': 'MUSIC-GENRE', 'type': 'restricted'}, {'name': 'PRONOUN', 'type': 'gold'}]
+    entities = {}
+    tokens = Dataset.decode_tokens('[{"word": "I", "entity_id": 1}, {"word": "like"}, {"word": "rock", "entity_id": 0}]',
+                                   gazettes, entities)
+    assert tokens == [{'word': 'I', 'entity': {'name': 'PRONOUN', 'type': 'gold', 'is_custom': False}},
+                      {'word': 'like', 'entity': None},
+                      {'word': 'rock', 'entity': {'name': 'MUSIC-GENRE', 'type': 'restricted', 'is_custom': True}}]
+    assert entities == {0: {'name': 'MUSIC-GENRE', 'type': 'restricted', 'is_custom': True},
+                        1: {'name': 'PRONOUN', 'type': 'gold', 'is_custom': False}}
+    other_tokens = Dataset.decode_tokens('[{"word": "jazz", "entity_id": 0}]', gazettes, {})
+    assert isinstance(other_tokens[0], Token) and other_tokens[0]['entity'] is tokens[2]['entity']
+
+  @staticmethod
+  def test_records_other_languages():
+    records = [
+      ('expressions', {'intent_id': 0, 'source': 'hello', 'language': 'en', 'tokens': '[{"word": "hello"}]'}),
+      ('expressions', {'intent_id': 0, 'source': 'bonjour', 'language': 'fr', 'tokens': 'not decoded'}),
+      ('synonyms', {'entity_id': 0, 'value': 'rouge', 'language': 'fr'}),
+      ('intents', {'name': 'greetings', 'description': None, 'strictness': None}),
+      ('entities', {'name': 'COLOR', 'slug': 'color', 'locked': False, 'type': 2, 'is_open': True, 'strictness': None,
+                    'enrichment_strictness': None, 'regex_pattern': None, 'regex_flags': None})
+    ]
+    dataset = Dataset().records_to_cai_format(iter(records), 'en')
+    assert dataset['intents'][0]['expressions'] == [{'source': 'hello', 'tokens': [{'word': 'hello', 'entity': None}]}]
+    assert dataset['gazettes'][0]['synonyms'] == []
+
   @staticmethod
   def test_to_cai_format():
     original_dataset = {
@@ -376,6 +412,9 @@ class TestDataset:
     }
 
     assert Dataset().to_cai_format(original_dataset, 'en') == cai_dataset
+    records = [(section, record) for section in ['expressions', 'synonyms', 'datasets', 'entities', 'intents']
+               for record in original_dataset[section]]
+    assert Dataset().records_to_cai_format(records, 'en') == cai_dataset
     cai_dataset['language'] = 'fr'
     cai_dataset['intents']['name' == 'ask-music']['expressions'] = []
     cai_dataset['gazettes']['name' == 'MUSIC-GENRE']['synonyms'] = []
@@ -2,36 +2,30 @@
 import json
 import requests
 
-from mock import patch, Mock
+from mock import Mock
 import pytest
+from dataset_translation.cai_client import CaiClient
 from dataset_translation.dataset_translation import DatasetTranslation
+from tests.fake_servers import FakeCaiServer, FakeTranslationHubServer, dataset_entities, generate_dataset
+from dataset_translation.run_metrics import RunMetrics
+from dataset_translation.token_manager import TokenManager
+from dataset_translation.transport import Transport
 from dataset_translation.translator import SAPTranslationHubTranslator, NoneTranslator
 
 
-def requests_mocked():
-  mocked_requests = Mock()
-  response = requests.Response()
-  response.status_code = 200
-  response._content = b'{"results":[{"name":"ACCESSORIES", "id":0, "type": "free"}, {"name":"BOX_OPTION", "id":1, "type": "free"}], "access_token": "token"}'
-  mocked_requests.get.return_value = response
-  mocked_requests.post.return_value = response
-  mocked_requests.put.return_value = response
-  return mocked_requests
+CONTENT = b'{"results":[{"name":"ACCESSORIES", "id":0, "type": "free"}, {"name":"BOX_OPTION", "id":1, "type": "free"}], "access_token": "token"}'
 
 @pytest.fixture
-@patch('dataset_translation.cai_client.requests', requests_mocked())
-def dataset_translation_mocked():
-  mocked_dataset_translation = DatasetTranslation('none', 'en', 'fr', 'user_slug', 'bot_slug', 'version_slug', 'developer_token', 'bot_client_id', 'bot_client_secret')
+def dataset_translation_mocked(transport_mocked, response_mocked):
+  mocked_dataset_translation = DatasetTranslation('none', 'en', 'fr', 'user_slug', 'bot_slug', 'version_slug', 'developer_token', 'bot_client_id', 'bot_client_secret', transport=transport_mocked(response_mocked(200, CONTENT)))
   return mocked_dataset_translation
 
 
 class TestDatasetTranslation:
 
-  @patch('dataset_translation.cai_client.requests', requests_mocked())
-  @patch('dataset_translation.translator.sap_translation_hub_translator.requests', requests_mocked())
-  def test_datasettranslation_translator(self):
-    saptranslation = DatasetTranslation('saptranslationhub', 'en', 'fr', 'user_slug', 'bot_slug', 'version_slug', 'developer_token', 'bot_client_id', 'bot_client_secret', 'client_id', 'client_secret')
-    nonetranslation = DatasetTranslation('none', 'en', 'fr', 'user_slug', 'bot_slug', 'version_slug', 'developer_token', 'bot_client_id', 'bot_client_secret')
+  def test_datasettranslation_translator(self, transport_mocked, response_mocked):
+    saptranslation = DatasetTranslation('saptranslationhub', 'en', 'fr', 'user_slug', 'bot_slug', 'version_slug', 'developer_token', 'bot_client_id', 'bot_client_secret', 'client_id', 'client_secret', transport=transport_mocked(response_mocked(200, CONTENT)))
+    nonetranslation = DatasetTranslation('none', 'en', 'fr', 'user_slug', 'bot_slug', 'version_slug', 'developer_token', 'bot_client_id', 'bot_client_secret', transport=transport_mocked(response_mocked(200, CONTENT)))
     assert isinstance(saptranslation.translator, SAPTranslationHubTranslator)
     assert isinstance(nonetranslation.translator, NoneTranslator)
 
@@ -41,14 +35,14 @@ class TestDatasetTranslation:
     assert token_converted == [{'word': 'expression0', 'space': True, 'pos': 'VERB', 'entity': None}]
     assert len(token) == len(token_converted)
 
-  @patch('dataset_translation.cai_client.requests', new_callable=lambda: requests_mocked())
-  def test_translate_synonyms(self, mocked_request, dataset_translation_mocked):
+  def test_translate_synonyms(self, dataset_translation_mocked):
     gazettes = [{'slug': 'gazette slug', 'synonyms': ['synonym0', 'synonym1']},
                 {'slug': 'gazette slug2', 'synonyms': ['synonym0', 'synonym1']}]
     gazettes_no_synonym = [{'slug': 'gazette slug', 'synonyms': None}]
+    dataset_translation_mocked.transport.post.reset_mock()
     translated_synonyms = dataset_translation_mocked.translate_synonyms(gazettes)
     translated_no_synonym = dataset_translation_mocked.translate_synonyms(gazettes_no_synonym)
-    assert mocked_request.post.call_count == 2
+    assert dataset_translation_mocked.transport.post.call_count == 2
     assert translated_synonyms == gazettes
     assert translated_no_synonym == gazettes_no_synonym
 
@@ -97,7 +91,6 @@ class TestDatasetTranslation:
     assert synonym1_tokens == {3: ['cpl']}
     assert synonym2_tokens == {0: ['another synonym', 'boxoption'], 3: ['cpl']}
 
-  @patch('dataset_translation.cai_client.requests', requests_mocked())
   def test_update_and_compile_expressions(self, dataset_translation_mocked):
 
     tokens = [
@@ -201,9 +194,10 @@ class TestDatasetTranslation:
                   }
     list_tokens, expression_compiled = dataset_translation_mocked.update_and_compile_expressions(tokens, {0: ['boxoption'], 3: ['cpl']}, expression, 'accessories-information', 'f3230b7b-3676-4452-a0e9-b8c38d68124a')
     assert list_tokens == updated_tokens
+    assert dataset_translation_mocked.transport.put.call_count == 1
+    assert [token['ind'] for token in dataset_translation_mocked.transport.put.call_args[1]['json']['tokens']] == [0, 3]
 
-  @patch('dataset_translation.cai_client.requests', new_callable=lambda: requests_mocked())
-  def test_dataset_translation(self, mocked_request, dataset_translation_mocked):
+  def test_dataset_translation(self, dataset_translation_mocked):
     original_data = {'gazettes': [{'slug': 'gazette slug', 'synonyms': ['synonym0', 'synonym1']},
                                   {'slug': 'gazette slug2', 'synonyms': ['synonym0', 'synonym1']}],
                      'intents':  [{'name': 'accessories-information', 'expressions': [{
@@ -346,8 +340,9 @@ class TestDatasetTranslation:
                                       'part_of_speech': 'NOUN'
                                     }
                                   ]}}
+    return_results['results'] = [return_results['results']]
     response_post._content = json.dumps(return_results, indent=2).encode('utf-8')
-    mocked_request.post.return_value = response_post
+    dataset_translation_mocked.transport.post.return_value = response_post
 
     translated_data = dataset_translation_mocked.dataset_translation(original_data)
 
@@ -364,3 +359,83 @@ class TestDatasetTranslation:
     result = dataset_translation_mocked.add_entity_name('TEST_1-0/=.0', 'this is a ')
     assert result == 'this is a TEST100 '
     assert isinstance(result, str)
+
+  def test_plan_translations(self, dataset_translation_mocked):
+    dataset = {'gazettes': [{'name': 'GAZETTE', 'slug': 'gazette', 'synonyms': ['yes', 'no']}],
+               'intents': [{'name': 'intent', 'expressions': [{'source': 'yes', 'tokens': []}, {'source': 'no', 'tokens': []}]}]}
+    dataset_translation_mocked.translator = Mock(wraps=dataset_translation_mocked.translator)
+    dataset_translation_mocked.plan_translations(dataset)
+    dataset_translation_mocked.translate_synonyms(dataset['gazettes'])
+    dataset_translation_mocked.translate_intent(dataset['intents'][0])
+    dataset_translation_mocked.translator.batch_translate.assert_called_once_with(['yes', 'no'], DatasetTranslation.SIZE_BATCH)
+
+  def test_prefetch_token_translations(self, dataset_translation_mocked):
+    tokens = [
+      {'word': 'BOXOPTION', 'space': True, 'pos': 'NOUN', 'entity': {'name': 'BOX_OPTION', 'type': 'free', 'is_custom': True}},
+      {'word': 'I', 'space': True, 'pos': 'PRON', 'entity': {'name': 'PRONOUN', 'type': 'gold', 'is_custom': False}},
+      {'word': 'CPL', 'space': False, 'pos': 'NOUN', 'entity': {'name': 'ACCESSORIES', 'type': 'free', 'is_custom': True}}
+    ]
+    gazettes = [{'name': 'BOX_OPTION', 'synonyms': []}, {'name': 'ACCESSORIES', 'synonyms': ['cpl']}]
+    dataset_translation_mocked.translator = Mock(wraps=dataset_translation_mocked.translator)
+    dataset_translation_mocked.prefetch_token_translations([tokens, tokens], gazettes)
+    assert dataset_translation_mocked.token_translations == {'BOXOPTION': 'boxoption', 'CPL': 'cpl'}
+    assert dataset_translation_mocked.translate_non_gold_tokens(tokens, gazettes) == {0: ['boxoption'], 2: ['cpl']}
+    dataset_translation_mocked.translator.batch_translate.assert_called_once_with(['BOXOPTION', 'CPL'], DatasetTranslation.SIZE_BATCH)
+
+  def test_index_gazettes(self, dataset_translation_mocked):
+    gazettes = [{'name': 'ACCESSORIES', 'slug': 'accessories', 'synonyms': ['cpl']}, {'name': 'BOX_OPTION', 'synonyms': None}]
+    gazettes_by_name = dataset_translation_mocked.index_gazettes(gazettes)
+    assert gazettes_by_name == {'ACCESSORIES': [(gazettes[0], {'cpl'})], 'BOX_OPTION': [(gazettes[1], set())]}
+    assert dataset_translation_mocked.index_gazettes(gazettes) is gazettes_by_name
+    dataset_translation_mocked.translator = Mock(batch_translate=Mock(return_value=['cable']))
+    dataset_translation_mocked.translate_gazette(gazettes[0])
+    assert dataset_translation_mocked.index_gazettes(gazettes)['ACCESSORIES'] == [(gazettes[0], {'cable'})]
+    dataset_translation_mocked.restore({'gazettes': [], 'intents': []})
+    assert dataset_translation_mocked.index_gazettes([]) == {}
+
+  @staticmethod
+  def test_dataset_translation_fake_servers():
+    dataset = generate_dataset(3, 8, 2, seed=1)
+    translate = lambda line, source, target: line.upper()
+    with FakeCaiServer(dataset_entities(dataset)) as cai_server, FakeTranslationHubServer(translate) as translation_hub_server:
+      metrics = RunMetrics()
+      transport = Transport(metrics=metrics)
+      token_manager = TokenManager(background_refresh=False)
+      cai_client = CaiClient('user', 'bot', 'v1', 'developer_token', 'bot_client_id', 'bot_client_secret', transport=transport,
+                             api_url=cai_server.api_url, auth_url=cai_server.auth_url, token_manager=token_manager)
+      translator = SAPTranslationHubTranslator('en', 'fr', 'id', 'secret', transport=transport, token_manager=token_manager,
+                                               api_url=translation_hub_server.api_url, token_url=translation_hub_server.token_url)
+      translation = DatasetTranslation('saptranslationhub', 'en', 'fr', 'user', 'bot', 'v1', 'developer_token', 'bot_client_id',
+                                       'bot_client_secret', transport=transport, cai_client=cai_client, translator=translator,
+                                       metrics=metrics)
+      translated_dataset = translation.dataset_translation(dataset)
+    assert translation.translator is translator
+    assert sum(len(expressions) for expressions in cai_server.expressions.values()) == 3 * 8
+    assert cai_server.synonyms['entity-0'][0]['value'] == 'SYNONYM0X0'
+    assert cai_server.requests[('POST', '/intents/intent-0/expressions/bulk_create')] == 1
+    assert all(expression['source'].isupper() and expression['compiled']
+               for intent in translated_dataset['intents'] for expression in intent['expressions'])
+    assert translation_hub_server.requests[('POST', '/api/v1/translation')] == 1
+    report = metrics.report()
+    assert set(report['phases']) == {'translation_plan', 'import', 'token_update'}
+    assert report['endpoints']['translation']['requests'] == 1
+    assert report['endpoints']['expression_import']['requests'] == 3
+    assert report['counters']['translated_characters'] == translation.plan.stats()['characters']
+
+  @staticmethod
+  def test_dataset_translation_skip_existing():
+    dataset = generate_dataset(2, 5, 2, seed=3)
+    with FakeCaiServer(dataset_entities(dataset)) as cai_server:
+      cai_client = CaiClient('user', 'bot', 'v1', 'developer_token', 'bot_client_id', 'bot_client_secret', transport=Transport(),
+                             api_url=cai_server.api_url, auth_url=cai_server.auth_url)
+      translations = [DatasetTranslation('none', 'en', 'fr', 'user', 'bot', 'v1', 'developer_token', 'bot_client_id',
+                                         'bot_client_secret', cai_client=cai_client, skip_existing=True)
+                      for _ in range(2)]
+      first = translations[0].dataset_translation(json.loads(json.dumps(dataset)))
+      cai_server.requests.clear()
+      second = translations[1].dataset_translation(json.loads(json.dumps(dataset)))
+    assert sum(len(expressions) for expressions in cai_server.expressions.values()) == 2 * 5
+    assert not any(method in ('POST', 'PUT') and 'expressions' in path for method, path in cai_server.requests)
+    assert cai_server.requests[('GET', '/intents/intent-0/expressions')] == 1
+    assert second['intents'] == first['intents']
+    assert translations[1].metrics.report()['counters']['existing_expressions'] == 2 * 5
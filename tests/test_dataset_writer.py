@@ -0,0 +1,105 @@
+# coding: utf-8
+import json
+import pytest
+from dataset_translation.dataset_writer import DatasetWriter
+from dataset_translation.json_stream import read_chunks
+
+
+def dataset_mocked():
+  return {
+    'language': 'fr',
+    'gazettes': [{'name': 'MUSIC-GENRE', 'slug': 'music-genre', 'synonyms': ['rock', 'électro']},
+                 {'name': 'PRONOUN', 'slug': 'pronoun', 'synonyms': []}],
+    'intents': [
+      {'name': 'ask-music', 'description': '', 'expressions': [
+        {'source': 'je veux du rock', 'tokens': [{'word': 'rock', 'entity': None}], 'compiled': 'je veux du rock '},
+        {'source': 'du jazz', 'tokens': [], 'compiled': 'du jazz '}
+      ]},
+      {'name': 'greetings', 'description': 'Dit bonjour', 'expressions': []}
+    ]
+  }
+
+
+class TestDatasetWriter:
+
+  @staticmethod
+  def test_write_indent(tmp_path):
+    path = tmp_path / 'dataset.json'
+    DatasetWriter(str(path)).write_dataset(dataset_mocked())
+    assert path.read_text(encoding='utf-8') == json.dumps(dataset_mocked(), indent=4, ensure_ascii=False)
+
+  @staticmethod
+  @pytest.mark.parametrize('compression', [None, 'gzip', 'zlib'])
+  def test_write_compact(tmp_path, compression):
+    path = tmp_path / f"dataset{DatasetWriter.extension('compact', compression)}"
+    DatasetWriter(str(path), 'compact', compression).write_dataset(dataset_mocked())
+    content = b''.join(read_chunks(str(path)))
+    assert json.loads(content) == dataset_mocked()
+    assert b'\n' not in content
+
+  @staticmethod
+  def test_write_ndjson(tmp_path):
+    path = tmp_path / 'dataset.ndjson'
+    DatasetWriter(str(path), 'ndjson').write_dataset(dataset_mocked())
+    lines = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    assert lines == [{'intent': 'ask-music', **expression} for expression in dataset_mocked()['intents'][0]['expressions']]
+
+  @staticmethod
+  def test_write_out_of_order(tmp_path):
+    path = tmp_path / 'dataset.json'
+    dataset = dataset_mocked()
+    writer = DatasetWriter(str(path), 'compact')
+    writer.open('fr')
+    writer.write('gazettes', 1, dataset['gazettes'][1])
+    assert path.read_text(encoding='utf-8') == '{"language":"fr","gazettes":['
+    writer.write('gazettes', 0, dataset['gazettes'][0])
+    writer.write('intents', 1, dataset['intents'][1])
+    writer.write('intents', 0, dataset['intents'][0])
+    writer.finish()
+    writer.close()
+    assert json.loads(path.read_text(encoding='utf-8')) == dataset
+
+  @staticmethod
+  def test_write_partial(tmp_path):
+    path = tmp_path / 'dataset.json'
+    dataset = dataset_mocked()
+    writer = DatasetWriter(str(path), 'compact')
+    writer.open('fr')
+    writer.write('intents', 0, dataset['intents'][0])
+    with pytest.raises(ValueError):
+      writer.write('gazettes', 0, dataset['gazettes'][0])
+    writer.close()
+    assert path.read_text(encoding='utf-8') == '{"language":"fr","gazettes":[],"intents":[' + json.dumps(dataset['intents'][0], ensure_ascii=False, separators=(',', ':'))
+
+  @staticmethod
+  def test_write_other_members(tmp_path):
+    path = tmp_path / 'dataset.json'
+    source = dataset_mocked()
+    dataset = {'language': 'fr', 'description': 'Bot de musique', 'intents': source['intents'],
+               'version': {'slug': 'v1'}, 'gazettes': source['gazettes'], 'entities': []}
+    DatasetWriter(str(path)).write_dataset(dataset)
+    assert path.read_text(encoding='utf-8') == json.dumps(dataset, indent=4, ensure_ascii=False)
+
+  @staticmethod
+  def test_write_section_order(tmp_path):
+    path = tmp_path / 'dataset.json'
+    source = dataset_mocked()
+    dataset = {'language': 'en', 'intents': source['intents'], 'gazettes': source['gazettes'], 'bot': 'music'}
+    writer = DatasetWriter(str(path), 'compact')
+    writer.open('fr', dataset)
+    writer.write('gazettes', 0, dataset['gazettes'][0])
+    writer.write('gazettes', 1, dataset['gazettes'][1])
+    writer.write('intents', 1, dataset['intents'][1])
+    assert path.read_text(encoding='utf-8') == '{"language":"fr","intents":['
+    writer.write('intents', 0, dataset['intents'][0])
+    writer.finish()
+    writer.close()
+    content = path.read_text(encoding='utf-8')
+    assert content == json.dumps({**dataset, 'language': 'fr'}, ensure_ascii=False, separators=(',', ':'))
+
+  @staticmethod
+  def test_writer_error():
+    with pytest.raises(ValueError):
+      DatasetWriter('dataset.json', 'yaml')
+    with pytest.raises(ValueError):
+      DatasetWriter('dataset.json', 'compact', 'bz2')
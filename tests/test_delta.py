@@ -0,0 +1,124 @@
+# coding: utf-8
+import copy
+from mock import Mock
+from dataset_translation.cai_client import CaiClient
+from dataset_translation.dataset_translation import DatasetTranslation
+from dataset_translation.delta import DatasetDelta, expression_fingerprint
+from tests.fake_servers import FakeCaiServer, FakeTranslationHubServer, dataset_entities, generate_dataset
+from dataset_translation.journal import JournalState
+from dataset_translation.token_manager import TokenManager
+from dataset_translation.transport import Transport
+from dataset_translation.translator import SAPTranslationHubTranslator
+
+
+def expression(source, expression_id=None, compiled=None):
+  result = {'source': source, 'tokens': [{'word': source, 'space': False, 'pos': 'NOUN', 'entity': None}]}
+  if expression_id is not None:
+    result['id'] = expression_id
+  if compiled is not None:
+    result['compiled'] = compiled
+  return result
+
+
+def snapshots():
+  previous_source = {
+    'language': 'en',
+    'intents': [
+      {'name': 'greetings', 'description': '', 'strictness': None,
+       'expressions': [expression('hello', 'en0'), expression('hi', 'en1'), expression('hey', 'en2')]},
+      {'name': 'goodbye', 'description': '', 'strictness': None, 'expressions': [expression('bye', 'en3')]}
+    ],
+    'gazettes': [{'name': 'COLOR', 'slug': 'color', 'type': 'restricted', 'synonyms': ['red']},
+                 {'name': 'SIZE', 'slug': 'size', 'type': 'restricted', 'synonyms': ['small']}]
+  }
+  previous_translated = {
+    'language': 'fr',
+    'intents': [
+      {'name': 'greetings', 'description': '', 'strictness': None,
+       'expressions': [expression('bonjour', 'fr0', 'bonjour '), expression('salut', 'fr1', 'salut '),
+                       expression('', 'en2')]},
+      {'name': 'goodbye', 'description': '', 'strictness': None,
+       'expressions': [expression('au revoir', 'fr3', 'au revoir ')]}
+    ],
+    'gazettes': [{'name': 'COLOR', 'slug': 'color', 'type': 'restricted', 'synonyms': ['rouge']},
+                 {'name': 'SIZE', 'slug': 'size', 'type': 'restricted', 'synonyms': ['petit']}]
+  }
+  dataset = {
+    'language': 'en',
+    'intents': [
+      {'name': 'greetings', 'description': '', 'strictness': None,
+       'expressions': [expression('hi', 'en1'), expression('hello there', 'en4'), expression('hey', 'en2')]},
+      {'name': 'thanks', 'description': '', 'strictness': None, 'expressions': [expression('thanks', 'en5')]}
+    ],
+    'gazettes': [{'name': 'COLOR', 'slug': 'color', 'type': 'restricted', 'synonyms': ['red']},
+                 {'name': 'SIZE', 'slug': 'size', 'type': 'restricted', 'synonyms': ['small', 'big']},
+                 {'name': 'SHAPE', 'slug': 'shape', 'type': 'restricted', 'synonyms': ['round']}]
+  }
+  return previous_source, previous_translated, dataset
+
+
+class TestDatasetDelta:
+
+  @staticmethod
+  def test_fingerprint():
+    assert expression_fingerprint(expression('hello', 'en0')) == expression_fingerprint(expression('hello', 'en9'))
+    assert expression_fingerprint(expression('hello')) != expression_fingerprint(expression('hello!'))
+
+  @staticmethod
+  def test_apply():
+    previous_source, previous_translated, dataset = snapshots()
+    delta = DatasetDelta(previous_source, previous_translated)
+    state = JournalState()
+    state.expressions[('greetings', 2)] = {'source': 'coucou', 'response': {'id': 'fr9', 'tokens': []}}
+    stats = delta.apply(dataset, state)
+    assert state.gazettes == {'color': ['rouge']}
+    assert state.expressions[('greetings', 0)] == {'source': 'salut', 'tokens': previous_translated['intents'][0]['expressions'][1]['tokens'],
+                                                   'compiled': 'salut ', 'id': 'fr1'}
+    assert ('greetings', 1) not in state.expressions and ('thanks', 0) not in state.expressions
+    assert state.expressions[('greetings', 2)]['source'] == 'coucou'
+    assert stats == {'unchanged_gazettes': 1, 'changed_gazettes': 1, 'added_gazettes': 1, 'changed_intents': 1,
+                     'added_intents': 1, 'unchanged_expressions': 2, 'added_expressions': 2, 'removed_intents': 1,
+                     'removed_expressions': 2}
+    assert delta.removed == {'intents': ['goodbye'], 'gazettes': [],
+                             'expressions': [('greetings', 'bonjour', 'fr0')]}
+
+  @staticmethod
+  def test_delete():
+    previous_source, previous_translated, dataset = snapshots()
+    dataset['intents'][0]['expressions'].pop()
+    cai_client = Mock()
+    stats = DatasetDelta(previous_source, previous_translated, delete_removed=True).apply(dataset, JournalState(), cai_client)
+    cai_client.delete_expression.assert_called_once_with('greetings', 'fr0')
+    assert stats['deleted_expressions'] == 1 and stats['removed_expressions'] == 3
+
+  @staticmethod
+  def test_delta_fake_servers():
+    source = generate_dataset(3, 6, 2, seed=2)
+    dataset = copy.deepcopy(source)
+    dataset['intents'][0]['expressions'][0] = expression('book a new flight')
+    dataset['intents'].pop()
+    translate = lambda line, source, target: line.upper()
+    with FakeCaiServer(dataset_entities(source)) as cai_server, FakeTranslationHubServer(translate) as translation_hub_server:
+      transport = Transport()
+      token_manager = TokenManager(background_refresh=False)
+      cai_client = CaiClient('user', 'bot', 'v1', 'developer_token', 'bot_client_id', 'bot_client_secret', transport=transport,
+                             api_url=cai_server.api_url, auth_url=cai_server.auth_url, token_manager=token_manager)
+      translator = SAPTranslationHubTranslator('en', 'fr', 'id', 'secret', transport=transport, token_manager=token_manager,
+                                               api_url=translation_hub_server.api_url, token_url=translation_hub_server.token_url)
+
+      def translation(delta=None):
+        return DatasetTranslation('saptranslationhub', 'en', 'fr', 'user', 'bot', 'v1', 'developer_token', 'bot_client_id',
+                                  'bot_client_secret', transport=transport, cai_client=cai_client, translator=translator,
+                                  delta=delta)
+      previous_translated = translation().dataset_translation(copy.deepcopy(source))
+      removed_id = previous_translated['intents'][0]['expressions'][0]['id']
+      cai_server.requests.clear()
+      translated = translation(DatasetDelta(source, previous_translated, delete_removed=True)).dataset_translation(dataset)
+    assert cai_server.requests[('POST', '/intents/intent-0/expressions/bulk_create')] == 1
+    assert cai_server.requests[('POST', '/intents/intent-1/expressions/bulk_create')] == 0
+    assert not any(method == 'POST' and path.endswith('/synonyms/bulk_create') for method, path in cai_server.requests)
+    assert cai_server.requests[('DELETE', f"/intents/intent-0/expressions/{removed_id}")] == 1
+    assert removed_id not in {expression['id'] for expression in cai_server.expressions['intent-0']}
+    assert translated['intents'][0]['expressions'][0]['source'] == 'BOOK A NEW FLIGHT'
+    assert translated['intents'][1] == previous_translated['intents'][1]
+    assert translated['gazettes'] == previous_translated['gazettes']
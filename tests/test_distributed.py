@@ -0,0 +1,138 @@
+# coding: utf-8
+import copy
+import threading
+import pytest
+from mock import Mock, patch
+from dataset_translation.cai_client import CaiClient
+from dataset_translation.distributed import DistributedTranslation, TranslationWorker
+from tests.fake_servers import FakeCaiServer, FakeTranslationHubServer, dataset_entities, generate_dataset
+from dataset_translation.records import Gazette, Intent
+from dataset_translation.token_manager import TokenManager
+from dataset_translation.transport import Transport
+from dataset_translation.translator import SAPTranslationHubTranslator
+from dataset_translation.work_queue import MemoryWorkQueue
+
+
+def start_workers(workers):
+  threads = [threading.Thread(target=worker.run, daemon=True) for worker in workers]
+  for thread in threads:
+    thread.start()
+  return threads
+
+
+def stop_workers(workers, threads):
+  for worker in workers:
+    worker.stop()
+  for thread in threads:
+    thread.join()
+
+
+class TestDistributedTranslation:
+
+  @staticmethod
+  def test_distributed_fake_servers():
+    source = generate_dataset(5, 4, 3, seed=3)
+    translate = lambda line, source, target: f"{target[:2]}:{line}".upper()
+    queue = MemoryWorkQueue(retry_delay=0)
+    with FakeCaiServer(dataset_entities(source)) as cai_server, FakeTranslationHubServer(translate) as translation_hub_server:
+      workers = []
+      for _ in range(3):
+        transport = Transport()
+        token_manager = TokenManager(background_refresh=False)
+        cai_client = CaiClient('user', 'bot', 'v1', 'developer_token', 'bot_client_id', 'bot_client_secret',
+                               transport=transport, api_url=cai_server.api_url, auth_url=cai_server.auth_url,
+                               token_manager=token_manager)
+        worker = TranslationWorker(queue, 'saptranslationhub', 'user', 'bot', 'v1', 'developer_token', 'bot_client_id',
+                                   'bot_client_secret', transport=transport, cai_client=cai_client,
+                                   token_manager=token_manager, poll_interval=0.01)
+        for target_language in ('fr', 'de'):
+          worker.translators[('en', target_language)] = SAPTranslationHubTranslator(
+            'en', target_language, 'id', 'secret', transport=transport, token_manager=token_manager,
+            api_url=translation_hub_server.api_url, token_url=translation_hub_server.token_url)
+        workers.append(worker)
+      threads = start_workers(workers)
+      cai_client = CaiClient('user', 'bot', 'v1', 'developer_token', 'bot_client_id', 'bot_client_secret',
+                             transport=Transport(), api_url=cai_server.api_url, auth_url=cai_server.auth_url,
+                             token_manager=TokenManager(background_refresh=False))
+      try:
+        translated = DistributedTranslation(queue, cai_client, 'en', ['fr', 'de'], intents_per_job=2,
+                                            poll_interval=0.01).dataset_translation(copy.deepcopy(source))
+      finally:
+        stop_workers(workers, threads)
+    assert sum(worker.metrics.counters['distributed_completed_jobs'] for worker in workers) == 2 * (3 + 3)
+    for language in ('fr', 'de'):
+      dataset = translated[language]
+      assert dataset['language'] == language
+      assert all(isinstance(gazette, Gazette) for gazette in dataset['gazettes'])
+      assert [gazette['synonyms'] for gazette in dataset['gazettes']] == [
+        [f"{language}:{synonym}".upper() for synonym in gazette['synonyms']] for gazette in source['gazettes']]
+      assert all(isinstance(intent, Intent) for intent in dataset['intents'])
+      assert [intent['name'] for intent in dataset['intents']] == [intent['name'] for intent in source['intents']]
+      for intent, source_intent in zip(dataset['intents'], source['intents']):
+        assert [expression['source'] for expression in intent['expressions']] == [
+          f"{language}:{expression['source']}".upper() for expression in source_intent['expressions']]
+        assert all('compiled' in expression and 'id' in expression for expression in intent['expressions'])
+    assert sum(len(expressions) for expressions in cai_server.expressions.values()) == 2 * 5 * 4
+    assert sum(count for (method, path), count in cai_server.requests.items()
+               if method == 'POST' and path.endswith('/synonyms/bulk_create')) == 2 * 3
+
+  @staticmethod
+  def test_failed_job_retried():
+    queue = MemoryWorkQueue(retry_delay=0)
+    worker = TranslationWorker(queue, 'none', 'user', 'bot', 'v1', 'developer_token', 'bot_client_id',
+                               'bot_client_secret', cai_client=Mock(), poll_interval=0.01)
+    dataset = {'language': 'en', 'intents': [], 'gazettes': [
+      {'name': 'COLOR', 'slug': 'color', 'type': 'restricted', 'synonyms': ['red']}]}
+    results = [ValueError('CAI API returned 500'), {'gazettes': [{**dataset['gazettes'][0], 'synonyms': ['rouge']}]}]
+    queue.push('other-run:fr:gazette:0', '{}')
+    queue.ack('other-run:fr:gazette:0', '{}')
+    with patch.object(TranslationWorker, 'handle', side_effect=results) as handle:
+      threads = start_workers([worker])
+      cai_client = Mock()
+      try:
+        translated = DistributedTranslation(queue, cai_client, 'en', ['fr'],
+                                            poll_interval=0.01).dataset_translation(dataset)
+      finally:
+        stop_workers([worker], threads)
+    assert translated['fr']['gazettes'][0]['synonyms'] == ['rouge']
+    cai_client.post_synonyms.assert_called_once_with('color', ['rouge'], 'fr')
+    assert [call[0][1] for call in handle.call_args_list] == [1, 2]
+    assert queue.results(['other-run:fr:gazette:0']) == {'other-run:fr:gazette:0': '{}'}
+    assert not queue.jobs.keys() - {'other-run:fr:gazette:0'}
+    assert worker.metrics.counters['distributed_failed_jobs'] == 1
+
+  @staticmethod
+  def test_failed_job_error():
+    queue = MemoryWorkQueue(retry_delay=0, max_attempts=2)
+    worker = TranslationWorker(queue, 'none', 'user', 'bot', 'v1', 'developer_token', 'bot_client_id',
+                               'bot_client_secret', cai_client=Mock(), poll_interval=0.01)
+    dataset = {'language': 'en', 'intents': [], 'gazettes': [
+      {'name': 'COLOR', 'slug': 'color', 'type': 'restricted', 'synonyms': ['red']}]}
+    with patch.object(TranslationWorker, 'handle', side_effect=ValueError('CAI API returned 500')):
+      threads = start_workers([worker])
+      try:
+        with pytest.raises(ValueError, match="fr:gazette:0: ValueError: CAI API returned 500"):
+          DistributedTranslation(queue, Mock(), 'en', ['fr'], poll_interval=0.01).dataset_translation(dataset)
+      finally:
+        stop_workers([worker], threads)
+    assert not queue.jobs and not queue.failed
+
+  @staticmethod
+  def test_gazettes_job_translated_only():
+    cai_client = Mock()
+    worker = TranslationWorker(MemoryWorkQueue(), 'none', 'user', 'bot', 'v1', 'developer_token', 'bot_client_id',
+                               'bot_client_secret', cai_client=cai_client)
+    job = {'kind': 'gazettes', 'target_language': 'fr', 'dataset': {'language': 'en', 'intents': [], 'gazettes': [
+      {'name': 'COLOR', 'slug': 'color', 'type': 'restricted', 'synonyms': ['red']}]}}
+    for _ in range(2):
+      result = worker.handle(copy.deepcopy(job))
+      assert [gazette['synonyms'] for gazette in result['gazettes']] == [['red']]
+    cai_client.post_synonyms.assert_not_called()
+
+  @staticmethod
+  def test_retry_skips_existing():
+    worker = TranslationWorker(MemoryWorkQueue(), 'none', 'user', 'bot', 'v1', 'developer_token', 'bot_client_id',
+                               'bot_client_secret', cai_client=Mock())
+    assert worker.translation('en', 'fr').skip_existing is False
+    assert worker.translation('en', 'fr', skip_existing=True).skip_existing is True
+    assert worker.options == {}
@@ -0,0 +1,54 @@
+# coding: utf-8
+import pytest
+from dataset_translation.journal import Journal, JournalState
+
+
+class TestJournal:
+
+  @staticmethod
+  def test_record_batches(tmp_path):
+    path = tmp_path / 'journal.ndjson'
+    journal = Journal(str(path), flush_size=2, flush_interval=60)
+    journal.record_synonyms({'slug': 'music-genre', 'synonyms': ['rock']})
+    assert path.read_text(encoding='utf-8') == ''
+    journal.record_expression('ask-music', 0, {'source': 'du rock'}, {'id': 'id0', 'tokens': []})
+    assert len(path.read_text(encoding='utf-8').splitlines()) == 2
+    journal.record_annotation('ask-music', 0, {'tokens': [{'word': 'rock'}], 'compiled': 'du rock '})
+    journal.close()
+    assert len(path.read_text(encoding='utf-8').splitlines()) == 3
+
+  @staticmethod
+  def test_load(tmp_path):
+    path = tmp_path / 'journal.ndjson'
+    journal = Journal(str(path))
+    journal.record_synonyms({'slug': 'music-genre', 'synonyms': ['rock']})
+    journal.record_expression('ask-music', 0, {'source': 'du rock'}, {'id': 'id0', 'tokens': []})
+    journal.record_expression('ask-music', 1, {'source': 'du jazz'}, {'id': 'id1', 'tokens': []})
+    journal.record_annotation('ask-music', 0, {'tokens': [], 'compiled': 'du rock '})
+    journal.close()
+    with open(path, 'a', encoding='utf-8') as file:
+      file.write('{"kind": "annotation", "intent": "ask-')
+    state = JournalState.load(str(path))
+    assert state.gazettes == {'music-genre': ['rock']}
+    assert state.expressions == {
+      ('ask-music', 0): {'source': 'du rock', 'response': {'id': 'id0', 'tokens': []}, 'tokens': [], 'compiled': 'du rock '},
+      ('ask-music', 1): {'source': 'du jazz', 'response': {'id': 'id1', 'tokens': []}}
+    }
+
+  @staticmethod
+  def test_resume(tmp_path):
+    path = tmp_path / 'journal.ndjson'
+    journal = Journal(str(path))
+    journal.record_synonyms({'slug': 'music-genre', 'synonyms': ['rock']})
+    journal.close()
+    journal = Journal(str(path), resume=True)
+    assert journal.state.gazettes == {'music-genre': ['rock']}
+    journal.record_synonyms({'slug': 'pronoun', 'synonyms': ['je']})
+    journal.close()
+    assert len(Journal(str(path), resume=True).state.gazettes) == 2
+    with pytest.raises(FileExistsError, match='resume it or overwrite it'):
+      Journal(str(path))
+    assert len(Journal(str(path), resume=True).state.gazettes) == 2
+    assert Journal(str(path), overwrite=True).state.gazettes == {}
+    assert path.read_text(encoding='utf-8') == ''
+    assert Journal(str(tmp_path / 'missing.ndjson'), resume=True).state.gazettes == {}
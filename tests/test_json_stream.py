@@ -0,0 +1,125 @@
+# coding: utf-8
+import codecs
+import gzip
+import io
+import json
+import zlib
+import pytest
+from dataset_translation import json_stream
+from dataset_translation.json_stream import JsonStreamReader, iter_chunks, load_file, loads, read_chunks, sniff_format
+
+
+def document_mocked():
+  return {
+    'version': 5,
+    'datasets': [{'language': 'fr', 'strictness': 50}],
+    'intents': [{'name': 'ask-music', 'description': None}, {'name': 'greetings', 'description': 'Sàys "hello" {'}],
+    'entities': [],
+    'expressions': [{'source': 'I want to listen to rock', 'tokens': "[{\"word\":\"I\"}]", 'score': 12345.5}]
+  }
+
+def records_expected(document):
+  records = []
+  for key, value in document.items():
+    if isinstance(value, list):
+      records.extend((key, record) for record in value)
+    else:
+      records.append((key, value))
+  return records
+
+
+class TestJsonStreamReader:
+
+  @staticmethod
+  @pytest.mark.parametrize('chunk_size', [1, 3, 7, 1 << 16])
+  def test_iter_records(chunk_size):
+    document = document_mocked()
+    content = json.dumps(document, indent=2, ensure_ascii=False).encode('utf-8')
+    records = list(JsonStreamReader(iter_chunks(io.BytesIO(content), chunk_size)))
+    assert records == records_expected(document)
+
+  @staticmethod
+  def test_iter_records_zlib():
+    document = document_mocked()
+    content = zlib.compress(json.dumps(document).encode('utf-8'))
+    records = list(JsonStreamReader(iter_chunks(io.BytesIO(content), 5, compression='zlib')))
+    assert records == records_expected(document)
+
+  @staticmethod
+  def test_iter_records_empty():
+    assert list(JsonStreamReader([b' { } '])) == []
+    assert list(JsonStreamReader([b'{"a": [], "b": 1', b'2}'])) == [('b', 12)]
+
+  @staticmethod
+  @pytest.mark.parametrize('content', [b'[1, 2]', b'{"a": [1, 2}', b'{"a": [{"b": 1}', b'{"a": 1} 2', b'{1: 2}'])
+  def test_iter_records_error(content):
+    with pytest.raises(ValueError):
+      list(JsonStreamReader(iter_chunks(io.BytesIO(content), 2)))
+
+  @staticmethod
+  def test_decode_large_value():
+    content = json.dumps({'a': ['x' * 10000, 1]}).encode('utf-8')
+    reader = JsonStreamReader(iter_chunks(io.BytesIO(content), 10))
+    raw_decode = reader.decoder.raw_decode
+    calls = []
+    reader.decoder.raw_decode = lambda *args: calls.append(1) or raw_decode(*args)
+    assert list(reader) == [('a', 'x' * 10000), ('a', 1)]
+    assert len(calls) < 20
+
+  @staticmethod
+  def test_decode_value_too_large():
+    chunks = iter([b'{"a": ["'] + [b'x' * 10] * 100)
+    with pytest.raises(ValueError, match='more than 100 characters'):
+      list(JsonStreamReader(chunks, max_value_size=100))
+    assert len(list(chunks)) > 50
+
+  @staticmethod
+  def test_sniff_format():
+    content = json.dumps(document_mocked()).encode('utf-8')
+    assert sniff_format(zlib.compress(content)[:3]) == 'zlib'
+    assert sniff_format(zlib.compress(content, 1)[:3]) == 'zlib'
+    assert sniff_format(gzip.compress(content)[:3]) == 'gzip'
+    assert sniff_format(content[:3]) == 'json'
+    assert sniff_format(b' \n{') == 'json'
+    assert sniff_format(b'') == 'json'
+
+  @staticmethod
+  @pytest.mark.parametrize('encode', [
+    lambda content: content,
+    lambda content: codecs.BOM_UTF8 + content,
+    zlib.compress,
+    gzip.compress
+  ])
+  @pytest.mark.parametrize('mmap_threshold', [1, 1 << 24])
+  def test_read_chunks(tmp_path, encode, mmap_threshold):
+    document = document_mocked()
+    path = tmp_path / 'dataset.json'
+    path.write_bytes(encode(json.dumps(document, ensure_ascii=False).encode('utf-8')))
+    assert json.loads(b''.join(read_chunks(str(path), 4, mmap_threshold))) == document
+    assert list(JsonStreamReader(read_chunks(str(path), 4, mmap_threshold))) == records_expected(document)
+
+  @staticmethod
+  @pytest.mark.parametrize('encode', [lambda content: content, lambda content: codecs.BOM_UTF8 + content, gzip.compress])
+  @pytest.mark.parametrize('mmap_threshold', [1, 1 << 24])
+  @pytest.mark.parametrize('with_orjson', [True, False])
+  def test_load_file(tmp_path, monkeypatch, encode, mmap_threshold, with_orjson):
+    if not with_orjson:
+      monkeypatch.setattr(json_stream, 'orjson', None)
+    document = document_mocked()
+    path = tmp_path / 'dataset.json'
+    path.write_bytes(encode(json.dumps(document, ensure_ascii=False).encode('utf-8')))
+    assert load_file(str(path), 4, mmap_threshold) == document
+
+  @staticmethod
+  def test_load():
+    assert JsonStreamReader([b'{"a": [], "b": [1, {"c": [2]}]', b', "d": {"e": []}}']).load() == {
+      'a': [], 'b': [1, {'c': [2]}], 'd': {'e': []}}
+
+  @staticmethod
+  def test_loads(monkeypatch):
+    document = '{"tokens": [{"word": "\u00e9t\u00e9", "space": true, "entity_id": 3}]}'
+    assert loads(document) == loads(document.encode('utf-8')) == json.loads(document)
+    monkeypatch.setattr(json_stream, 'orjson', None)
+    assert loads(document) == json.loads(document)
+    with pytest.raises(ValueError):
+      loads('{"tokens": [')
@@ -0,0 +1,55 @@
+# coding: utf-8
+import json
+import sqlite3
+import pytest
+from mock import Mock
+from dataset_translation.async_dataset_translation import AsyncDatasetTranslation
+from dataset_translation.dataset_translation import DatasetTranslation
+from dataset_translation.dataset_writer import DatasetWriter
+from dataset_translation.multi_language_translation import MultiLanguageTranslation
+
+
+def dataset_mocked():
+  return {
+    'language': 'en',
+    'gazettes': [{'name': 'GAZETTE', 'slug': 'gazette', 'type': 'restricted', 'synonyms': ['synonym0', 'synonym1']}],
+    'intents': [{'name': f"intent-{i}", 'expressions': [{'source': 'hello', 'tokens': [{'word': 'hello', 'space': False, 'pos': 'INTJ', 'entity': None}]}]} for i in range(2)]
+  }
+
+
+class TestMultiLanguageTranslation:
+
+  @staticmethod
+  @pytest.mark.parametrize('engine', [DatasetTranslation, AsyncDatasetTranslation])
+  def test_dataset_translation(tmp_path, engine, cai_transport_mocked):
+    transport = cai_transport_mocked()
+    writers = {language: DatasetWriter(str(tmp_path / f"dataset-{language}.json"), 'compact') for language in ['fr', 'es', 'de']}
+    translation = MultiLanguageTranslation('none', 'en', ['fr', 'es', 'de', 'fr'], 'user_slug', 'bot_slug', 'version_slug', 'developer_token', 'bot_client_id', 'bot_client_secret', engine=engine, writers=writers, transport=transport)
+    translated_datasets = translation.dataset_translation(dataset_mocked())
+
+    assert list(translated_datasets) == ['fr', 'es', 'de']
+    for language, translated_dataset in translated_datasets.items():
+      assert translated_dataset['language'] == language
+      assert translated_dataset['intents'][1]['expressions'][0]['compiled'] == 'hello '
+      assert json.loads((tmp_path / f"dataset-{language}.json").read_text(encoding='utf-8')) == translated_dataset
+    auth_posts = [call for call in transport.post.call_args_list if 'oauth' in call[0][0]]
+    assert len(auth_posts) == 1
+    assert transport.get.call_count == 1
+    assert transport.post.call_count == 1 + 3 * (1 + 2)
+
+  @staticmethod
+  def test_dataset_translation_error(cai_transport_mocked):
+    transport = cai_transport_mocked()
+    translation = MultiLanguageTranslation('none', 'en', ['fr', 'es'], 'user_slug', 'bot_slug', 'version_slug', 'developer_token', 'bot_client_id', 'bot_client_secret', transport=transport)
+    translation.translations['es'].translate_intent = Mock(side_effect=ValueError('error'))
+    with pytest.raises(ValueError):
+      translation.dataset_translation(dataset_mocked())
+
+  @staticmethod
+  def test_close(tmp_path, cai_transport_mocked):
+    translation = MultiLanguageTranslation('none', 'en', ['fr', 'de'], 'user_slug', 'bot_slug', 'version_slug', 'developer_token', 'bot_client_id', 'bot_client_secret', transport=cai_transport_mocked(), translation_memory=str(tmp_path / 'memory.sqlite'))
+    translation.dataset_translation(dataset_mocked())
+    translation.close()
+    for language_translation in translation.translations.values():
+      with pytest.raises(sqlite3.ProgrammingError):
+        language_translation.translator.connection.execute('SELECT 1')
@@ -0,0 +1,55 @@
+# coding: utf-8
+import time
+from email.utils import formatdate
+import pytest
+from dataset_translation.rate_limit import RateLimiter, RetryPolicy, TokenBucket, endpoint_family
+
+DATASET_URL = 'https://cai.tools.sap/api/train/v2/users/user/bots/bot/versions/v1/dataset'
+
+
+class TestRateLimit:
+
+  @staticmethod
+  def test_endpoint_family():
+    assert endpoint_family('POST', 'https://document-translation.cfapps.sap.hana.ondemand.com/api/v1/translation?sourceLanguage=en-US') == 'translation'
+    assert endpoint_family('POST', f"{DATASET_URL}/intents/greetings/expressions") == 'expression_import'
+    assert endpoint_family('POST', f"{DATASET_URL}/intents/greetings/expressions/bulk_create") == 'expression_import'
+    assert endpoint_family('PUT', f"{DATASET_URL}/intents/greetings/expressions/id0") == 'token_update'
+    assert endpoint_family('POST', f"{DATASET_URL}/entities/music-genre/synonyms/bulk_create") == 'synonyms'
+    assert endpoint_family('GET', f"{DATASET_URL}/intents/greetings/expressions?language=fr&page=2") == 'expression_listing'
+    assert endpoint_family('GET', f"{DATASET_URL}/entities") is None
+    assert endpoint_family('POST', 'https://cai.tools.sap/oauth/token') is None
+
+  @staticmethod
+  def test_token_bucket():
+    bucket = TokenBucket(rate=50, capacity=2)
+    start = time.monotonic()
+    for _ in range(7):
+      bucket.acquire()
+    assert 0.08 <= time.monotonic() - start < 0.5
+
+  @staticmethod
+  def test_rate_limiter():
+    rate_limiter = RateLimiter({'synonyms': 1000, 'translation': 0})
+    assert set(rate_limiter.buckets) == {'synonyms'}
+    assert rate_limiter.acquire('GET', f"{DATASET_URL}/entities") == 0
+    with pytest.raises(ValueError):
+      RateLimiter({'entities': 1})
+
+  @staticmethod
+  def test_retry_policy(response_mocked):
+    policy = RetryPolicy(max_retries=2, backoff=1, max_backoff=3)
+    assert policy.should_retry(0, response_mocked(429))
+    assert policy.should_retry(1, response_mocked(503))
+    assert not policy.should_retry(2, response_mocked(503))
+    assert not policy.should_retry(0, response_mocked(400))
+    assert policy.should_retry(0, response_mocked(503), 'POST', f"{DATASET_URL}/entities/color/synonyms/bulk_create")
+    assert not policy.should_retry(0, response_mocked(504), 'POST', f"{DATASET_URL}/intents/greetings/expressions")
+    assert policy.should_retry(0, response_mocked(504), 'PUT', f"{DATASET_URL}/intents/greetings/expressions/id0")
+    assert policy.should_retry(0, response_mocked(500), 'POST', 'https://sandbox.api.sap.com/translationhub/api/v1/translation')
+    assert 0.5 <= policy.delay(0, response_mocked(503)) <= 1
+    assert 1.5 <= policy.delay(5, response_mocked(503)) <= 3
+    assert policy.delay(0, response_mocked(429, headers={'Retry-After': '2'})) == 2
+    assert policy.delay(0, response_mocked(429, headers={'Retry-After': '120'})) == 3
+    assert 0 < policy.delay(0, response_mocked(429, headers={'Retry-After': formatdate(time.time() + 2, usegmt=True)})) <= 2
+    assert 0.5 <= policy.delay(0, response_mocked(429, headers={'Retry-After': 'soon'})) <= 1
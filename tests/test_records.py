@@ -0,0 +1,81 @@
+# coding: utf-8
+import copy
+import gc
+import json
+import pytest
+from dataset_translation.records import Entity, Expression, Gazette, Intent, Token, dataset_from_json, to_json
+
+
+class TestRecords:
+
+  @staticmethod
+  def test_entity_interned():
+    entity = Entity.intern('MUSIC-GENRE', 'restricted', True)
+    assert entity is Entity.intern('MUSIC-GENRE', 'restricted', True)
+    assert entity is Entity.from_dict({'name': 'MUSIC-GENRE', 'type': 'restricted', 'is_custom': True})
+    assert entity is copy.deepcopy(entity)
+    assert entity == {'name': 'MUSIC-GENRE', 'type': 'restricted', 'is_custom': True}
+    with pytest.raises(TypeError):
+      entity.name = 'GENRE'
+
+  @staticmethod
+  def test_entity_released():
+    token = Token('rock', False, 'NOUN', Entity.intern('RELEASED-GENRE', 'restricted', True))
+    assert ('RELEASED-GENRE', 'restricted', True) in Entity.INTERNED
+    del token
+    gc.collect()
+    assert ('RELEASED-GENRE', 'restricted', True) not in Entity.INTERNED
+    assert not hasattr(Token('rock', False, 'NOUN'), '__dict__')
+
+  @staticmethod
+  def test_token_mapping():
+    token = Token.from_dict({'word': 'rock', 'space': False, 'pos': 'NOUN',
+                             'entity': {'name': 'MUSIC-GENRE', 'type': 'restricted', 'is_custom': True}})
+    assert token['entity'] is Entity.intern('MUSIC-GENRE', 'restricted', True)
+    assert token['pos'] is Token('jazz', True, ''.join(['NO', 'UN']))['pos']
+    assert dict(token) == {'word': 'rock', 'space': False, 'pos': 'NOUN', 'entity': token['entity']}
+    token['word'] = 'jazz'
+    assert token.get('word') == 'jazz' and token.get('lemma') is None and 'lemma' not in token
+
+  @staticmethod
+  def test_token_extra_keys():
+    token = Token.from_dict({'word': 'rock', 'lemma': 'rock', 'ind': 3})
+    assert token == {'word': 'rock', 'lemma': 'rock', 'ind': 3, 'entity': None}
+    assert 'pos' not in token and token['ind'] == 3
+    del token['ind']
+    with pytest.raises(KeyError):
+      token['ind']  # pylint: disable=pointless-statement
+
+  @staticmethod
+  def test_nested_records():
+    intent = Intent.from_dict({'id': 'id0', 'name': 'greetings', 'description': '', 'strictness': None, 'expressions': [
+      {'source': 'hello', 'tokens': [{'word': 'hello', 'space': False, 'pos': 'INTJ', 'entity': None}]}]})
+    expression = intent['expressions'][0]
+    assert isinstance(expression, Expression) and isinstance(expression['tokens'][0], Token)
+    assert 'compiled' not in expression
+    expression.update(tokens=[{'word': 'bonjour', 'space': False, 'pos': 'INTJ', 'entity': None}], compiled='bonjour ')
+    assert isinstance(expression['tokens'][0], Token) and expression['compiled'] == 'bonjour '
+    assert {**intent, 'expressions': []} == {'id': 'id0', 'name': 'greetings', 'description': '', 'strictness': None,
+                                             'expressions': []}
+    assert intent.extra == {'id': 'id0'} and expression.extra is None
+
+  @staticmethod
+  def test_dataset_from_json():
+    dataset = {
+      'language': 'en',
+      'intents': [{'name': 'greetings', 'description': '', 'strictness': 60, 'expressions': [
+        {'source': 'I like rock', 'tokens': [
+          {'word': 'I', 'space': True, 'pos': 'PRON', 'entity': {'name': 'PRONOUN', 'type': 'gold', 'is_custom': False}},
+          {'word': 'like', 'space': True, 'pos': 'VERB', 'entity': None},
+          {'word': 'rock', 'space': False, 'pos': 'NOUN',
+           'entity': {'name': 'MUSIC-GENRE', 'type': 'restricted', 'is_custom': True}}]}]}],
+      'gazettes': [{'id': 'id1', 'name': 'MUSIC-GENRE', 'slug': 'music-genre', 'type': 'restricted', 'synonyms': ['rock'],
+                    'enrichments': {'enrichment_pair_keys': {}, 'enrichment_groups': []}}]
+    }
+    records = dataset_from_json(copy.deepcopy(dataset))
+    assert isinstance(records['intents'][0], Intent) and isinstance(records['gazettes'][0], Gazette)
+    assert records == dataset
+    assert json.loads(json.dumps(records, default=to_json)) == dataset
+    assert copy.deepcopy(records) == dataset
+    with pytest.raises(TypeError):
+      to_json(object())
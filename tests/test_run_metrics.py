@@ -0,0 +1,103 @@
+# coding: utf-8
+import json
+import time
+from dataset_translation.run_metrics import LatencyHistogram, RunMetrics, body_size, request_endpoint, timed
+
+DATASET_URL = 'https://cai.tools.sap/api/train/v2/users/user/bots/bot/versions/v1/dataset'
+
+
+class Phased:
+
+  def __init__(self):
+    self.metrics = RunMetrics()
+
+  @timed('work')
+  def work(self, value):
+    time.sleep(0.01)
+    return value
+
+
+class TestRunMetrics:
+
+  @staticmethod
+  def test_phases():
+    phased = Phased()
+    assert phased.work(1) == 1 and phased.work(2) == 2
+    with phased.metrics.phase('other'):
+      pass
+    phases = phased.metrics.report()['phases']
+    assert phases['work']['calls'] == 2 and phases['work']['seconds'] >= 0.02
+    assert phases['other']['calls'] == 1
+    assert phased.metrics.phase_seconds('work') == phases['work']['seconds']
+    assert phased.metrics.phase_seconds('missing') == 0
+
+  @staticmethod
+  def test_iterate():
+    metrics = RunMetrics()
+    def slow_records():
+      for i in range(3):
+        time.sleep(0.01)
+        yield i
+    assert list(metrics.iterate('load', slow_records())) == [0, 1, 2]
+    assert metrics.phase_seconds('load') >= 0.03
+    assert metrics.report()['phases']['load']['calls'] == 1
+
+  @staticmethod
+  def test_request_endpoint():
+    assert request_endpoint('POST', f"{DATASET_URL}/intents/greetings/expressions/bulk_create") == 'expression_import'
+    assert request_endpoint('POST', 'https://cai.tools.sap/oauth/token') == 'authentication'
+    assert request_endpoint('GET', f"{DATASET_URL}/entities") == 'other'
+    assert body_size('é') == 2 and body_size(b'abc') == 3 and body_size(None) == 0 and body_size(iter([])) == 0
+
+  @staticmethod
+  def test_latency_histogram():
+    histogram = LatencyHistogram(buckets=(0.1, 1))
+    for seconds in (0.05, 0.1, 0.5, 3):
+      histogram.observe(seconds)
+    assert histogram.cumulative_counts() == [(0.1, 2), (1, 3), ('+Inf', 4)]
+    assert histogram.report()['sum'] == 3.65
+
+  @staticmethod
+  def test_report(tmpdir):
+    metrics = RunMetrics()
+    metrics.record_request('PUT', f"{DATASET_URL}/intents/greetings/expressions/id0", 200, 0.02, 120, 300)
+    metrics.record_request('PUT', f"{DATASET_URL}/intents/greetings/expressions/id1", 503, 0.2, 120, 40)
+    metrics.record_request('POST', f"{DATASET_URL}/entities/city/synonyms/bulk_create", None, 1.5, 80, 0)
+    metrics.increment('translated_characters', 42)
+    metrics.record_cache('translation_memory', 3, 1)
+    metrics.record_cache('translation_plan', 0, 0)
+    path = str(tmpdir.join('report.json'))
+    metrics.write_report(path)
+    with open(path, 'r', encoding='utf-8') as file:
+      report = json.load(file)
+    token_update = report['endpoints']['token_update']
+    assert token_update['requests'] == 2 and token_update['statuses'] == {'200': 1, '503': 1}
+    assert token_update['bytes_sent'] == 240 and token_update['bytes_received'] == 340
+    assert token_update['latency']['buckets']['0.025'] == 1 and token_update['latency']['buckets']['+Inf'] == 2
+    assert report['endpoints']['synonyms']['statuses'] == {'error': 1}
+    assert report['counters'] == {'translated_characters': 42}
+    assert report['caches']['translation_memory']['hit_rate'] == 0.75
+    assert report['caches']['translation_plan']['hit_rate'] == 0
+
+  @staticmethod
+  def test_prometheus(tmpdir):
+    metrics = RunMetrics()
+    with metrics.phase('import'):
+      pass
+    metrics.record_request('POST', 'https://document-translation.cfapps.sap.hana.ondemand.com/api/v1/translation', 200,
+                           0.3, 1000, 900)
+    metrics.increment('translated_characters', 42)
+    metrics.record_cache('translation_memory', 3, 1)
+    path = str(tmpdir.join('metrics.prom'))
+    metrics.write_prometheus(path)
+    with open(path, 'r', encoding='utf-8') as file:
+      lines = file.read().splitlines()
+    assert '# TYPE dataset_translation_request_duration_seconds histogram' in lines
+    assert 'dataset_translation_requests_total{endpoint="translation",status="200"} 1' in lines
+    assert 'dataset_translation_request_duration_seconds_bucket{endpoint="translation",le="0.25"} 0' in lines
+    assert 'dataset_translation_request_duration_seconds_bucket{endpoint="translation",le="0.5"} 1' in lines
+    assert 'dataset_translation_request_duration_seconds_count{endpoint="translation"} 1' in lines
+    assert 'dataset_translation_request_bytes_total{endpoint="translation",direction="sent"} 1000' in lines
+    assert 'dataset_translation_translated_characters_total 42' in lines
+    assert 'dataset_translation_cache_hits_total{cache="translation_memory"} 3' in lines
+    assert any(line.startswith('dataset_translation_phase_seconds_total{phase="import"} ') for line in lines)
@@ -0,0 +1,74 @@
+# coding: utf-8
+import json
+import os
+import stat
+import time
+from mock import Mock
+from dataset_translation.token_manager import TokenManager
+
+
+def fetch_mocked(expires_in=3600):
+  tokens = iter(f"token{i}" for i in range(100))
+  return Mock(side_effect=lambda: (next(tokens), expires_in))
+
+
+class TestTokenManager:
+
+  @staticmethod
+  def test_token():
+    token_manager = TokenManager(background_refresh=False)
+    fetch = fetch_mocked()
+    assert token_manager.token('auth#client', fetch) == 'token0'
+    assert token_manager.token('auth#client', fetch) == 'token0'
+    assert token_manager.token('auth#other', fetch) == 'token1'
+    assert fetch.call_count == 2
+
+  @staticmethod
+  def test_token_expiry():
+    token_manager = TokenManager(refresh_margin=60, background_refresh=False)
+    fetch = fetch_mocked(expires_in=30)
+    assert token_manager.token('auth#client', fetch) == 'token0'
+    token_manager.tokens['auth#client']['refresh_at'] = time.time() - 1
+    assert token_manager.token('auth#client', fetch) == 'token1'
+
+  @staticmethod
+  def test_invalidate():
+    token_manager = TokenManager(background_refresh=False)
+    fetch = fetch_mocked()
+    token_manager.token('auth#client', fetch)
+    token_manager.invalidate('auth#client', 'token-already-replaced')
+    assert token_manager.token('auth#client', fetch) == 'token0'
+    token_manager.invalidate('auth#client', 'token0')
+    assert token_manager.token('auth#client', fetch) == 'token1'
+
+  @staticmethod
+  def test_background_refresh():
+    token_manager = TokenManager(refresh_margin=60, background_refresh=True)
+    fetch = fetch_mocked(expires_in=0.1)
+    assert token_manager.token('auth#client', fetch) == 'token0'
+    time.sleep(0.2)
+    token_manager.close()
+    assert fetch.call_count >= 2
+    assert token_manager.tokens['auth#client']['access_token'] != 'token0'
+
+  @staticmethod
+  def test_cache_file(tmp_path):
+    path = str(tmp_path / 'tokens.json')
+    fetch = fetch_mocked()
+    assert TokenManager(path, background_refresh=False).token('auth#client', fetch) == 'token0'
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert 'secret' not in open(path, encoding='utf-8').read()
+    assert TokenManager(path, background_refresh=False).token('auth#client', fetch) == 'token0'
+    assert fetch.call_count == 1
+
+    token_manager = TokenManager(path, background_refresh=False)
+    token_manager.invalidate('auth#client', 'token0')
+    assert 'auth#client' not in json.load(open(path, encoding='utf-8'))
+
+  @staticmethod
+  def test_cache_file_readable_by_others(tmp_path):
+    path = str(tmp_path / 'tokens.json')
+    with open(path, 'w', encoding='utf-8') as file:
+      json.dump({'auth#client': {'access_token': 'stolen', 'expires_at': time.time() + 3600, 'refresh_at': time.time() + 3600}}, file)
+    os.chmod(path, 0o644)
+    assert TokenManager(path, background_refresh=False).token('auth#client', fetch_mocked()) == 'token0'
@@ -0,0 +1,47 @@
+# coding: utf-8
+import pytest
+from mock import Mock
+from dataset_translation.translation_plan import TranslationPlan
+
+
+def translator_mocked():
+  mocked_translator = Mock()
+  mocked_translator.batch_translate.side_effect = lambda expressions, batch_size: [expression.upper() for expression in expressions]
+  return mocked_translator
+
+def dataset_mocked():
+  token_entity = {'word': 'CPL', 'space': False, 'pos': 'NOUN', 'entity': {'name': 'ACCESSORIES', 'type': 'free', 'is_custom': True}}
+  token_gold = {'word': 'I', 'space': True, 'pos': 'PRON', 'entity': {'name': 'PRONOUN', 'type': 'gold', 'is_custom': False}}
+  token_none = {'word': 'yes', 'space': False, 'pos': 'INTJ', 'entity': None}
+  return {
+    'gazettes': [{'name': 'ACCESSORIES', 'synonyms': ['yes', 'cpl']}, {'name': 'PRONOUN', 'synonyms': []}],
+    'intents': [
+      {'name': 'intent-0', 'expressions': [{'source': 'yes', 'tokens': [token_none]}, {'source': 'I CPL', 'tokens': [token_gold, token_entity]}]},
+      {'name': 'intent-1', 'expressions': [{'source': 'yes', 'tokens': [token_none]}]}
+    ]
+  }
+
+class TestTranslationPlan:
+
+  @staticmethod
+  def test_from_dataset():
+    plan = TranslationPlan.from_dataset(dataset_mocked())
+    assert list(plan.sources) == ['yes', 'cpl', 'I CPL', 'CPL']
+    assert plan.stats() == {'strings': 6, 'unique_strings': 4, 'characters': 14}
+
+  @staticmethod
+  def test_translate():
+    translator = translator_mocked()
+    plan = TranslationPlan.from_dataset(dataset_mocked())
+    plan.translate(translator, 10)
+    plan.translate(translator, 10)
+    translator.batch_translate.assert_called_once_with(['yes', 'cpl', 'I CPL', 'CPL'], 10)
+    assert plan.get(['yes', 'CPL', 'yes']) == ['YES', 'CPL', 'YES']
+    assert plan.get(['yes', 'unknown']) is None
+
+  @staticmethod
+  def test_translate_error():
+    translator = translator_mocked()
+    translator.batch_translate.side_effect = lambda expressions, batch_size: expressions[1:]
+    with pytest.raises(ValueError):
+      assert TranslationPlan.from_dataset(dataset_mocked()).translate(translator, 10)
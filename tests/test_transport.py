@@ -0,0 +1,92 @@
+# coding: utf-8
+import pytest
+import requests
+from mock import Mock, patch
+from dataset_translation.rate_limit import RetryPolicy
+from dataset_translation.run_metrics import RunMetrics
+from dataset_translation.transport import Transport
+
+
+class TestTransport:
+
+  @staticmethod
+  def test_session_per_host():
+    transport = Transport(pool_size=4)
+    session = transport.session('https://cai.tools.sap/api/train/v2/users')
+    assert transport.session('https://cai.tools.sap/api/other') is session
+    assert transport.session('https://document-translation.cfapps.sap.hana.ondemand.com/api') is not session
+    assert session.get_adapter('https://cai.tools.sap/')._pool_maxsize == 4
+    transport.close()
+    assert transport.sessions == {}
+
+  @staticmethod
+  @patch('dataset_translation.transport.requests')
+  def test_request_timeout(mocked_requests):
+    transport = Transport(timeout=5)
+    transport.get('https://cai.tools.sap/api', headers={})
+    transport.post('https://cai.tools.sap/api', json={}, timeout=1)
+    session = mocked_requests.Session.return_value
+    session.request.assert_any_call('GET', 'https://cai.tools.sap/api', headers={}, timeout=5)
+    session.request.assert_called_with('POST', 'https://cai.tools.sap/api', json={}, timeout=1)
+    assert mocked_requests.Session.call_count == 1
+
+  @staticmethod
+  @patch('dataset_translation.transport.time.sleep')
+  def test_request_retry(mocked_sleep, response_mocked):
+    transport = Transport(retry_policy=RetryPolicy(max_retries=3))
+    session = Mock()
+    session.request.side_effect = [response_mocked(429, headers={'Retry-After': '7'}), response_mocked(502), response_mocked(201)]
+    transport.sessions[('https', 'cai.tools.sap')] = session
+    assert transport.get('https://cai.tools.sap/api').status_code == 201
+    assert session.request.call_count == 3
+    assert mocked_sleep.call_args_list[0][0][0] == 7
+
+  @staticmethod
+  @patch('dataset_translation.transport.time.sleep')
+  def test_request_retry_post(mocked_sleep, response_mocked):
+    transport = Transport(retry_policy=RetryPolicy(max_retries=3))
+    session = Mock()
+    session.request.side_effect = [response_mocked(503), response_mocked(502), response_mocked(201)]
+    transport.sessions[('https', 'cai.tools.sap')] = session
+    assert transport.post('https://cai.tools.sap/api/intents/greetings/expressions/bulk_create', json={}).status_code == 502
+    assert session.request.call_count == 2
+    session.request.side_effect = [response_mocked(502), response_mocked(200)]
+    assert transport.post('https://cai.tools.sap/api/translation', json={}).status_code == 200
+    assert session.request.call_count == 4
+    assert mocked_sleep.call_count == 2
+
+  @staticmethod
+  @patch('dataset_translation.transport.time.sleep')
+  def test_request_retry_exhausted(mocked_sleep, response_mocked):
+    transport = Transport(retry_policy=RetryPolicy(max_retries=2))
+    session = Mock()
+    session.request.return_value = response_mocked(503)
+    transport.sessions[('https', 'cai.tools.sap')] = session
+    assert transport.get('https://cai.tools.sap/api').status_code == 503
+    assert session.request.call_count == 3
+    assert mocked_sleep.call_count == 2
+
+  @staticmethod
+  def test_request_rate_limit(response_mocked):
+    rate_limiter = Mock()
+    transport = Transport(rate_limiter=rate_limiter)
+    session = Mock()
+    session.request.return_value = response_mocked(200)
+    transport.sessions[('https', 'cai.tools.sap')] = session
+    transport.put('https://cai.tools.sap/api/intents/greetings/expressions/id0', json={})
+    rate_limiter.acquire.assert_called_once_with('PUT', 'https://cai.tools.sap/api/intents/greetings/expressions/id0')
+
+  @staticmethod
+  def test_request_metrics():
+    metrics = RunMetrics()
+    transport = Transport(metrics=metrics)
+    session = Mock()
+    session.request.side_effect = [Mock(status_code=201, content=b'{"results": []}', request=Mock(body=b'{}')),
+                                   requests.ConnectionError('Connection reset')]
+    transport.sessions[('https', 'cai.tools.sap')] = session
+    transport.post('https://cai.tools.sap/api/intents/greetings/expressions', json={})
+    with pytest.raises(requests.ConnectionError):
+      transport.post('https://cai.tools.sap/api/intents/greetings/expressions', data='abc')
+    endpoint = metrics.report()['endpoints']['expression_import']
+    assert endpoint['statuses'] == {'201': 1, 'error': 1}
+    assert endpoint['bytes_sent'] == 5 and endpoint['bytes_received'] == 15
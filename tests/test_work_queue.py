@@ -0,0 +1,99 @@
+# coding: utf-8
+import pytest
+from dataset_translation.work_queue import MemoryWorkQueue, RedisWorkQueue
+
+
+class Clock:
+  """Clock of the queue, advanced by the tests"""
+
+  def __init__(self):
+    self.now = 1000.0
+
+  def __call__(self):
+    return self.now
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def queue(request):
+  clock = Clock()
+  options = {'visibility_timeout': 30, 'retry_delay': 5, 'max_attempts': 2, 'clock': clock}
+  if request.param == 'memory':
+    work_queue = MemoryWorkQueue('test-queue', **options)
+  else:
+    redis = pytest.importorskip('redis')
+    client = redis.Redis(decode_responses=True)
+    try:
+      client.ping()
+    except redis.exceptions.ConnectionError:
+      pytest.skip('no local Redis server')
+    work_queue = RedisWorkQueue('dataset-translation-test-queue', client=client, **options)
+  work_queue.clear()
+  yield work_queue, clock
+  work_queue.clear()
+
+
+class TestWorkQueue:
+
+  @staticmethod
+  def test_reserve_ack(queue):
+    queue, clock = queue
+    queue.push('job-0', 'first')
+    clock.now += 1
+    queue.push('job-1', 'second')
+    assert queue.reserve() == ('job-0', 'first', 1)
+    assert queue.reserve() == ('job-1', 'second', 1)
+    assert queue.reserve() is None
+    assert queue.ack('job-0', 'result') is True
+    assert queue.results(['job-0', 'job-1']) == {'job-0': 'result'}
+    clock.now += 60
+    assert queue.reserve() == ('job-1', 'second', 2)
+
+  @staticmethod
+  def test_visibility_timeout(queue):
+    queue, clock = queue
+    queue.push('job-0', 'job')
+    assert queue.reserve()[2] == 1
+    clock.now += 29
+    assert queue.reserve() is None
+    clock.now += 2
+    assert queue.reserve() == ('job-0', 'job', 2)
+    assert queue.fail('job-0', 1, 'stale lease') is False
+    assert queue.ack('job-0', 'first result') is True
+    assert queue.ack('job-0', 'second result') is False
+    assert queue.results(['job-0']) == {'job-0': 'first result'}
+    queue.push('job-1', 'job')
+    queue.reserve()
+    clock.now += 31
+    queue.reserve()
+    clock.now += 31
+    assert queue.reserve() is None
+    assert queue.errors(['job-0', 'job-1']) == {'job-1': queue.expired_error()}
+
+  @staticmethod
+  def test_fail_retry(queue):
+    queue, clock = queue
+    queue.push('job-0', 'job')
+    _, _, attempt = queue.reserve()
+    assert queue.fail('job-0', attempt, 'error 1') is True
+    assert queue.reserve() is None
+    clock.now += 5
+    _, _, attempt = queue.reserve()
+    assert attempt == 2
+    assert queue.fail('job-0', attempt, 'error 2') is False
+    clock.now += 60
+    assert queue.reserve() is None
+    assert queue.errors(['job-0']) == {'job-0': 'error 2'} and queue.results(['job-0']) == {}
+    queue.push('job-0', 'job')
+    assert queue.errors(['job-0']) == {} and queue.reserve() == ('job-0', 'job', 1)
+
+  @staticmethod
+  def test_remove(queue):
+    queue, _ = queue
+    for job_id in ('run-0:job-0', 'run-0:job-1', 'run-1:job-0'):
+      queue.push(job_id, 'job')
+    job_id, _, _ = queue.reserve()
+    queue.ack(job_id, 'result')
+    queue.remove(['run-0:job-0', 'run-0:job-1'])
+    assert queue.results(['run-0:job-0']) == {}
+    assert queue.reserve() == ('run-1:job-0', 'job', 1)
+    assert queue.reserve() is None
@@ -3,22 +3,33 @@ import ast
 import random
 import requests
 import pytest
-from mock import patch, Mock
+from tests.fake_servers import FakeTranslationHubServer
+from dataset_translation.rate_limit import RetryPolicy
+from dataset_translation.token_manager import TokenManager
 from dataset_translation.translator.sap_translation_hub_translator import SAPTranslationHubTranslator
+from dataset_translation.transport import Transport
 
-def requests_mocked(status):
-  mocked_requests = Mock()
-  response = requests.Response()
-  response.status_code = status
-  response._content = b'{"access_token": "token"}'
-  mocked_requests.post.return_value = response
-  mocked_requests.request.return_value = response
-  return mocked_requests
+CONTENT = b'{"access_token": "token"}'
+
+def sent_text(data):
+  return data.decode('utf-8').split('\r\n\r\n', 1)[1].rsplit('\r\n--', 1)[0]
+
+def response_translated(merge_above=None, drop_tags=False):
+  def translate(method, url, data=None, **kwargs):
+    lines = sent_text(data).upper().split('\n')
+    if drop_tags:
+      lines = [line.replace('[[', '(').replace(']]', ')') for line in lines]
+    if merge_above is not None and len(lines) > merge_above:
+      lines = [' '.join(lines)]
+    response = requests.Response()
+    response.status_code = 200
+    response._content = '\n'.join(lines).encode('utf-8')
+    return response
+  return translate
 
 @pytest.fixture
-@patch('dataset_translation.translator.sap_translation_hub_translator.requests', requests_mocked(200))
-def sap_translation_hub_translator():
-  return SAPTranslationHubTranslator('en', 'fr', 'id', 'secret')
+def sap_translation_hub_translator(transport_mocked, response_mocked):
+  return SAPTranslationHubTranslator('en', 'fr', 'id', 'secret', transport=transport_mocked(response_mocked(200, CONTENT)))
 
 class TestSAPTranslationHubTranslator:
 
@@ -41,14 +52,96 @@ class TestSAPTranslationHubTranslator:
     with pytest.raises(KeyError):
       assert sap_translation_hub_translator.sapcode_language('language1')
 
-  @patch('dataset_translation.translator.sap_translation_hub_translator.requests', requests_mocked(200))
   def test_batch_translate(self, sap_translation_hub_translator):
     translation = sap_translation_hub_translator.batch_translate(['hello'], 1)
     assert ast.literal_eval(translation[0])['access_token'] == 'token'
     assert isinstance(translation[0], str)
     assert isinstance(ast.literal_eval(translation[0]), dict)
 
-  @patch('dataset_translation.translator.sap_translation_hub_translator.requests', requests_mocked(400))
-  def test_batch_translate_error(self, sap_translation_hub_translator):
+  def test_batch_translate_error(self, sap_translation_hub_translator, transport_mocked, response_mocked):
+    sap_translation_hub_translator.transport = transport_mocked(response_mocked(400, CONTENT))
     with pytest.raises(ValueError):
       assert sap_translation_hub_translator.batch_translate(['hello'], 1)
+
+  def test_pack_batches(self, sap_translation_hub_translator):
+    expressions = ['yes', 'no', 'a' * 20, 'b' * 50, 'c' * 8, 'é' * 5, 'ok']
+    batches = sap_translation_hub_translator.pack_batches(expressions, 3, 45)
+    assert batches == [['yes', 'no', 'a' * 20], ['b' * 50], ['c' * 8, 'é' * 5, 'ok']]
+    framed = ['\n'.join(f"[[{i}]] {expression}" for i, expression in enumerate(batch)) for batch in batches]
+    assert all(len(text.encode('utf-8')) <= 45 for text, batch in zip(framed, batches) if len(batch) > 1)
+    assert sap_translation_hub_translator.pack_batches(expressions, 2, 1000) == [['yes', 'no'], ['a' * 20, 'b' * 50], ['c' * 8, 'é' * 5], ['ok']]
+    assert sap_translation_hub_translator.pack_batches([], 2, 1000) == []
+
+  def test_batch_translate_batches(self, sap_translation_hub_translator):
+    sap_translation_hub_translator.max_batch_bytes = 45
+    sap_translation_hub_translator.transport.request.side_effect = response_translated()
+    translations = sap_translation_hub_translator.batch_translate(['yes', 'no', 'a' * 20, 'b' * 50, 'c' * 8], 10)
+    assert translations == ['YES', 'NO', 'A' * 20, 'B' * 50, 'C' * 8]
+    requests_sent = sap_translation_hub_translator.transport.request.call_args_list
+    assert [sent_text(call[1]['data']) for call in requests_sent] == ['[[0]] yes\n[[1]] no\n[[2]] ' + 'a' * 20, '[[0]] ' + 'b' * 50, '[[0]] ' + 'c' * 8]
+
+  def test_unframe(self, sap_translation_hub_translator):
+    assert sap_translation_hub_translator.unframe('[[1]] b\n[[0]]a\n continued\n', 2) == ['a continued', 'b']
+    assert sap_translation_hub_translator.unframe('[[ 0 ]] a\n[[1]] ', 2) == ['a', '']
+    assert sap_translation_hub_translator.unframe('[[0]] a [[1]] b', 2) is None
+    assert sap_translation_hub_translator.unframe('[[0]] a\n[[0]] b', 2) is None
+    assert sap_translation_hub_translator.unframe('[[0]] a\n[[2]] b', 2) is None
+    assert sap_translation_hub_translator.unframe('a\n[[0]] a', 1) is None
+
+  def test_batch_translate_newlines(self, sap_translation_hub_translator):
+    sap_translation_hub_translator.transport.request.side_effect = response_translated()
+    expressions = ['first line\nsecond line', 'yes', 'a\n\nb']
+    assert sap_translation_hub_translator.batch_translate(expressions, 10) == ['FIRST LINE\nSECOND LINE', 'YES', 'A\n\nB']
+    assert sap_translation_hub_translator.transport.request.call_count == 1
+    assert sap_translation_hub_translator.unframe('[[0]] a\n[[0.1]] b\n[[1]] c', 2, [2, 1]) == ['a\nb', 'c']
+    assert sap_translation_hub_translator.unframe('[[0]] a\n[[1]] c', 2, [2, 1]) is None
+    assert sap_translation_hub_translator.unframe('[[0]] a\n[[0.1]] b\n[[1]] c', 2) is None
+
+  def test_batch_translate_literal_tags(self, sap_translation_hub_translator):
+    sap_translation_hub_translator.transport.request.side_effect = response_translated()
+    expressions = ['[[1]] tagged', 'see [[0]]\n[[2]] here', '[[[x']
+    assert sap_translation_hub_translator.batch_translate(expressions, 10) == ['[[1]] TAGGED', 'SEE [[0]]\n[[2]] HERE', '[[[X']
+    assert sap_translation_hub_translator.transport.request.call_count == 1
+    sent = sent_text(sap_translation_hub_translator.transport.request.call_args[1]['data'])
+    assert sent == '[[0]] [[[1]] tagged\n[[1]] see [[[0]]\n[[1.1]] [[[2]] here\n[[2]] [[[[x'
+
+  def test_batch_translate_bisect(self, sap_translation_hub_translator):
+    sap_translation_hub_translator.transport.request.side_effect = response_translated(merge_above=2)
+    expressions = ['a', 'b', 'c', 'd', 'e']
+    assert sap_translation_hub_translator.batch_translate(expressions, 10) == ['A', 'B', 'C', 'D', 'E']
+    assert sap_translation_hub_translator.transport.request.call_count == 1 + 2 + 2
+
+  def test_batch_translate_untagged(self, sap_translation_hub_translator):
+    sap_translation_hub_translator.transport.request.side_effect = response_translated(drop_tags=True)
+    assert sap_translation_hub_translator.batch_translate(['a', 'b'], 10) == ['A', 'B']
+    assert sap_translation_hub_translator.transport.request.call_count == 1 + 2 * 2
+
+  def test_login_lazy_and_refused(self, transport_mocked, response_mocked):
+    transport = transport_mocked(response_mocked(200, CONTENT))
+    translator = SAPTranslationHubTranslator('en', 'fr', 'id', 'secret', transport=transport)
+    assert transport.post.call_count == 0
+    refused = response_mocked(401)
+    transport.request.side_effect = [refused, transport.request.return_value]
+    translator.request_translation('hello')
+    assert transport.post.call_count == 2
+    assert transport.request.call_count == 2
+
+  def test_login_credentials_refused(self, transport_mocked, response_mocked):
+    transport = transport_mocked(response_mocked(200, CONTENT))
+    transport.post.return_value = response_mocked(401, {'error': 'invalid_client'})
+    translator = SAPTranslationHubTranslator('en', 'fr', 'id', 'secret', transport=transport)
+    with pytest.raises(ValueError, match='invalid_client'):
+      translator.request_translation('hello')
+    transport.request.assert_not_called()
+
+  @staticmethod
+  def test_fake_server():
+    translate = lambda line, source, target: line.upper() if (source, target) == ('en-US', 'fr-FR') else line
+    with FakeTranslationHubServer(translate, latency=0.001, jitter=0.001, error_rate=0.3, seed=1) as server:
+      translator = SAPTranslationHubTranslator('en', 'fr', 'id', 'secret', max_batch_bytes=30, api_url=server.api_url,
+                                               token_url=server.token_url, token_manager=TokenManager(background_refresh=False),
+                                               transport=Transport(retry_policy=RetryPolicy(max_retries=20, backoff=0)))
+      expressions = [f"expression number {i}" for i in range(6)]
+      assert translator.batch_translate(expressions, 50) == [expression.upper() for expression in expressions]
+    assert server.errors > 0
+    assert sum(server.requests.values()) == 1 + 6 + server.errors
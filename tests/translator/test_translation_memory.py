@@ -0,0 +1,95 @@
+# coding: utf-8
+import threading
+import pytest
+from mock import Mock
+from dataset_translation.translator import NoneTranslator, TranslationMemory
+
+
+def translator_mocked(target_language='fr'):
+  mocked_translator = Mock(wraps=NoneTranslator('en', target_language))
+  mocked_translator.source_language = 'en'
+  mocked_translator.target_language = target_language
+  mocked_translator.batch_translate.side_effect = lambda expressions, batch_size: [expression.upper() for expression in expressions]
+  return mocked_translator
+
+@pytest.fixture
+def translation_memory(tmp_path):
+  return TranslationMemory(translator_mocked(), str(tmp_path / 'memory.sqlite'))
+
+class TestTranslationMemory:
+
+  def test_batch_translate(self, translation_memory):
+    translations = translation_memory.batch_translate(['hello', 'yes', 'hello'], 10)
+    assert translations == ['HELLO', 'YES', 'HELLO']
+    translation_memory.translator.batch_translate.assert_called_once_with(['hello', 'yes'], 10)
+    assert translation_memory.stats() == {'hits': 1, 'misses': 2, 'size': 2}
+
+  def test_batch_translate_hits(self, translation_memory):
+    translation_memory.batch_translate(['hello', 'yes'], 10)
+    translations = translation_memory.batch_translate(['yes', 'my order', ' hello '], 10)
+    assert translations == ['YES', 'MY ORDER', 'HELLO']
+    translation_memory.translator.batch_translate.assert_called_with(['my order'], 10)
+    assert translation_memory.stats()['hits'] == 2
+
+  def test_persistence(self, tmp_path):
+    path = str(tmp_path / 'memory.sqlite')
+    first_memory = TranslationMemory(translator_mocked(), path)
+    first_memory.batch_translate(['hello'], 10)
+    first_memory.close()
+    second_memory = TranslationMemory(translator_mocked(), path)
+    assert second_memory.batch_translate(['hello'], 10) == ['HELLO']
+    second_memory.translator.batch_translate.assert_not_called()
+
+  def test_eviction(self, tmp_path):
+    translation_memory = TranslationMemory(translator_mocked(), str(tmp_path / 'memory.sqlite'), max_entries=2)
+    translation_memory.batch_translate(['one'], 10)
+    translation_memory.batch_translate(['two'], 10)
+    translation_memory.batch_translate(['one'], 10)
+    translation_memory.batch_translate(['three'], 10)
+    assert translation_memory.stats()['size'] == 2
+    translation_memory.batch_translate(['one', 'two'], 10)
+    translation_memory.translator.batch_translate.assert_called_with(['two'], 10)
+
+  def test_lookup_read_only(self, tmp_path):
+    path = str(tmp_path / 'memory.sqlite')
+    translation_memory = TranslationMemory(translator_mocked(), path)
+    translation_memory.batch_translate(['one'], 10)
+    translation_memory.batch_translate(['two'], 10)
+    total_changes = translation_memory.connection.total_changes
+    translation_memory.batch_translate(['one'], 10)
+    assert translation_memory.connection.total_changes == total_changes
+    translation_memory.close()
+    translation_memory = TranslationMemory(translator_mocked(), path, max_entries=2)
+    translation_memory.batch_translate(['three'], 10)
+    translation_memory.batch_translate(['one', 'two'], 10)
+    translation_memory.translator.batch_translate.assert_called_with(['two'], 10)
+
+  def test_batch_translate_error(self, translation_memory):
+    translation_memory.translator.batch_translate.side_effect = lambda expressions, batch_size: expressions[1:]
+    with pytest.raises(ValueError):
+      assert translation_memory.batch_translate(['hello', 'yes'], 10)
+
+  def test_concurrent_languages(self, tmp_path):
+    path = str(tmp_path / 'memory.sqlite')
+    memories = [TranslationMemory(translator_mocked(language), path) for language in ('fr', 'de')]
+    barrier = threading.Barrier(len(memories))
+    errors = []
+
+    def translate(memory):
+      barrier.wait()
+      try:
+        for i in range(200):
+          memory.batch_translate([f"{memory.target_language} {i}", f"text {i}"], 10)
+      except Exception as error:  # pylint: disable=broad-except
+        errors.append(error)
+
+    threads = [threading.Thread(target=translate, args=(memory,)) for memory in memories]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    assert not errors
+    assert memories[0].connection.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert [memory.stats() for memory in memories] == [{'hits': 0, 'misses': 400, 'size': 800}] * 2
+    assert memories[1].batch_translate(['fr 0', 'text 199'], 10) == ['FR 0', 'TEXT 199']
+    memories[1].translator.batch_translate.assert_called_with(['fr 0'], 10)